@@ -1,21 +1,51 @@
 from __future__ import annotations
 
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse
+import asyncio
+import base64
+import hashlib
+import json
+import threading
+import time
+import zlib
+from datetime import date
+from typing import Literal
+
+from fastapi import FastAPI, Header, HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel, Field
 
-from .config import PUBLIC_DIR
+from .config import PUBLIC_DIR, ARQUIVO_HISTORICO
 from .estoque_core import (
     listar_produtos,
     criar_produto,
     move_stock_by_id,
+    movimentar_lote,
     produtos_abaixo_minimo,
-    listar_movimentos,
+    buscar_produtos,
+    pagina_movimentos,
+    iter_movimentos,
+    geracao_historico,
+    versao_dados,
+    versao_gravada,
+    assinar_alteracoes,
     ProdutoNaoEncontrado,
     EstoqueInsuficiente,
     ProdutoDuplicado,
 )
+from .idempotencia import ChaveReutilizada, executar_idempotente
+from .inventario import (
+    carregar_sessao,
+    descartar_sessao,
+    encerrar_sessao,
+    iniciar_sessao,
+    progresso_sessao,
+    registrar_contagens,
+    sessao_aberta,
+    SessaoEncerrada,
+    SessaoNaoEncontrada,
+)
 
 
 app = FastAPI(title="Estoque ONG API", version="1.0")
@@ -39,10 +69,81 @@ class MovimentoEstoque(BaseModel):
     quantidade: float = Field(gt=0)
 
 
+class ItemLote(BaseModel):
+    tipo: Literal["entrada", "saida"]
+    produto_id: int = Field(ge=1)
+    quantidade: float = Field(gt=0)
+    motivo: str | None = None
+
+
+class LoteMovimentos(BaseModel):
+    itens: list[ItemLote] = Field(min_length=1, max_length=1000)
+
+
+class ItemContagem(BaseModel):
+    produto_id: int = Field(ge=1)
+    contado: float | None = None  # None apaga a contagem do item
+
+
+class EnvioContagens(BaseModel):
+    itens: list[ItemContagem] = Field(min_length=1, max_length=1000)
+    modo: Literal["substituir", "somar"] = "substituir"
+    origem: str | None = Field(None, max_length=100)
+
+
+# rota -> (versão dos dados, ETag, corpo JSON já serializado)
+_cache_catalogo: dict[str, tuple[str, str, bytes]] = {}
+
+
+def _etag_confere(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == "*" or tag == etag:
+            return True
+    return False
+
+
+def _resposta_catalogo(request: Request, chave: str, gerar) -> Response:
+    """
+    Resposta do catálogo com ETag pela versão dos dados.
+    O JSON ordenado fica em cache por versão; If-None-Match igual -> 304.
+    """
+    versao = versao_dados()
+    item = _cache_catalogo.get(chave)
+    if item is None or item[0] != versao:
+        corpo = json.dumps(gerar(), ensure_ascii=False).encode("utf-8")
+        etag = '"' + hashlib.sha1(f"{chave}:{versao}".encode("utf-8")).hexdigest()[:20] + '"'
+        item = (versao, etag, corpo)
+        _cache_catalogo[chave] = item
+
+    _, etag, corpo = item
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_confere(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=corpo, media_type="application/json", headers=headers)
+
+
 @app.get("/api/produtos")
-def api_listar_produtos():
-    produtos = listar_produtos()
-    return sorted(produtos, key=lambda x: str(x.get("nome", "")).lower())
+def api_listar_produtos(request: Request):
+    return _resposta_catalogo(
+        request,
+        "produtos",
+        lambda: sorted(listar_produtos(), key=lambda x: str(x.get("nome", "")).lower()),
+    )
+
+
+@app.get("/api/produtos/busca")
+def api_buscar_produtos(q: str = "", limit: int = 20):
+    """
+    Busca premium por nome (começa com > palavras > contém > palavras em ordem).
+    Retorna só os `limit` melhores (padrão 20, máximo 100), não o catálogo inteiro.
+    """
+    limit = max(1, min(limit, 100))
+    return buscar_produtos(q, limit)
 
 
 @app.post("/api/produtos", status_code=201)
@@ -55,46 +156,420 @@ def api_cadastrar_produto(payload: ProdutoCreate):
         raise HTTPException(status_code=400, detail=str(e))
 
 
-@app.post("/api/estoque/entrada")
-def api_entrada_estoque(payload: MovimentoEstoque):
+def _idempotente(chave: str | None, rota: str, payload: BaseModel | None, fn):
+    """
+    Com Idempotency-Key, um reenvio devolve a resposta original (inclusive erro)
+    sem lançar o movimento de novo; o header Idempotent-Replayed indica isso.
+    """
+    if not chave:
+        return fn()
+
+    def executar():
+        try:
+            return 200, jsonable_encoder(fn())
+        except HTTPException as e:
+            return e.status_code, {"detail": e.detail}
+
     try:
-        produto = move_stock_by_id(payload.produto_id, float(payload.quantidade))
-        return {"ok": True, "produto": produto}
-    except ProdutoNaoEncontrado:
-        raise HTTPException(status_code=404, detail="Produto não encontrado.")
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
+        status, corpo, repetida = executar_idempotente(
+            chave, rota, payload.model_dump() if payload is not None else {}, executar
+        )
+    except ChaveReutilizada as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    headers = {"Idempotent-Replayed": "true"} if repetida else None
+    return JSONResponse(corpo, status_code=status, headers=headers)
+
+
+@app.post("/api/estoque/entrada")
+def api_entrada_estoque(
+    payload: MovimentoEstoque,
+    idempotency_key: str | None = Header(None, max_length=255),
+):
+    def executar():
+        try:
+            produto = move_stock_by_id(payload.produto_id, float(payload.quantidade))
+            return {"ok": True, "produto": produto}
+        except ProdutoNaoEncontrado:
+            raise HTTPException(status_code=404, detail="Produto não encontrado.")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    return _idempotente(idempotency_key, "entrada", payload, executar)
 
 
 @app.post("/api/estoque/saida")
-def api_saida_estoque(payload: MovimentoEstoque):
-    try:
-        produto = move_stock_by_id(payload.produto_id, -float(payload.quantidade))
-        return {"ok": True, "produto": produto}
-    except ProdutoNaoEncontrado:
-        raise HTTPException(status_code=404, detail="Produto não encontrado.")
-    except EstoqueInsuficiente:
-        raise HTTPException(status_code=400, detail="Estoque insuficiente.")
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
+def api_saida_estoque(
+    payload: MovimentoEstoque,
+    idempotency_key: str | None = Header(None, max_length=255),
+):
+    def executar():
+        try:
+            produto = move_stock_by_id(payload.produto_id, -float(payload.quantidade))
+            return {"ok": True, "produto": produto}
+        except ProdutoNaoEncontrado:
+            raise HTTPException(status_code=404, detail="Produto não encontrado.")
+        except EstoqueInsuficiente:
+            raise HTTPException(status_code=400, detail="Estoque insuficiente.")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    return _idempotente(idempotency_key, "saida", payload, executar)
+
+
+@app.post("/api/estoque/lote")
+def api_lote_estoque(
+    payload: LoteMovimentos,
+    idempotency_key: str | None = Header(None, max_length=255),
+):
+    """
+    Várias entradas/saídas numa requisição, gravadas juntas (tudo ou nada).
+    Se algum item falhar, nada é gravado e a resposta 400 traz os resultados por item.
+    """
+    def executar():
+        itens = [
+            {
+                "produto_id": item.produto_id,
+                "delta": float(item.quantidade) if item.tipo == "entrada" else -float(item.quantidade),
+                "motivo": item.motivo,
+            }
+            for item in payload.itens
+        ]
+        resultado = movimentar_lote(itens)
+        if not resultado["aplicado"]:
+            raise HTTPException(
+                status_code=400,
+                detail={"mensagem": "Nenhum movimento gravado: corrija os itens com erro.", "resultados": resultado["resultados"]},
+            )
+        return {"ok": True, "resultados": resultado["resultados"]}
+
+    return _idempotente(idempotency_key, "lote", payload, executar)
 
 
 @app.get("/api/produtos/abaixo-minimo")
-def api_abaixo_minimo():
-    abaixo = produtos_abaixo_minimo()
-    return sorted(abaixo, key=lambda x: str(x.get("nome", "")).lower())
+def api_abaixo_minimo(request: Request):
+    return _resposta_catalogo(
+        request,
+        "abaixo-minimo",
+        lambda: sorted(produtos_abaixo_minimo(), key=lambda x: str(x.get("nome", "")).lower()),
+    )
+
+def _codificar_cursor(offset: int, geracao: str) -> str:
+    bruto = json.dumps({"s": ARQUIVO_HISTORICO.name, "g": str(geracao), "o": int(offset)}).encode("utf-8")
+    return base64.urlsafe_b64encode(bruto).decode("ascii").rstrip("=")
+
+
+def _decodificar_cursor(cursor: str) -> int:
+    """Cursor opaco = segmento do histórico + geração do arquivo + offset em bytes."""
+    try:
+        bruto = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        dados = json.loads(bruto)
+        if dados.get("s") != ARQUIVO_HISTORICO.name:
+            raise ValueError()
+        geracao = str(dados["g"])
+        offset = int(dados["o"])
+        if offset < 0:
+            raise ValueError()
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido.")
+    if geracao != geracao_historico():
+        # offsets do arquivo antigo não valem no novo
+        raise HTTPException(status_code=400, detail="Cursor expirado: o histórico foi reorganizado. Recomece a listagem.")
+    return offset
+
 
 @app.get("/api/historico")
-def api_historico(limite: int = 200):
+def api_historico(
+    response: Response,
+    limite: int = 200,
+    cursor: str | None = None,
+    de: date | None = None,
+    ate: date | None = None,
+    produto_id: int | None = None,
+    tipo: Literal["entrada", "saida"] | None = None,
+):
     """
     Retorna o histórico de movimentações (mais recentes primeiro).
-    limite: quantos eventos retornar (padrão 200).
+    limite: quantos eventos por página (padrão 200).
+    Se houver mais, o header X-Proximo-Cursor traz o cursor da próxima página
+    (repasse em ?cursor=). Filtros: de/ate (YYYY-MM-DD), produto_id, tipo.
     """
     if limite < 1:
         limite = 1
     if limite > 5000:
         limite = 5000  # evita respostas gigantes
 
-    movimentos = listar_movimentos(limite=limite)
-    movimentos = list(reversed(movimentos))  # mais recentes primeiro
+    inicio = _decodificar_cursor(cursor) if cursor else None
+    # geração lida ANTES da página: se o arquivo for trocado no meio, o próximo cursor expira
+    geracao = geracao_historico()
+    movimentos, proximo = pagina_movimentos(
+        cursor=inicio, limite=limite, de=de, ate=ate, produto_id=produto_id, tipo=tipo
+    )
+    if proximo is not None:
+        response.headers["X-Proximo-Cursor"] = _codificar_cursor(proximo, geracao)
     return movimentos
+
+
+def _ndjson_em_blocos(movimentos, tamanho_bloco: int = 64 * 1024):
+    """Agrupa linhas NDJSON em blocos (~64 KiB) para não enviar um chunk por evento."""
+    buf: list[bytes] = []
+    tamanho = 0
+    for m in movimentos:
+        linha = (json.dumps(m, ensure_ascii=False) + "\n").encode("utf-8")
+        buf.append(linha)
+        tamanho += len(linha)
+        if tamanho >= tamanho_bloco:
+            yield b"".join(buf)
+            buf.clear()
+            tamanho = 0
+    if buf:
+        yield b"".join(buf)
+
+
+def _gzip_em_fluxo(blocos):
+    comp = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> formato gzip
+    for bloco in blocos:
+        saida = comp.compress(bloco)
+        if saida:
+            yield saida
+    yield comp.flush()
+
+
+@app.get("/api/historico/stream")
+def api_historico_stream(
+    de: date | None = None,
+    ate: date | None = None,
+    produto_id: int | None = None,
+    tipo: Literal["entrada", "saida"] | None = None,
+    q: str | None = None,
+    gzip: bool = False,
+):
+    """
+    Histórico completo em NDJSON (um movimento por linha, mais antigos primeiro),
+    gerado em fluxo direto do arquivo. Mesmos filtros da exportação da interface
+    (q = termo no nome do item). gzip=true comprime a resposta (Content-Encoding: gzip).
+    """
+    movimentos = iter_movimentos(de=de, ate=ate, produto_id=produto_id, tipo=tipo, termo=q)
+    corpo = _ndjson_em_blocos(movimentos)
+    headers = {"Content-Disposition": 'inline; filename="historico.ndjson"'}
+    if gzip:
+        corpo = _gzip_em_fluxo(corpo)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(corpo, media_type="application/x-ndjson", headers=headers)
+
+
+# Inventário colaborativo: uma sessão aberta por vez, contada de vários aparelhos.
+def _sessao_ou_404(sessao_id: str) -> dict:
+    try:
+        return carregar_sessao(sessao_id)
+    except SessaoNaoEncontrada:
+        raise HTTPException(status_code=404, detail="Sessão de contagem não encontrada.")
+
+
+@app.post("/api/inventario")
+def api_abrir_inventario():
+    """Abre uma sessão de contagem (ou devolve a que já está aberta)."""
+    return progresso_sessao(iniciar_sessao())
+
+
+@app.get("/api/inventario")
+def api_inventario_aberto():
+    sessao = sessao_aberta()
+    if sessao is None:
+        raise HTTPException(status_code=404, detail="Nenhuma contagem em andamento.")
+    return progresso_sessao(sessao)
+
+
+@app.get("/api/inventario/{sessao_id}")
+def api_inventario(sessao_id: str):
+    """Progresso da sessão e os valores contados até agora."""
+    sessao = _sessao_ou_404(sessao_id)
+    resposta = progresso_sessao(sessao)
+    resposta["contagens"] = [sessao["contagens"][pid] for pid in sorted(sessao["contagens"])]
+    return resposta
+
+
+@app.post("/api/inventario/{sessao_id}/contagens")
+def api_enviar_contagens(
+    sessao_id: str,
+    payload: EnvioContagens,
+    idempotency_key: str | None = Header(None, max_length=255),
+):
+    """
+    Envia contagens de um aparelho. modo "substituir": o último envio do item vale;
+    "somar": soma ao já contado (ex.: o mesmo item em prateleiras diferentes).
+    """
+    def executar():
+        _sessao_ou_404(sessao_id)
+        contagens: dict[int, float | None] = {}
+        for item in payload.itens:
+            if payload.modo == "somar" and item.produto_id in contagens and item.contado is not None:
+                contagens[item.produto_id] = (contagens[item.produto_id] or 0.0) + item.contado
+            else:
+                contagens[item.produto_id] = item.contado
+        try:
+            resultado = registrar_contagens(sessao_id, contagens, origem=payload.origem, modo=payload.modo)
+        except SessaoEncerrada as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return {
+            "ok": True,
+            "contagens": [{"produto_id": pid, "contado": v} for pid, v in resultado.items()],
+            "progresso": progresso_sessao(carregar_sessao(sessao_id)),
+        }
+
+    return _idempotente(idempotency_key, f"inventario/{sessao_id}/contagens", payload, executar)
+
+
+@app.post("/api/inventario/{sessao_id}/encerrar")
+def api_encerrar_inventario(
+    sessao_id: str,
+    idempotency_key: str | None = Header(None, max_length=255),
+):
+    """
+    Aplica os ajustes (contado - estoque do início da sessão) num único lote e
+    encerra a sessão. Se algum item falhar, nada é gravado e a sessão continua aberta.
+    """
+    def executar():
+        _sessao_ou_404(sessao_id)
+        try:
+            resultado = encerrar_sessao(sessao_id)
+        except SessaoEncerrada as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        if not resultado["aplicado"]:
+            raise HTTPException(
+                status_code=400,
+                detail={"mensagem": "Nenhum ajuste gravado: corrija os itens com erro.", "resultados": resultado["resultados"]},
+            )
+        return {"ok": True, "ajustes": resultado["ajustes"], "resultados": resultado["resultados"]}
+
+    return _idempotente(idempotency_key, f"inventario/{sessao_id}/encerrar", None, executar)
+
+
+@app.delete("/api/inventario/{sessao_id}")
+def api_descartar_inventario(sessao_id: str):
+    _sessao_ou_404(sessao_id)
+    descartar_sessao(sessao_id)
+    return {"ok": True}
+
+
+# Server-Sent Events: cada cliente conectado tem sua fila no event loop.
+# O core notifica na thread que gravou; call_soon_threadsafe leva o evento ao loop.
+SSE_KEEPALIVE_S = 15
+SSE_MAX_PENDENTES = 500
+
+_clientes_sse: set[tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = set()
+
+
+def _entregar_sse(fila: asyncio.Queue, evento: dict) -> None:
+    try:
+        fila.put_nowait(evento)
+    except asyncio.QueueFull:
+        # cliente lento: descarta o acumulado e pede para recarregar tudo
+        while not fila.empty():
+            fila.get_nowait()
+        fila.put_nowait({"tipo": "recarregar"})
+
+
+def _publicar_sse(evento: dict) -> None:
+    for loop, fila in list(_clientes_sse):
+        try:
+            loop.call_soon_threadsafe(_entregar_sse, fila, evento)
+        except RuntimeError:
+            # loop já encerrado
+            _clientes_sse.discard((loop, fila))
+
+
+# Gravações de outro processo (a interface desktop) não passam por
+# assinar_alteracoes: um vigia compara a versão dos dados e publica "recarregar".
+VERIFICAR_VERSAO_S = 1.0
+
+_trava_vigia = threading.Lock()
+_vigia_iniciado = False
+_versao_conhecida = versao_dados()
+_gravada_vista = versao_gravada()
+
+
+def _ao_gravar(evento: dict) -> None:
+    """Gravação deste processo (chamado sob a trava de gravação do core)."""
+    global _versao_conhecida, _gravada_vista
+    if evento.get("tipo") != "inventario":
+        with _trava_vigia:
+            # versão de logo depois da nossa gravação: uma gravação externa depois dela ainda aparece
+            _gravada_vista = _versao_conhecida = versao_gravada()
+    _publicar_sse(evento)
+
+
+assinar_alteracoes(_ao_gravar)
+
+
+def _verificar_gravacao_externa() -> bool:
+    """Uma rodada do vigia: True (e "recarregar" publicado) se outro processo gravou."""
+    global _versao_conhecida
+    with _trava_vigia:
+        if versao_gravada() != _gravada_vista:
+            return False  # gravação deste processo cujo aviso ainda não chegou
+        atual = versao_dados()
+        if atual == _versao_conhecida:
+            return False
+        _versao_conhecida = atual
+    _publicar_sse({"tipo": "recarregar"})
+    return True
+
+
+def _vigiar_versao() -> None:
+    while True:
+        time.sleep(VERIFICAR_VERSAO_S)
+        if not _clientes_sse:
+            continue
+        try:
+            _verificar_gravacao_externa()
+        except Exception:
+            pass  # arquivo sendo trocado; a próxima rodada vê
+
+
+def _iniciar_vigia() -> None:
+    global _vigia_iniciado
+    with _trava_vigia:
+        if _vigia_iniciado:
+            return
+        _vigia_iniciado = True
+    threading.Thread(target=_vigiar_versao, name="vigia-versao-sse", daemon=True).start()
+
+
+def _formatar_sse(evento: dict) -> str:
+    dados = json.dumps(evento, ensure_ascii=False)
+    return f"event: {evento.get('tipo', 'mensagem')}\ndata: {dados}\n\n"
+
+
+@app.get("/api/eventos")
+async def api_eventos():
+    """
+    Fluxo SSE com as alterações já gravadas (text/event-stream).
+    Eventos: "movimento" (produto + movimento), "produto_criado" (produto),
+    "inventario" (contagens enviadas ou sessão encerrada) e "recarregar"
+    (importação/restauração ou gravação de outro processo, ex.: a interface
+    desktop: buscar /api/produtos de novo).
+    """
+    _iniciar_vigia()
+    loop = asyncio.get_running_loop()
+    fila: asyncio.Queue = asyncio.Queue(maxsize=SSE_MAX_PENDENTES)
+    cliente = (loop, fila)
+    _clientes_sse.add(cliente)
+
+    async def fluxo():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    evento = await asyncio.wait_for(fila.get(), timeout=SSE_KEEPALIVE_S)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"  # mantém a conexão viva em proxies
+                    continue
+                yield _formatar_sse(evento)
+        finally:
+            _clientes_sse.discard(cliente)
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(fluxo(), media_type="text/event-stream", headers=headers)
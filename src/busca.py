@@ -0,0 +1,328 @@
+"""
+Busca de itens por nome (normalização compartilhada por GUI, core e API).
+"""
+from __future__ import annotations
+
+import re
+import unicodedata
+import heapq
+from bisect import bisect_left, insort
+from collections import Counter, OrderedDict
+from functools import lru_cache
+from itertools import chain
+from typing import Any, Iterable
+
+
+def remover_acentos(s: str) -> str:
+    nfkd = unicodedata.normalize("NFKD", s)
+    return "".join(ch for ch in nfkd if not unicodedata.combining(ch))
+
+
+# nomes se repetem muito (ex.: histórico): normalização memoizada pelo texto cru
+CACHE_NORMALIZACAO = 16384
+
+
+@lru_cache(maxsize=CACHE_NORMALIZACAO)
+def normalizar_busca(s: str) -> str:
+    """
+    Normalização 'premium':
+    - lower
+    - remove acentos
+    - troca pontuação por espaço (coca-cola == coca cola)
+    - normaliza múltiplos espaços
+    """
+    s = remover_acentos(s).lower()
+    s = re.sub(r"[^a-z0-9]+", " ", s, flags=re.IGNORECASE)  # pontuação -> espaço
+    s = " ".join(s.split())
+    return s
+
+
+def match_prefix_por_palavras(query_tokens: list[str], name_tokens: list[str]) -> bool:
+    """query tokens são prefixos dos tokens correspondentes do nome."""
+    if not query_tokens:
+        return True
+    if len(query_tokens) > len(name_tokens):
+        return False
+    for i, qt in enumerate(query_tokens):
+        if not name_tokens[i].startswith(qt):
+            return False
+    return True
+
+
+def match_tokens_em_ordem(query_tokens: list[str], name_tokens: list[str]) -> bool:
+    """Tokens do query aparecem em ordem (por prefixo), não necessariamente contíguos."""
+    if not query_tokens:
+        return True
+    j = 0
+    for nt in name_tokens:
+        if nt.startswith(query_tokens[j]):
+            j += 1
+            if j == len(query_tokens):
+                return True
+    return False
+
+
+# maior que qualquer caractere: (prefixo + _FIM) fecha a faixa de um prefixo no bisect
+_FIM = "\U0010ffff"
+
+# Busca aproximada (erros de digitação: "arros", "feijao pretu")
+APROX_MIN_CARACTERES = 3   # buscas menores que isso não usam trigramas
+APROX_SIMILARIDADE_MIN = 0.6  # fração dos trigramas da busca presentes no nome
+APROX_TOP_K = 20
+
+# Consultas recentes guardadas (apagar letras volta a uma consulta já calculada)
+CACHE_CONSULTAS = 32
+
+
+def trigramas(tokens: list[str], ultimo_parcial: bool = False) -> set[str]:
+    """
+    Trigramas de cada palavra com bordas ("  arroz " -> "  a", " ar", "arr", ...).
+    ultimo_parcial: a última palavra ainda está sendo digitada (sem borda final).
+    """
+    tris: set[str] = set()
+    for i, t in enumerate(tokens):
+        fim = "" if (ultimo_parcial and i == len(tokens) - 1) else " "
+        s = f"  {t}{fim}"
+        tris.update(s[j:j + 3] for j in range(len(s) - 2))
+    return tris
+
+
+class IndiceBusca:
+    """
+    Busca premium com nomes já normalizados (calculados uma vez, não a cada tecla).
+
+    Ranking em 4 grupos, na ordem de exibição (nome em minúsculas) dentro de cada grupo:
+        A) nome começa com a busca
+        B) cada palavra da busca é prefixo da palavra correspondente do nome
+        C) busca aparece em qualquer ponto do nome
+        D) palavras da busca aparecem em ordem (por prefixo)
+        E) parecidos (trigramas), os APROX_TOP_K mais similares, para erros de digitação
+
+    Nos grupos A–D, cada palavra da busca aparece dentro de alguma palavra do
+    nome. Por isso o índice guarda os sufixos de todas as palavras numa lista
+    ordenada: os candidatos de uma palavra saem de uma faixa achada com bisect,
+    e só eles são testados (em vez do catálogo inteiro a cada tecla).
+    O grupo E conta, pelas listas de cada trigrama, quantos trigramas da busca
+    cada item tem, e fica com os melhores num heap.
+
+    Refinamento: quem casa com "arroz" nos grupos A–D também casa com "arr".
+    Então, ao continuar digitando, só os resultados da consulta anterior (a mais
+    longa em cache que é prefixo da nova) são reclassificados. As últimas
+    CACHE_CONSULTAS consultas ficam num LRU, que é limpo quando o índice muda.
+
+    itens: pares (chave, nome). adicionar/remover/atualizar mantêm o índice
+    sem reconstruir.
+    """
+
+    def __init__(self, itens: Iterable[tuple[Any, str]] = ()) -> None:
+        # chave -> (nome normalizado, palavras, ordem de exibição)
+        self._itens: dict[Any, tuple[str, list[str], tuple[str, int]]] = {}
+        # (sufixo de palavra, nº sequencial do item, chave), ordenada
+        self._sufixos: list[tuple[str, int, Any]] = []
+        # (ordem, chave), ordenada
+        self._ordem: list[tuple[tuple[str, int], Any]] = []
+        # trigrama -> chaves que o contêm
+        self._trigramas: dict[str, set] = {}
+        # consulta normalizada -> [grupos A–D (ordenados sob demanda), grupo já ordenado?,
+        #                         conjunto de A–D, grupo E (calculado sob demanda)]
+        self._consultas: "OrderedDict[str, list]" = OrderedDict()
+        self._seq = 0
+
+        sufixos = []
+        for chave, nome in itens:
+            for entrada in self._registrar(chave, nome):
+                sufixos.append(entrada)
+        sufixos.sort()
+        self._sufixos = sufixos
+        self._ordem = sorted((ordem, chave) for chave, (_, _, ordem) in self._itens.items())
+
+    @staticmethod
+    def _entradas_sufixos(tokens: list[str], seq: int, chave: Any) -> set:
+        return {(t[i:], seq, chave) for t in tokens for i in range(len(t))}
+
+    def _registrar(self, chave: Any, nome: str) -> set:
+        nn = normalizar_busca(str(nome))
+        tokens = nn.split()
+        ordem = (str(nome).lower(), self._seq)
+        self._seq += 1
+        self._itens[chave] = (nn, tokens, ordem)
+        for tri in trigramas(tokens):
+            self._trigramas.setdefault(tri, set()).add(chave)
+        return self._entradas_sufixos(tokens, ordem[1], chave)
+
+    def __len__(self) -> int:
+        return len(self._itens)
+
+    def __contains__(self, chave: Any) -> bool:
+        return chave in self._itens
+
+    def chaves(self) -> list[Any]:
+        return [chave for _, chave in self._ordem]
+
+    # ---------- atualização incremental ----------
+    def adicionar(self, chave: Any, nome: str) -> None:
+        if chave in self._itens:
+            self.remover(chave)
+        self._consultas.clear()
+        for entrada in self._registrar(chave, nome):
+            insort(self._sufixos, entrada)
+        insort(self._ordem, (self._itens[chave][2], chave))
+
+    def remover(self, chave: Any) -> None:
+        item = self._itens.pop(chave, None)
+        if item is None:
+            return
+        self._consultas.clear()
+        _, tokens, ordem = item
+        for suf, _, _ in self._entradas_sufixos(tokens, ordem[1], chave):
+            i = bisect_left(self._sufixos, (suf, ordem[1]))
+            del self._sufixos[i]
+        i = bisect_left(self._ordem, (ordem,))
+        del self._ordem[i]
+        for tri in trigramas(tokens):
+            chaves = self._trigramas.get(tri)
+            if chaves is not None:
+                chaves.discard(chave)
+                if not chaves:
+                    del self._trigramas[tri]
+
+    def atualizar(self, chave: Any, nome: str) -> None:
+        """Adiciona ou renomeia; não faz nada se o nome não mudou."""
+        item = self._itens.get(chave)
+        if item is not None and item[2][0] == str(nome).lower():
+            return
+        self.adicionar(chave, nome)
+
+    # ---------- busca ----------
+    def _faixa(self, palavra: str) -> tuple[int, int]:
+        lo = bisect_left(self._sufixos, (palavra,))
+        hi = bisect_left(self._sufixos, (palavra + _FIM,), lo)
+        return lo, hi
+
+    def _candidatos(self, qtoks: list[str]) -> Iterable[Any]:
+        # usa a palavra com menos ocorrências (faixa menor) para gerar candidatos
+        lo, hi = min((self._faixa(qt) for qt in qtoks), key=lambda f: f[1] - f[0])
+        if hi - lo >= len(self._itens):
+            # busca curta (ex.: uma letra): a faixa cobre quase tudo, testar todos sai mais barato
+            return self._itens.keys()
+        return {self._sufixos[i][2] for i in range(lo, hi)}
+
+    def _aproximados(self, qtoks: list[str], excluir: set, k: int) -> list[Any]:
+        qtris = trigramas(qtoks, ultimo_parcial=True)
+        listas = [self._trigramas[t] for t in qtris if t in self._trigramas]
+        minimo = APROX_SIMILARIDADE_MIN * len(qtris)
+        contagem = Counter(chain.from_iterable(listas))
+
+        melhores = heapq.nsmallest(
+            k,
+            (
+                # mais trigramas em comum primeiro; empate -> nome mais curto, depois ordem
+                (-n, len(self._itens[chave][0]), self._itens[chave][2], chave)
+                for chave, n in contagem.items()
+                if n >= minimo and chave not in excluir
+            ),
+            key=lambda t: t[:3],
+        )
+        return [t[3] for t in melhores]
+
+    def _refinar_de(self, q: str) -> set | None:
+        """Resultado A–D da consulta em cache mais longa que é prefixo de q."""
+        melhor = None
+        for anterior in self._consultas:
+            if q.startswith(anterior) and (melhor is None or len(anterior) > len(melhor)):
+                melhor = anterior
+        if melhor is None:
+            return None
+        self._consultas.move_to_end(melhor)
+        return self._consultas[melhor][2]
+
+    def _calcular(self, q: str) -> list:
+        qtoks = q.split()
+        candidatos = self._refinar_de(q)
+        if candidatos is None:
+            candidatos = self._candidatos(qtoks)
+
+        grupos: tuple[list, list, list, list] = ([], [], [], [])
+        itens = self._itens
+        if len(qtoks) == 1:
+            # uma palavra: quem não começa com ela (A) só pode estar em C
+            # (B e D exigiriam o mesmo que A ou C); é o caso das buscas curtas,
+            # que casam com boa parte do catálogo
+            a, c = grupos[0], grupos[2]
+            for chave in candidatos:
+                nome_norm, _, ordem = itens[chave]
+                if nome_norm.startswith(q):
+                    a.append((ordem, chave))
+                elif q in nome_norm:
+                    c.append((ordem, chave))
+            conjunto = {chave for _, chave in chain(a, c)}
+            return [grupos, [False] * len(grupos), conjunto, None]
+
+        for chave in candidatos:
+            nome_norm, ntoks, ordem = itens[chave]
+            if nome_norm.startswith(q):
+                g = 0
+            elif match_prefix_por_palavras(qtoks, ntoks):
+                g = 1
+            elif q in nome_norm:
+                g = 2
+            elif match_tokens_em_ordem(qtoks, ntoks):
+                g = 3
+            else:
+                continue
+            grupos[g].append((ordem, chave))
+
+        # grupos guardados sem ordenar: buscar() ordena só o que vai devolver
+        conjunto = {chave for grupo in grupos for _, chave in grupo}
+        return [grupos, [False] * len(grupos), conjunto, None]
+
+    @staticmethod
+    def _estritos(item: list, limite: int | None) -> list[Any]:
+        """Os `limite` primeiros de A–D: nsmallest por grupo em vez de ordenar tudo."""
+        grupos, ordenado = item[0], item[1]
+        estritos: list[Any] = []
+        for g, grupo in enumerate(grupos):
+            falta = None if limite is None else limite - len(estritos)
+            if falta == 0:
+                break
+            if ordenado[g] or falta is None or falta >= len(grupo):
+                if not ordenado[g]:
+                    grupo.sort()  # uma vez; a consulta fica em cache
+                    ordenado[g] = True
+                fatia = grupo if falta is None else grupo[:falta]
+            else:
+                fatia = heapq.nsmallest(falta, grupo)
+            estritos.extend(chave for _, chave in fatia)
+        return estritos
+
+    def buscar(self, texto: str, limite: int | None = None) -> list[Any]:
+        """
+        Chaves na ordem do ranking. Com `limite`, o custo de ordenar é o do
+        que é devolvido (a busca de 1–2 letras casa quase o catálogo inteiro).
+        """
+        q = normalizar_busca(texto)
+        if not q:
+            if limite is None:
+                return self.chaves()
+            return [chave for _, chave in self._ordem[:limite]]
+
+        item = self._consultas.get(q)
+        if item is None:
+            item = self._calcular(q)
+            self._consultas[q] = item
+            while len(self._consultas) > CACHE_CONSULTAS:
+                self._consultas.popitem(last=False)
+        else:
+            self._consultas.move_to_end(q)
+
+        conjunto, aproximados = item[2], item[3]
+        estritos = self._estritos(item, limite)
+        if limite is not None and len(estritos) >= limite:
+            return estritos
+
+        if aproximados is None:
+            aproximados = []
+            if len(q) >= APROX_MIN_CARACTERES:
+                aproximados = self._aproximados(q.split(), conjunto, APROX_TOP_K)
+            item[3] = aproximados
+        return (estritos + aproximados)[:limite]
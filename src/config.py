@@ -36,8 +36,14 @@ ARQUIVO_DADOS = DADOS_DIR / "dados.json"
 BACKUP_DIR = DADOS_DIR / "backup"
 BACKUP_DIR.mkdir(exist_ok=True)
 ARQUIVO_CONFIG = DADOS_DIR / "config_usuario.json"
+ARQUIVO_IDEMPOTENCIA = DADOS_DIR / "idempotencia.jsonl"
 
 HISTORICO_DIR = DADOS_DIR / "historico"
 ARQUIVO_HISTORICO = HISTORICO_DIR / "movimentos.jsonl"
+# contador de reescritas do histórico (importação/restauração); acréscimos não contam
+ARQUIVO_GERACAO_HISTORICO = HISTORICO_DIR / "movimentos.geracao"
 HISTORICO_DIR.mkdir(exist_ok=True)
 
+
+INVENTARIO_DIR = DADOS_DIR / "inventario"
+INVENTARIO_DIR.mkdir(exist_ok=True)
@@ -1,10 +1,15 @@
 from __future__ import annotations
 
 import json
+import os
 import shutil
-from datetime import datetime
-from typing import Any, Dict, List
-from .config import ARQUIVO_DADOS, BACKUP_DIR, ARQUIVO_HISTORICO, ARQUIVO_CONFIG
+import threading
+import time
+from collections import deque
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Sequence
+from .config import ARQUIVO_DADOS, BACKUP_DIR, ARQUIVO_HISTORICO, ARQUIVO_CONFIG, ARQUIVO_GERACAO_HISTORICO
+from .busca import IndiceBusca, normalizar_busca
 
 import csv
 from pathlib import Path
@@ -26,37 +31,477 @@ class ProdutoDuplicado(Exception):
 def _normalizar_nome(nome: str) -> str:
     return " ".join(nome.strip().lower().split())
 
-from openpyxl import load_workbook
+def _indice_por_nome(produtos: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Índice nome normalizado -> produto (mesma regra do bloqueio de duplicados)."""
+    return {_normalizar_nome(str(p.get("nome", ""))): p for p in produtos}
+
+
+def _normalizar_cabecalho(txt: Any) -> str:
+    import unicodedata
+    s = unicodedata.normalize("NFKD", str(txt or ""))
+    s = "".join(ch for ch in s if not unicodedata.combining(ch)).lower()
+    s = "".join(ch if ch.isalnum() else " " for ch in s)
+    return " ".join(s.split())
+
+
+# cabeçalho normalizado -> campo
+COLUNAS_PLANILHA = {
+    "nome": "nome", "item": "nome", "produto": "nome", "descricao": "nome", "material": "nome",
+    "unidade": "unidade", "un": "unidade", "unid": "unidade", "und": "unidade", "medida": "unidade",
+    "estoque": "estoque", "estoque final": "estoque", "estoque atual": "estoque", "saldo": "estoque",
+    "quantidade": "estoque", "qtd": "estoque", "qtde": "estoque",
+    "minimo": "minimo", "estoque minimo": "minimo", "min": "minimo",
+}
+
+# Planilha antiga da Vila, sem cabeçalho reconhecível: nome, entrada, saídas, estoque final
+COLUNAS_PLANILHA_LEGADO = {"nome": 0, "estoque": 3}
+
+MOTIVO_IMPORTACAO = "Importação de planilha"
+
+
+def _numero_planilha(v: Any) -> float | None:
+    if v is None or (isinstance(v, str) and not v.strip()):
+        return None
+    try:
+        return float(str(v).strip().replace(",", "."))
+    except Exception:
+        raise ValueError(f"valor numérico inválido: {v!r}")
+
+
+def _mapear_colunas(cabecalho: Sequence[Any]) -> Dict[str, int]:
+    mapa: Dict[str, int] = {}
+    for idx, titulo in enumerate(cabecalho):
+        campo = COLUNAS_PLANILHA.get(_normalizar_cabecalho(titulo))
+        if campo and campo not in mapa:
+            mapa[campo] = idx
+    return mapa
+
+
+def importar_planilha(
+    caminho_xlsx: str | Path,
+    simular: bool = False,
+    motivo: str = MOTIVO_IMPORTACAO,
+    progresso: Progresso | None = None,
+) -> Dict[str, Any]:
+    """
+    Importa (ou simula) uma planilha de estoque, mesclando com o catálogo atual.
+
+    - Lê em modo read-only (streaming) e mapeia colunas pelo cabeçalho
+      (nome/item/produto, unidade, estoque/saldo/quantidade, mínimo).
+    - Casa itens pelo nome normalizado: itens existentes recebem um movimento
+      com a diferença de estoque; itens novos são criados (e o estoque inicial
+      vira um movimento de entrada).
+    - Tudo é gravado de uma vez (um save + um append no histórico).
+    - simular=True não grava nada: só devolve o relatório de diferenças.
+
+    Retorna {"novos", "alterados", "sem_alteracao", "ignorados", "aplicado"}.
+    """
+    from openpyxl import load_workbook
+
+    wb = load_workbook(caminho_xlsx, read_only=True, data_only=True)
+    try:
+        ws = wb.active
+        total_linhas = ws.max_row or 0
+
+        # nome normalizado -> (linha, nome, unidade, estoque, minimo); a última ocorrência vence
+        linhas_planilha: Dict[str, tuple] = {}
+        ignorados: List[Dict[str, Any]] = []
+        mapa: Dict[str, int] | None = None
+
+        for n, row in enumerate(ws.iter_rows(values_only=True), 1):
+            if progresso is not None and n % 500 == 0:
+                progresso(n, total_linhas)
+
+            if not row or all(v is None or str(v).strip() == "" for v in row):
+                continue
+
+            if mapa is None:
+                mapa = _mapear_colunas(row)
+                if "nome" in mapa:
+                    continue  # era o cabeçalho
+                # sem cabeçalho reconhecido: layout antigo (primeira linha é título)
+                mapa = dict(COLUNAS_PLANILHA_LEGADO)
+                continue
+
+            def _col(campo: str) -> Any:
+                idx = mapa.get(campo)
+                return row[idx] if idx is not None and idx < len(row) else None
+
+            nome = str(_col("nome") or "").strip()
+            if not nome:
+                ignorados.append({"linha": n, "motivo": "Nome vazio."})
+                continue
+
+            try:
+                estoque = _numero_planilha(_col("estoque"))
+                minimo = _numero_planilha(_col("minimo"))
+            except ValueError as e:
+                ignorados.append({"linha": n, "nome": nome, "motivo": f"Linha com {e}."})
+                continue
+            if (estoque is not None and estoque < 0) or (minimo is not None and minimo < 0):
+                ignorados.append({"linha": n, "nome": nome, "motivo": "Valor negativo."})
+                continue
+
+            unidade = str(_col("unidade") or "").strip() or None
+            linhas_planilha[_normalizar_nome(nome)] = (n, nome, unidade, estoque, minimo)
+    finally:
+        wb.close()
+
+    # ler o catálogo, mesclar e gravar sob a mesma trava (API/GUI movimentando ao mesmo tempo)
+    with _trava_gravacao:
+        produtos = _carregar_produtos()
+        indice = _indice_por_nome(produtos)
+        proximo_id = _gerar_proximo_id(produtos)
+
+        novos: List[Dict[str, Any]] = []
+        alterados: List[Dict[str, Any]] = []
+        sem_alteracao = 0
+        eventos: List[Dict[str, Any]] = []
+
+        for chave, (n, nome, unidade, estoque, minimo) in linhas_planilha.items():
+            p = indice.get(chave)
+
+            if p is None:
+                novo = {
+                    "id": proximo_id,
+                    "nome": nome,
+                    "unidade": unidade or "un",
+                    "estoque_atual": float(estoque or 0.0),
+                    "estoque_minimo": float(minimo or 0.0),
+                }
+                proximo_id += 1
+                produtos.append(novo)
+                indice[chave] = novo
+                novos.append(dict(novo))
+                if novo["estoque_atual"]:
+                    eventos.append(_novo_movimento(novo["id"], nome, novo["estoque_atual"], 0.0, novo["estoque_atual"], motivo))
+                continue
+
+            mudancas: Dict[str, Any] = {}
+            antes = float(p.get("estoque_atual", 0.0))
+            if estoque is not None and abs(float(estoque) - antes) > 1e-9:
+                mudancas["estoque_atual"] = float(estoque)
+            if unidade and unidade != str(p.get("unidade", "")).strip():
+                mudancas["unidade"] = unidade
+            if minimo is not None and abs(float(minimo) - float(p.get("estoque_minimo", 0.0))) > 1e-9:
+                mudancas["estoque_minimo"] = float(minimo)
+
+            if not mudancas:
+                sem_alteracao += 1
+                continue
+
+            alterados.append({
+                "id": p.get("id"),
+                "nome": p.get("nome", ""),
+                "antes": {k: p.get(k) for k in mudancas},
+                "depois": dict(mudancas),
+            })
+            p.update(mudancas)
+            if "estoque_atual" in mudancas:
+                depois = mudancas["estoque_atual"]
+                eventos.append(_novo_movimento(int(p.get("id", 0)), str(p.get("nome", "")), depois - antes, antes, depois, motivo))
+
+        aplicado = False
+        if not simular and (novos or alterados):
+            _salvar_produtos(produtos)
+            _registrar_movimentos(eventos)
+            aplicado = True
+            _notificar({"tipo": "recarregar"})
+
+    if progresso is not None:
+        progresso(total_linhas, total_linhas)
+
+    return {
+        "novos": novos,
+        "alterados": alterados,
+        "sem_alteracao": sem_alteracao,
+        "ignorados": ignorados,
+        "aplicado": aplicado,
+    }
+
 
 def importar_planilha_inicial(caminho_xlsx: str) -> None:
-    wb = load_workbook(caminho_xlsx, data_only=True)
-    ws = wb.active
+    """Compatibilidade: importa mesclando com o catálogo atual."""
+    importar_planilha(caminho_xlsx)
+
+# cabeçalho normalizado -> campo (importação de movimentos)
+COLUNAS_MOVIMENTOS = {
+    "data": "ts", "data hora": "ts", "ts": "ts", "quando": "ts",
+    "id": "produto_id", "produto id": "produto_id", "id produto": "produto_id",
+    "item": "nome", "nome": "nome", "produto": "nome", "descricao": "nome",
+    "tipo": "tipo", "movimento": "tipo", "operacao": "tipo",
+    "quantidade": "quantidade", "qtd": "quantidade", "qtde": "quantidade", "delta": "quantidade",
+    "motivo": "motivo", "observacao": "motivo", "obs": "motivo", "origem": "motivo",
+}
+
+FORMATOS_DATA_BR = ("%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%d/%m/%Y", "%d/%m/%y")
+
+
+def _iter_tabela(caminho: str | Path) -> Iterator[Sequence[Any]]:
+    """Linhas de um CSV (; , ou tab) ou de um .xlsx (read-only), sem carregar tudo."""
+    caminho = Path(caminho)
+
+    if caminho.suffix.lower() in (".xlsx", ".xlsm"):
+        from openpyxl import load_workbook
+
+        wb = load_workbook(caminho, read_only=True, data_only=True)
+        try:
+            yield from wb.active.iter_rows(values_only=True)
+        finally:
+            wb.close()
+        return
+
+    with caminho.open("r", encoding="utf-8-sig", newline="") as f:
+        amostra = f.read(4096)
+        f.seek(0)
+        try:
+            delimitador = csv.Sniffer().sniff(amostra, delimiters=";,\t").delimiter
+        except csv.Error:
+            delimitador = ";"
+        yield from csv.reader(f, delimiter=delimitador)
+
+
+def _data_planilha(v: Any) -> datetime:
+    if isinstance(v, datetime):
+        return v.replace(microsecond=0)
+    if isinstance(v, date):
+        return datetime(v.year, v.month, v.day)
+    txt = str(v or "").strip()
+    if not txt:
+        raise ValueError("Data vazia.")
+    try:
+        return datetime.fromisoformat(txt).replace(microsecond=0, tzinfo=None)
+    except ValueError:
+        pass
+    for fmt in FORMATOS_DATA_BR:
+        try:
+            return datetime.strptime(txt, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"Data inválida: {txt!r}.")
+
+
+def _ts_da_linha(linha: bytes) -> str:
+    """ts de uma linha do histórico (atalho: o ts é sempre a primeira chave)."""
+    prefixo = b'{"ts": "'
+    if linha.startswith(prefixo):
+        return linha[len(prefixo):len(prefixo) + 19].decode("ascii", "replace")
+    try:
+        return str(json.loads(linha).get("ts", ""))
+    except Exception:
+        return ""
+
+
+def _ler_geracao_historico() -> int:
+    try:
+        return int(ARQUIVO_GERACAO_HISTORICO.read_text(encoding="ascii").strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def geracao_historico() -> str:
+    """
+    Identifica o conteúdo do histórico para cursores por offset: muda a cada
+    reescrita (importação de movimentos, restauração de backup), não a cada
+    acréscimo no fim. Contador explícito + inode (o inode sozinho se repete:
+    copiar por cima mantém o mesmo, e o sistema reaproveita inodes liberados).
+    """
+    try:
+        inode = ARQUIVO_HISTORICO.stat().st_ino
+    except OSError:
+        inode = 0
+    return f"{_ler_geracao_historico()}-{inode}"
+
+
+def _historico_reescrito() -> None:
+    """Chamar sob a trava de gravação, DEPOIS de trocar o arquivo."""
+    # depois da troca: quem leu a geração antiga e as linhas novas tem o cursor recusado
+    tmp = ARQUIVO_GERACAO_HISTORICO.with_name(ARQUIVO_GERACAO_HISTORICO.name + ".tmp")
+    tmp.write_text(str(_ler_geracao_historico() + 1), encoding="ascii")
+    _substituir(tmp, ARQUIVO_GERACAO_HISTORICO)
+
+
+def _mesclar_no_historico(eventos: List[Dict[str, Any]]) -> None:
+    """
+    Intercala eventos (já ordenados por ts) no histórico, mantendo a ordem
+    cronológica do arquivo. Uma passada: o histórico é copiado em fluxo para
+    um arquivo temporário, que substitui o original no final.
+    """
+    import heapq
+
+    if not eventos:
+        return
+
+    ARQUIVO_HISTORICO.parent.mkdir(parents=True, exist_ok=True)
+    novos = ((e["ts"], (json.dumps(e, ensure_ascii=False) + "\n").encode("utf-8")) for e in eventos)
+
+    def _existentes(f):
+        for linha in f:
+            if not linha.strip():
+                continue
+            if not linha.endswith(b"\n"):
+                linha += b"\n"
+            yield _ts_da_linha(linha), linha
+
+    tmp = ARQUIVO_HISTORICO.with_name(ARQUIVO_HISTORICO.name + ".tmp")
+    with tmp.open("wb") as out:
+        if ARQUIVO_HISTORICO.exists():
+            with ARQUIVO_HISTORICO.open("rb") as f:
+                # estável: em empate de ts, o que já estava no histórico vem antes
+                for _, linha in heapq.merge(_existentes(f), novos, key=lambda x: x[0]):
+                    out.write(linha)
+        else:
+            for _, linha in novos:
+                out.write(linha)
+    _substituir(tmp, ARQUIVO_HISTORICO)
+    _historico_reescrito()
+
+
+def importar_movimentos(
+    caminho: str | Path,
+    simular: bool = False,
+    motivo_padrao: str = "Importação de histórico",
+    progresso: Progresso | None = None,
+) -> Dict[str, Any]:
+    """
+    Importa em lote movimentos antigos (CSV ou .xlsx) para o histórico.
+
+    Colunas reconhecidas pelo cabeçalho: data, item (ou id), tipo
+    (entrada/saída), quantidade, motivo. Sem coluna tipo, a quantidade é
+    um delta com sinal (+entrada / -saída).
+
+    - Itens são resolvidos pelo ID ou pelo nome normalizado.
+    - Linhas válidas são ordenadas pela data e aplicadas ao saldo atual
+      numa única passada; linhas que deixariam o estoque negativo são rejeitadas.
+    - Os eventos importados NÃO trazem estoque_antes/estoque_depois: são
+      retroativos, e o saldo de cada data dependeria de movimentos que não
+      estão no arquivo. Só o delta (e o saldo final do produto) vale.
+    - Gravação única, sob a trava: saldos finais num save e os eventos
+      intercalados no histórico em ordem cronológica. O histórico é
+      reescrito, então cursores de /api/historico emitidos antes expiram.
+    - simular=True só valida e devolve o relatório.
+
+    Retorna {"aceitos", "rejeitados", "produtos_afetados", "aplicado"}.
+    """
+    produtos = _carregar_produtos()
+    indice_nome = _indice_por_nome(produtos)
+    indice_id: Dict[int, Dict[str, Any]] = {}
+    for p in produtos:
+        try:
+            indice_id[int(p.get("id", 0))] = p
+        except Exception:
+            continue
 
-    produtos = []
-    proximo_id = 1
+    validos: List[tuple] = []  # (dt, ordem, produto_id, delta, motivo)
+    rejeitados: List[Dict[str, Any]] = []
+    mapa: Dict[str, int] | None = None
 
-    for row in ws.iter_rows(min_row=2, values_only=True):
-        nome, entrada, saidas, estoque_final = row
+    for n, row in enumerate(_iter_tabela(caminho), 1):
+        if progresso is not None and n % 1000 == 0:
+            progresso(n, 0)
 
-        if not nome:
+        if not row or all(v is None or str(v).strip() == "" for v in row):
             continue
 
+        if mapa is None:
+            mapa = {}
+            for idx, titulo in enumerate(row):
+                campo = COLUNAS_MOVIMENTOS.get(_normalizar_cabecalho(titulo))
+                if campo and campo not in mapa:
+                    mapa[campo] = idx
+            if "ts" not in mapa or "quantidade" not in mapa or not ("nome" in mapa or "produto_id" in mapa):
+                raise ValueError("Cabeçalho inválido: são necessárias as colunas data, item (ou id) e quantidade.")
+            continue
+
+        def _col(campo: str) -> Any:
+            idx = mapa.get(campo)
+            return row[idx] if idx is not None and idx < len(row) else None
+
         try:
-            estoque = int(estoque_final or 0)
-        except:
-            estoque = 0
-
-        produto = {
-            "id": proximo_id,
-            "nome": str(nome).strip(),
-            "quantidade": estoque,
-            "estoque_minimo": 0
-        }
+            dt = _data_planilha(_col("ts"))
 
-        produtos.append(produto)
-        proximo_id += 1
+            p = None
+            pid_txt = str(_col("produto_id") or "").strip()
+            if pid_txt:
+                try:
+                    p = indice_id.get(int(float(pid_txt)))
+                except ValueError:
+                    p = None
+            if p is None:
+                nome = str(_col("nome") or "").strip()
+                p = indice_nome.get(_normalizar_nome(nome)) if nome else None
+            if p is None:
+                raise ValueError("Item não encontrado no cadastro.")
+
+            qtd = _numero_planilha(_col("quantidade"))
+            if qtd is None or qtd == 0:
+                raise ValueError("Quantidade vazia ou zero.")
+
+            tipo = _normalizar_cabecalho(_col("tipo"))
+            if tipo:
+                if qtd < 0:
+                    raise ValueError("Quantidade negativa com tipo informado.")
+                if tipo.startswith("entr"):
+                    delta = qtd
+                elif tipo.startswith("sai"):
+                    delta = -qtd
+                else:
+                    raise ValueError(f"Tipo inválido: {_col('tipo')!r}.")
+            else:
+                delta = qtd
+        except ValueError as e:
+            rejeitados.append({"linha": n, "motivo": str(e)})
+            continue
 
-    _salvar_produtos(produtos)
+        motivo = str(_col("motivo") or "").strip() or motivo_padrao
+        validos.append((dt, n, int(p.get("id", 0)), float(delta), motivo))
+
+    validos.sort(key=lambda x: (x[0], x[1]))
+
+    # o arquivo foi lido fora da trava; saldos e gravação usam o catálogo de agora
+    with _trava_gravacao:
+        produtos = _carregar_produtos()
+        indice_id = {}
+        for p in produtos:
+            try:
+                indice_id[int(p.get("id", 0))] = p
+            except Exception:
+                continue
+
+        # uma passada: saldos correntes por produto (partindo do saldo atual)
+        saldos: Dict[int, float] = {}
+        eventos: List[Dict[str, Any]] = []
+        for dt, n, pid, delta, motivo in validos:
+            p = indice_id.get(pid)
+            if p is None:
+                rejeitados.append({"linha": n, "motivo": "Item não encontrado no cadastro."})
+                continue
+            depois = saldos.get(pid, float(p.get("estoque_atual", 0.0))) + delta
+            if depois < -1e-9:
+                rejeitados.append({"linha": n, "motivo": f"Estoque insuficiente para '{p.get('nome', '')}'."})
+                continue
+            saldos[pid] = depois
+            # retroativo: sem saldo antes/depois (ver docstring)
+            eventos.append(_novo_movimento(pid, str(p.get("nome", "")), delta, None, None, motivo,
+                                           ts=dt.isoformat(timespec="seconds")))
+
+        rejeitados.sort(key=lambda r: r["linha"])
+
+        aplicado = False
+        if not simular and eventos:
+            for pid, saldo in saldos.items():
+                indice_id[pid]["estoque_atual"] = float(saldo)
+            _salvar_produtos(produtos)
+            _mesclar_no_historico(eventos)
+            aplicado = True
+            _notificar({"tipo": "recarregar"})
+
+    return {
+        "aceitos": len(eventos),
+        "rejeitados": rejeitados,
+        "produtos_afetados": len(saldos),
+        "aplicado": aplicado,
+    }
 
 def _carregar_produtos() -> List[Dict[str, Any]]:
     if not ARQUIVO_DADOS.exists():
@@ -94,6 +539,16 @@ def set_pasta_backup_externo(pasta: str) -> None:
 def get_pasta_backup_externo() -> str:
     return str(_ler_config_usuario().get("backup_externo_dir", "")).strip()
 
+def get_agenda_relatorios() -> dict:
+    """Agenda dos relatórios automáticos (pasta, frequencia, formatos, ultimo_ate)."""
+    agenda = _ler_config_usuario().get("relatorios_agendados", {})
+    return agenda if isinstance(agenda, dict) else {}
+
+def set_agenda_relatorios(agenda: dict) -> None:
+    cfg = _ler_config_usuario()
+    cfg["relatorios_agendados"] = dict(agenda or {})
+    _salvar_config_usuario(cfg)
+
 def _backup_externo() -> None:
     pasta = get_pasta_backup_externo()
     if not pasta:
@@ -125,11 +580,17 @@ def restaurar_backup_externo() -> bool:
         if not dados_origem.exists():
             return False
 
-        shutil.copy2(dados_origem, ARQUIVO_DADOS)
+        # roda numa thread enquanto a interface (e a API) podem estar movimentando:
+        # nenhuma gravação no meio, e quem lê vê o arquivo antigo ou o novo, nunca metade
+        with _trava_gravacao:
+            _copiar_substituindo(dados_origem, ARQUIVO_DADOS)
+            _marcar_alteracao()
 
-        if historico_origem.exists():
-            shutil.copy2(historico_origem, ARQUIVO_HISTORICO)
+            if historico_origem.exists():
+                _copiar_substituindo(historico_origem, ARQUIVO_HISTORICO)
+                _historico_reescrito()
 
+            _notificar({"tipo": "recarregar"})
         return True
 
     except Exception:
@@ -139,11 +600,108 @@ def estoque_ja_existe() -> bool:
     produtos = _carregar_produtos()
     return len(produtos) > 0
 
+# Serializa carregar -> alterar -> salvar (a API atende requisições em várias threads)
+_trava_gravacao = threading.RLock()
+
+
+# Assinantes de alterações (ex.: API -> Server-Sent Events).
+# Eventos: {"tipo": "movimento", "produto", "movimento"}, {"tipo": "produto_criado", "produto"}
+# e {"tipo": "recarregar"} (importações/restauração: mudou muita coisa de uma vez).
+_assinantes: List[Callable[[Dict[str, Any]], None]] = []
+
+
+def assinar_alteracoes(callback: Callable[[Dict[str, Any]], None]) -> Callable[[], None]:
+    """
+    Registra callback(evento), chamado depois de cada alteração já gravada,
+    na thread que gravou. Retorna a função que cancela a assinatura.
+    """
+    _assinantes.append(callback)
+
+    def cancelar() -> None:
+        try:
+            _assinantes.remove(callback)
+        except ValueError:
+            pass
+
+    return cancelar
+
+
+def _notificar(evento: Dict[str, Any]) -> None:
+    for callback in list(_assinantes):
+        try:
+            callback(evento)
+        except Exception:
+            # Assinante com problema nunca pode quebrar a gravação
+            pass
+
+
+def notificar_alteracao(evento: Dict[str, Any]) -> None:
+    """Avisa os assinantes de uma gravação feita fora do core (ex.: contagem de inventário)."""
+    _notificar(evento)
+
+
+# incrementado a cada gravação do catálogo neste processo (ver versao_dados)
+_versao_local = 0
+# versao_dados() logo depois da última gravação deste processo (ver versao_gravada)
+_versao_gravada = ""
+
+
+def _marcar_alteracao() -> None:
+    global _versao_local, _versao_gravada
+    _versao_local += 1
+    _versao_gravada = versao_dados()
+
+
+def versao_gravada() -> str:
+    """
+    Versão dos dados logo depois da última gravação deste processo (tirada
+    sob a trava de gravação). Quem recebe o aviso de uma alteração guarda esta,
+    e não a versão "de agora": uma gravação de outro processo entre a nossa e
+    o aviso mudaria o arquivo e passaria despercebida.
+    """
+    return _versao_gravada
+
+
+def versao_dados() -> str:
+    """
+    Versão do catálogo: muda a cada gravação, feita por este processo (contador)
+    ou por outro (ex.: GUI e API abertos juntos -> mtime/tamanho do arquivo).
+    """
+    try:
+        st = ARQUIVO_DADOS.stat()
+        return f"{_versao_local}-{st.st_mtime_ns}-{st.st_size}"
+    except OSError:
+        return f"{_versao_local}-0-0"
+
+
+def _substituir(tmp: Path, destino: Path) -> None:
+    """os.replace com algumas tentativas: no Windows falha enquanto alguém lê o destino."""
+    for tentativa in range(5):
+        try:
+            os.replace(tmp, destino)
+            return
+        except PermissionError:
+            if tentativa == 4:
+                raise
+            time.sleep(0.05)
+
+
+def _copiar_substituindo(origem: Path, destino: Path) -> None:
+    """Copia para um .tmp ao lado e troca de uma vez (leitor nunca vê cópia pela metade)."""
+    tmp = destino.with_name(destino.name + ".tmp")
+    shutil.copy2(origem, tmp)
+    _substituir(tmp, destino)
+
+
 def _salvar_produtos(produtos: List[Dict[str, Any]]) -> None:
     ARQUIVO_DADOS.parent.mkdir(parents=True, exist_ok=True)
 
-    with ARQUIVO_DADOS.open("w", encoding="utf-8") as f:
+    # .tmp + troca: a API (outro processo) nunca lê um dados.json pela metade
+    tmp = ARQUIVO_DADOS.with_name(ARQUIVO_DADOS.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
         json.dump(produtos, f, ensure_ascii=False, indent=2)
+    _substituir(tmp, ARQUIVO_DADOS)
+    _marcar_alteracao()
 
     try:
         BACKUP_DIR.mkdir(parents=True, exist_ok=True)
@@ -155,41 +713,69 @@ def _salvar_produtos(produtos: List[Dict[str, Any]]) -> None:
         pass
     _backup_externo()
 
-def _registrar_movimento(
+def _novo_movimento(
     produto_id: int,
     nome: str,
     delta: float,
-    estoque_antes: float,
-    estoque_depois: float,
+    estoque_antes: float | None,
+    estoque_depois: float | None,
     motivo: str | None = None,
-) -> None:
+    ts: str | None = None,
+) -> Dict[str, Any]:
+    evento = {
+        "ts": ts or datetime.now().isoformat(timespec="seconds"),
+        "produto_id": int(produto_id),
+        "nome": str(nome),
+        "delta": float(delta),  # +entrada / -saida
+    }
+    # None = saldo desconhecido (movimento retroativo importado)
+    if estoque_antes is not None:
+        evento["estoque_antes"] = float(estoque_antes)
+    if estoque_depois is not None:
+        evento["estoque_depois"] = float(estoque_depois)
+
+    if motivo:
+        evento["motivo"] = str(motivo)
+
+    return evento
+
+
+def _registrar_movimentos(eventos: List[Dict[str, Any]]) -> None:
     """
-    Registra um movimento em JSON Lines (%APPDATA%\\EstoqueONG\\historico\\movimentos.jsonl).
-    Um JSON por linha para ser fácil de ler/exportar depois.
+    Registra movimentos em JSON Lines (%APPDATA%\\EstoqueONG\\historico\\movimentos.jsonl).
+    Um JSON por linha para ser fácil de ler/exportar depois; lote = uma escrita só.
     """
+    if not eventos:
+        return
     try:
-        evento = {
-            "ts": datetime.now().isoformat(timespec="seconds"),
-            "produto_id": int(produto_id),
-            "nome": str(nome),
-            "delta": float(delta),  # +entrada / -saida
-            "estoque_antes": float(estoque_antes),
-            "estoque_depois": float(estoque_depois),
-        }
-
-        if motivo:
-            evento["motivo"] = str(motivo)
-
         # garante pasta (por segurança)
         ARQUIVO_HISTORICO.parent.mkdir(parents=True, exist_ok=True)
 
+        bloco = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in eventos)
         with ARQUIVO_HISTORICO.open("a", encoding="utf-8") as f:
-            f.write(json.dumps(evento, ensure_ascii=False) + "\n")
+            f.write(bloco)
     except Exception:
         # Histórico nunca pode quebrar o app
         pass
 
 
+def _registrar_movimento(
+    produto_id: int,
+    nome: str,
+    delta: float,
+    estoque_antes: float,
+    estoque_depois: float,
+    motivo: str | None = None,
+) -> None:
+    """Registra um único movimento no histórico."""
+    try:
+        evento = _novo_movimento(produto_id, nome, delta, estoque_antes, estoque_depois, motivo)
+    except Exception:
+        # Histórico nunca pode quebrar o app
+        return
+    _registrar_movimentos([evento])
+
+
 def listar_produtos() -> List[Dict[str, Any]]:
     """Retorna todos os produtos (lista de dicts) do JSON."""
     return _carregar_produtos()
@@ -217,21 +803,21 @@ def criar_produto(nome: str, unidade: str, estoque_minimo: float) -> Dict[str, A
     if estoque_min < 0:
         raise ValueError("Estoque mínimo inválido.")
 
-    produtos = _carregar_produtos()
-    nome_norm = _normalizar_nome(nome)
-    for p in produtos:
-        if _normalizar_nome(str(p.get("nome", ""))) == nome_norm:
+    with _trava_gravacao:
+        produtos = _carregar_produtos()
+        if _normalizar_nome(nome) in _indice_por_nome(produtos):
             raise ProdutoDuplicado("Produto já existe com esse nome.")
 
-    novo = {
-        "id": _gerar_proximo_id(produtos),
-        "nome": nome,
-        "unidade": unidade,
-        "estoque_atual": 0.0,
-        "estoque_minimo": float(estoque_min),
-    }
-    produtos.append(novo)
-    _salvar_produtos(produtos)
+        novo = {
+            "id": _gerar_proximo_id(produtos),
+            "nome": nome,
+            "unidade": unidade,
+            "estoque_atual": 0.0,
+            "estoque_minimo": float(estoque_min),
+        }
+        produtos.append(novo)
+        _salvar_produtos(produtos)
+        _notificar({"tipo": "produto_criado", "produto": dict(novo)})
     return novo
 
 
@@ -247,29 +833,124 @@ def move_stock_by_id(produto_id: int, delta: float, motivo: str | None = None) -
     except Exception:
         raise ValueError("Quantidade inválida.")
 
-    produtos = _carregar_produtos()
-    for p in produtos:
-        if int(p.get("id", 0)) == pid:
-            atual = float(p.get("estoque_atual", 0.0))
+    with _trava_gravacao:
+        produtos = _carregar_produtos()
+        for p in produtos:
+            if int(p.get("id", 0)) == pid:
+                atual = float(p.get("estoque_atual", 0.0))
+                novo = atual + d
+                if novo < 0:
+                    raise EstoqueInsuficiente(f"Estoque insuficiente para '{p.get('nome', '')}'.")
+                p["estoque_atual"] = float(novo)
+                _salvar_produtos(produtos)
+
+                evento = _novo_movimento(pid, str(p.get("nome", "")), d, atual, novo, motivo)
+                _registrar_movimentos([evento])
+                _notificar({"tipo": "movimento", "produto": dict(p), "movimento": evento})
+
+                return p
+
+    raise ProdutoNaoEncontrado(f"Produto com id {pid} não encontrado.")
+
+
+def movimentar_lote(itens: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Várias entradas/saídas de uma vez, tudo ou nada.
+    itens: [{"produto_id", "delta", "motivo"?}] (delta positivo=entrada; negativo=saída).
+    Valida todos em ordem (saldo acumulado: duas saídas do mesmo item somam) e, se
+    nenhum falhar, grava com um único salvamento/backup e uma escrita no histórico.
+    Retorna {"aplicado", "resultados"}; cada resultado tem "ok", "estoque_depois" e,
+    se aplicado, "produto" — ou "erro" (nesse caso nada é gravado).
+    """
+    with _trava_gravacao:
+        produtos = _carregar_produtos()
+        indice_id = {int(p.get("id", 0)): p for p in produtos}
+        saldos: Dict[int, float] = {}
+        eventos: List[Dict[str, Any]] = []
+        resultados: List[Dict[str, Any]] = []
+
+        for i, item in enumerate(itens):
+            try:
+                pid = int(item.get("produto_id"))
+            except Exception:
+                resultados.append({"indice": i, "ok": False, "erro": "ID inválido."})
+                continue
+            p = indice_id.get(pid)
+            if p is None:
+                resultados.append({"indice": i, "ok": False, "erro": f"Produto com id {pid} não encontrado."})
+                continue
+            try:
+                d = float(item.get("delta"))
+            except Exception:
+                resultados.append({"indice": i, "ok": False, "erro": "Quantidade inválida."})
+                continue
+
+            atual = saldos.get(pid, float(p.get("estoque_atual", 0.0)))
             novo = atual + d
             if novo < 0:
-                raise EstoqueInsuficiente(f"Estoque insuficiente para '{p.get('nome', '')}'.")
-            p["estoque_atual"] = float(novo)
+                resultados.append({"indice": i, "ok": False, "erro": f"Estoque insuficiente para '{p.get('nome', '')}'."})
+                continue
+
+            saldos[pid] = novo
+            eventos.append(_novo_movimento(pid, str(p.get("nome", "")), d, atual, novo, item.get("motivo")))
+            resultados.append({"indice": i, "ok": True, "estoque_depois": float(novo)})
+
+        aplicado = bool(eventos) and all(r["ok"] for r in resultados)
+        if aplicado:
+            for pid, saldo in saldos.items():
+                indice_id[pid]["estoque_atual"] = float(saldo)
             _salvar_produtos(produtos)
+            _registrar_movimentos(eventos)
 
-            _registrar_movimento(
-                produto_id=pid,
-                nome=str(p.get("nome", "")),
-                delta=float(d),
-                estoque_antes=float(atual),
-                estoque_depois=float(novo),
-                motivo=motivo
-)
+            for r in resultados:
+                r["produto"] = dict(indice_id[int(itens[r["indice"]]["produto_id"])])
+            # ainda sob a trava: assinantes recebem os retratos na ordem das gravações
+            for evento in eventos:
+                _notificar({"tipo": "movimento", "produto": dict(indice_id[evento["produto_id"]]), "movimento": evento})
 
-            return p
+    return {"aplicado": aplicado, "resultados": resultados}
 
 
-    raise ProdutoNaoEncontrado(f"Produto com id {pid} não encontrado.")
+# Índice de busca compartilhado (GUI e API), chaveado por id do produto.
+# Sincronizado pela versão dos dados: só nomes novos/alterados são reindexados.
+_indice_busca = IndiceBusca()
+_busca_versao: str | None = None
+_busca_por_id: Dict[int, Dict[str, Any]] = {}
+_trava_busca = threading.Lock()
+
+
+def _sincronizar_indice_busca() -> None:
+    global _busca_versao, _busca_por_id
+    versao = versao_dados()
+    if versao == _busca_versao:
+        return
+
+    por_id = {int(p.get("id", 0)): p for p in _carregar_produtos()}
+    for pid in [pid for pid in _indice_busca.chaves() if pid not in por_id]:
+        _indice_busca.remover(pid)
+    for pid, p in por_id.items():
+        _indice_busca.atualizar(pid, str(p.get("nome", "")))
+
+    _busca_por_id = por_id
+    _busca_versao = versao
+
+
+def buscar_ids_produtos(texto: str, limite: int | None = 20) -> List[int]:
+    """
+    Como buscar_produtos, mas só os ids, na ordem do ranking (a interface já
+    tem os produtos). O índice é compartilhado: só é usado sob a trava.
+    """
+    with _trava_busca:
+        _sincronizar_indice_busca()
+        return _indice_busca.buscar(texto, limite)
+
+
+def buscar_produtos(texto: str, limite: int = 20) -> List[Dict[str, Any]]:
+    """Busca premium por nome (ver busca.IndiceBusca): os `limite` melhores produtos."""
+    with _trava_busca:
+        _sincronizar_indice_busca()
+        ids = _indice_busca.buscar(texto, limite)
+        return [dict(_busca_por_id[pid]) for pid in ids]
 
 
 def produtos_abaixo_minimo() -> List[Dict[str, Any]]:
@@ -280,49 +961,291 @@ def produtos_abaixo_minimo() -> List[Dict[str, Any]]:
         if float(p.get("estoque_atual", 0.0)) < float(p.get("estoque_minimo", 0.0))
     ]
 
-def listar_movimentos(limite: int | None = None) -> list[dict]:
+# progresso(bytes_lidos, bytes_total) — chamado a cada PROGRESSO_A_CADA linhas
+Progresso = Callable[[int, int], None]
+PROGRESSO_A_CADA = 2000
+
+
+TIPOS_MOVIMENTO = ("entrada", "saida")
+
+
+def _filtro_movimento(
+    de: date | None = None,
+    ate: date | None = None,
+    produto_id: int | None = None,
+    tipo: str | None = None,
+    termo: str | None = None,
+) -> Callable[[dict], bool] | None:
+    """Monta o teste de filtro (ou None, se não houver filtro)."""
+    termo = normalizar_busca(termo or "")
+    if de is None and ate is None and produto_id is None and not tipo and not termo:
+        return None
+
+    if tipo and tipo not in TIPOS_MOVIMENTO:
+        raise ValueError(f"Tipo inválido: {tipo!r}.")
+
+    # ts é ISO (YYYY-MM-DDTHH:MM:SS): comparar o prefixo da data basta
+    de_txt = de.isoformat() if de is not None else None
+    ate_txt = ate.isoformat() if ate is not None else None
+    pid = int(produto_id) if produto_id is not None else None
+
+    def _passa(m: dict) -> bool:
+        if de_txt is not None or ate_txt is not None:
+            dia = str(m.get("ts", ""))[:10]
+            if de_txt is not None and dia < de_txt:
+                return False
+            if ate_txt is not None and dia > ate_txt:
+                return False
+        if pid is not None:
+            try:
+                if int(m.get("produto_id", 0)) != pid:
+                    return False
+            except Exception:
+                return False
+        if tipo:
+            try:
+                entrada = float(m.get("delta", 0)) > 0
+            except Exception:
+                return False
+            if entrada != (tipo == "entrada"):
+                return False
+        if termo and termo not in normalizar_busca(str(m.get("nome", ""))):
+            return False
+        return True
+
+    return _passa
+
+
+def iter_movimentos(
+    de: date | None = None,
+    ate: date | None = None,
+    produto_id: int | None = None,
+    progresso: Progresso | None = None,
+    tipo: str | None = None,
+    termo: str | None = None,
+) -> Iterator[dict]:
     """
-    Retorna os movimentos do histórico (mais recentes por último).
-    Se limite for informado, retorna apenas os últimos N movimentos.
+    Percorre o histórico linha a linha (mais antigos primeiro), sem montar lista.
+    Filtros opcionais por período (dias inteiros), produto, tipo (entrada/saida)
+    e termo no nome do item (mesma normalização da busca da interface).
+    Linhas vazias ou corrompidas são ignoradas.
     """
     if not ARQUIVO_HISTORICO.exists():
-        return []
+        return
 
-    movimentos: list[dict] = []
+    passa = _filtro_movimento(de, ate, produto_id, tipo, termo)
 
     try:
-        with ARQUIVO_HISTORICO.open("r", encoding="utf-8") as f:
-            for linha in f:
+        total = ARQUIVO_HISTORICO.stat().st_size
+        lidos = 0
+        with ARQUIVO_HISTORICO.open("rb") as f:
+            for n, linha in enumerate(f, 1):
+                lidos += len(linha)
+                if progresso is not None and n % PROGRESSO_A_CADA == 0:
+                    progresso(lidos, total)
+
                 linha = linha.strip()
                 if not linha:
                     continue
                 try:
-                    movimentos.append(json.loads(linha))
+                    m = json.loads(linha)
                 except Exception:
                     continue
-    except Exception:
-        return []
+                if not isinstance(m, dict):
+                    continue
+                if passa is not None and not passa(m):
+                    continue
+                yield m
+
+        if progresso is not None:
+            progresso(lidos, max(total, lidos))
+    except OSError:
+        return
+
+BLOCO_LEITURA_REVERSA = 64 * 1024
+
+
+def _iter_linhas_reverso(fim: int | None = None) -> Iterator[tuple[int, bytes]]:
+    """
+    Linhas do histórico de trás para frente, lendo em blocos a partir do fim
+    (ou do offset `fim`, exclusivo). Gera (offset_inicio_da_linha, linha).
+    """
+    with ARQUIVO_HISTORICO.open("rb") as f:
+        f.seek(0, 2)
+        tamanho = f.tell()
+        pos = tamanho if fim is None else max(0, min(int(fim), tamanho))
+        resto = b""
+
+        while pos > 0:
+            ler = min(BLOCO_LEITURA_REVERSA, pos)
+            pos -= ler
+            f.seek(pos)
+            partes = (f.read(ler) + resto).split(b"\n")
+
+            # a primeira parte pode ser o fim de uma linha do bloco anterior
+            resto = partes[0]
+            inicio = pos + len(partes[0]) + 1
+            inicios = []
+            for parte in partes[1:]:
+                inicios.append(inicio)
+                inicio += len(parte) + 1
+
+            for inicio_linha, linha in zip(reversed(inicios), reversed(partes[1:])):
+                if linha.strip():
+                    yield inicio_linha, linha
+
+        if resto.strip():
+            yield 0, resto
+
+
+def pagina_movimentos(
+    cursor: int | None = None,
+    limite: int = 200,
+    de: date | None = None,
+    ate: date | None = None,
+    produto_id: int | None = None,
+    tipo: str | None = None,
+) -> tuple[list[dict], int | None]:
+    """
+    Uma página do histórico, do mais recente para o mais antigo.
+
+    cursor é o offset (em bytes) onde a página anterior parou; None = começo
+    (movimento mais recente). Lê só o necessário para preencher a página,
+    do fim do arquivo para trás. Retorna (movimentos, próximo_cursor | None).
+    """
+    if not ARQUIVO_HISTORICO.exists():
+        return [], None
+
+    passa = _filtro_movimento(de, ate, produto_id, tipo)
+    limite = max(1, int(limite))
+
+    itens: list[dict] = []
+    try:
+        for inicio, linha in _iter_linhas_reverso(cursor):
+            try:
+                m = json.loads(linha)
+            except Exception:
+                continue
+            if not isinstance(m, dict):
+                continue
+            if passa is not None and not passa(m):
+                continue
+            itens.append(m)
+            if len(itens) >= limite:
+                return itens, (inicio if inicio > 0 else None)
+    except OSError:
+        pass
 
+    return itens, None
+
+def listar_movimentos(limite: int | None = None, progresso: Progresso | None = None) -> list[dict]:
+    """
+    Retorna os movimentos do histórico (mais recentes por último).
+    Se limite for informado, retorna apenas os últimos N movimentos.
+    """
     if limite is not None and limite > 0:
-        return movimentos[-limite:]
+        # deque com maxlen: memória proporcional ao limite, não ao arquivo
+        return list(deque(iter_movimentos(progresso=progresso), maxlen=limite))
 
-    return movimentos
+    return list(iter_movimentos(progresso=progresso))
 
-def exportar_movimentos_csv(caminho_csv: str | Path, limite: int | None = None) -> Path:
+def resumir_periodos(
+    periodos: list[tuple[date, date]],
+    top_n: int = 20,
+    progresso: Progresso | None = None,
+) -> list[dict]:
+    """
+    Resume vários períodos com UMA única passada pelo histórico.
+
+    Cada período (de, ate) inclui os dias inteiros. Retorna, na mesma ordem,
+    um dict por período com:
+    - "de" / "ate": datas ISO
+    - "linhas": totais por item {nome, entradas, saidas, saldo, volume} (ordem alfabética)
+    - "top": os top_n itens mais movimentados (volume)
+    - "abaixo_minimo": retrato atual dos produtos abaixo do mínimo
+    """
+    janelas = [
+        (datetime(d1.year, d1.month, d1.day, 0, 0, 0), datetime(d2.year, d2.month, d2.day, 23, 59, 59))
+        for d1, d2 in periodos
+    ]
+    acumulados: list[dict[str, dict]] = [{} for _ in janelas]
+
+    if janelas:
+        menor = min(ini for ini, _ in janelas)
+        maior = max(fim for _, fim in janelas)
+
+        for m in iter_movimentos(de=menor.date(), ate=maior.date(), progresso=progresso):
+            try:
+                dt = datetime.fromisoformat(str(m.get("ts", "")))
+            except Exception:
+                continue
+            if dt < menor or dt > maior:
+                continue
+
+            nome = str(m.get("nome", ""))
+            try:
+                delta = float(m.get("delta", 0))
+            except Exception:
+                delta = 0.0
+
+            for (ini, fim), por_item in zip(janelas, acumulados):
+                if dt < ini or dt > fim:
+                    continue
+
+                r = por_item.get(nome)
+                if r is None:
+                    r = por_item[nome] = {"nome": nome, "entradas": 0.0, "saidas": 0.0, "saldo": 0.0, "volume": 0.0}
+
+                if delta > 0:
+                    r["entradas"] += delta
+                else:
+                    r["saidas"] += abs(delta)
+
+                r["saldo"] += delta
+                r["volume"] += abs(delta)
+
+    abaixo = sorted(produtos_abaixo_minimo(), key=lambda p: str(p.get("nome", "")).lower())
+
+    resumos: list[dict] = []
+    for (d1, d2), por_item in zip(periodos, acumulados):
+        linhas = sorted(por_item.values(), key=lambda x: x["nome"].lower())
+        top = sorted(linhas, key=lambda x: x["volume"], reverse=True)[:top_n]
+        resumos.append({
+            "de": d1.isoformat(),
+            "ate": d2.isoformat(),
+            "linhas": linhas,
+            "top": top,
+            "abaixo_minimo": abaixo,
+        })
+
+    return resumos
+
+def exportar_movimentos_csv(
+    caminho_csv: str | Path,
+    limite: int | None = None,
+    de: date | None = None,
+    ate: date | None = None,
+    produto_id: int | None = None,
+    progresso: Progresso | None = None,
+) -> Path:
     """
     Exporta o histórico de movimentos para CSV.
+    Lê o histórico em fluxo (linha do arquivo -> linha do CSV), então a memória
+    não cresce com o tamanho da exportação. Com limite, guarda só os últimos N.
     Retorna o Path do arquivo gerado.
     """
     caminho = Path(caminho_csv)
 
-    movimentos = listar_movimentos(limite=limite)
+    movimentos = iter_movimentos(de=de, ate=ate, produto_id=produto_id, progresso=progresso)
+    if limite is not None and limite > 0:
+        movimentos = deque(movimentos, maxlen=limite)
 
     # garante pasta do arquivo
     caminho.parent.mkdir(parents=True, exist_ok=True)
 
     with caminho.open("w", encoding="utf-8", newline="") as f:
         w = csv.writer(f, delimiter=";")
-        w.writerow(["ts", "produto_id", "nome", "delta", "estoque_antes", "estoque_depois"])
+        w.writerow(["ts", "produto_id", "nome", "delta", "estoque_antes", "estoque_depois", "motivo"])
 
         for m in movimentos:
             w.writerow([
@@ -332,83 +1255,178 @@ def exportar_movimentos_csv(caminho_csv: str | Path, limite: int | None = None)
                 m.get("delta", ""),
                 m.get("estoque_antes", ""),
                 m.get("estoque_depois", ""),
+                m.get("motivo", "") or "",
             ])
 
     return caminho
 
-def exportar_movimentos_xlsx(caminho_xlsx, movimentos):
+# Largura das colunas é estimada por amostra (write-only não permite ajustar depois)
+XLSX_AMOSTRA_LARGURA = 200
+
+
+def _largura_valor(v: Any) -> int:
+    if v is None:
+        return 0
+    if isinstance(v, datetime):
+        return 16  # dd/mm/yyyy hh:mm
+    return len(str(v))
+
+
+def exportar_xlsx_abas(caminho_xlsx: str | Path, abas: list[dict]) -> Path:
     """
-    Exporta uma lista de movimentos para um arquivo Excel (.xlsx)
-    com formatação básica (cabeçalho, larguras, data formatada).
+    Exporta uma ou mais abas para Excel (.xlsx) em modo write-only (streaming).
+
+    Cada aba é um dict com:
+    - "titulo": nome da aba
+    - "cabecalho": lista de títulos das colunas
+    - "linhas": qualquer iterável de linhas (lista/tupla de valores) — consumido uma vez
+    - "formatos" (opcional): {índice_coluna: number_format}
+    - "centralizar" (opcional): índices das colunas centralizadas
+    - "largura_max" (opcional): largura máxima de coluna (padrão 55)
+
+    Os estilos são definidos uma vez por coluna (estilos nomeados) e as larguras
+    são estimadas pelas primeiras XLSX_AMOSTRA_LARGURA linhas.
     """
-    from pathlib import Path
-    from datetime import datetime
+    from itertools import chain, islice
     from openpyxl import Workbook
-    from openpyxl.styles import Font, PatternFill, Alignment
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Font, NamedStyle, PatternFill
     from openpyxl.utils import get_column_letter
 
     caminho = Path(caminho_xlsx)
     caminho.parent.mkdir(parents=True, exist_ok=True)
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Histórico"
-
-    cabecalho = ["Data/Hora", "ID", "Item", "Tipo", "Quantidade", "Antes", "Depois"]
-
-    ws.append(cabecalho)
+    wb = Workbook(write_only=True)
+
+    estilo_cabecalho = NamedStyle(
+        name="cabecalho",
+        font=Font(bold=True),
+        fill=PatternFill("solid", fgColor="DDDDDD"),
+        alignment=Alignment(horizontal="center"),
+    )
+    wb.add_named_style(estilo_cabecalho)
+    estilos_registrados: dict[tuple[str | None, bool], str] = {}
+
+    def _estilo_coluna(fmt: str | None, centro: bool) -> str | None:
+        if fmt is None and not centro:
+            return None
+        chave = (fmt, centro)
+        nome = estilos_registrados.get(chave)
+        if nome is None:
+            nome = f"coluna_{len(estilos_registrados) + 1}"
+            estilo = NamedStyle(name=nome)
+            if fmt is not None:
+                estilo.number_format = fmt
+            if centro:
+                estilo.alignment = Alignment(horizontal="center")
+            wb.add_named_style(estilo)
+            estilos_registrados[chave] = nome
+        return nome
+
+    for aba in abas:
+        ws = wb.create_sheet(str(aba.get("titulo", "Planilha"))[:31])
+        cabecalho = list(aba.get("cabecalho", []))
+        formatos = dict(aba.get("formatos") or {})
+        centralizar = set(aba.get("centralizar") or ())
+        largura_max = int(aba.get("largura_max", 55))
+
+        linhas = iter(aba.get("linhas", ()))
+        amostra = list(islice(linhas, XLSX_AMOSTRA_LARGURA))
+
+        larguras = [len(str(h)) for h in cabecalho]
+        for row in amostra:
+            for idx, v in enumerate(row):
+                n = _largura_valor(v)
+                if idx >= len(larguras):
+                    larguras.append(n)
+                elif n > larguras[idx]:
+                    larguras[idx] = n
+        for idx, n in enumerate(larguras):
+            ws.column_dimensions[get_column_letter(idx + 1)].width = min(n + 2, largura_max)
+
+        ws.freeze_panes = "A2"
+
+        # estilo por coluna: None = valor puro (mais rápido)
+        estilos = [
+            _estilo_coluna(formatos.get(idx), idx in centralizar)
+            for idx in range(len(larguras))
+        ]
+
+        linha_cab = []
+        for h in cabecalho:
+            c = WriteOnlyCell(ws, value=h)
+            c.style = "cabecalho"
+            linha_cab.append(c)
+        ws.append(linha_cab)
+
+        for row in chain(amostra, linhas):
+            valores = []
+            for idx, v in enumerate(row):
+                nome_estilo = estilos[idx] if idx < len(estilos) else None
+                if nome_estilo is None or v is None or v == "":
+                    valores.append(v)
+                    continue
+                c = WriteOnlyCell(ws, value=v)
+                c.style = nome_estilo
+                valores.append(c)
+            ws.append(valores)
 
-    header_font = Font(bold=True)
-    header_fill = PatternFill("solid", fgColor="DDDDDD")
-    header_align = Alignment(horizontal="center")
+    wb.save(caminho)
+    return caminho
 
-    for col in range(1, len(cabecalho) + 1):
-        c = ws.cell(row=1, column=col)
-        c.font = header_font
-        c.fill = header_fill
-        c.alignment = header_align
 
-    ws.freeze_panes = "A2"
+def exportar_xlsx(
+    caminho_xlsx: str | Path,
+    cabecalho: Sequence[str],
+    linhas: Iterable[Sequence[Any]],
+    titulo: str = "Planilha",
+    formatos: dict[int, str] | None = None,
+    centralizar: Iterable[int] = (),
+    largura_max: int = 55,
+) -> Path:
+    """Exporta uma única aba (ver exportar_xlsx_abas)."""
+    return exportar_xlsx_abas(caminho_xlsx, [{
+        "titulo": titulo,
+        "cabecalho": list(cabecalho),
+        "linhas": linhas,
+        "formatos": formatos,
+        "centralizar": tuple(centralizar),
+        "largura_max": largura_max,
+    }])
 
-    for m in movimentos:
-        delta = float(m.get("delta", 0))
-        tipo = "Entrada" if delta > 0 else "Saída"
-        qtd = abs(delta)
 
-        ts = m.get("ts", "")
-        try:
-            ts = datetime.fromisoformat(ts)
-        except Exception:
-            pass
-
-        ws.append([
-            ts,
-            m.get("produto_id", ""),
-            m.get("nome", ""),
-            tipo,
-            qtd,
-            m.get("estoque_antes", ""),
-            m.get("estoque_depois", ""),
-        ])
-
-    # Formatos
-    for row in ws.iter_rows(min_row=2):
-        if hasattr(row[0].value, "year"):
-            row[0].number_format = "dd/mm/yyyy hh:mm"
-
-        for idx in (4, 5, 6):
-            row[idx].alignment = Alignment(horizontal="center")
-
-    # Ajuste de largura
-    for col in ws.columns:
-        max_len = 0
-        col_letter = get_column_letter(col[0].column)
-        for cell in col:
-            if cell.value:
-                max_len = max(max_len, len(str(cell.value)))
-        ws.column_dimensions[col_letter].width = min(max_len + 2, 40)
-
-    wb.save(caminho)
-    return caminho
+def exportar_movimentos_xlsx(caminho_xlsx, movimentos):
+    """
+    Exporta movimentos (qualquer iterável, ex.: iter_movimentos()) para Excel (.xlsx)
+    com formatação básica (cabeçalho, larguras, data formatada).
+    """
+    def _linhas():
+        for m in movimentos:
+            delta = float(m.get("delta", 0))
+            tipo = "Entrada" if delta > 0 else "Saída"
 
+            ts = m.get("ts", "")
+            try:
+                ts = datetime.fromisoformat(ts)
+            except Exception:
+                pass
 
+            yield [
+                ts,
+                m.get("produto_id", ""),
+                m.get("nome", ""),
+                tipo,
+                abs(delta),
+                m.get("estoque_antes", ""),
+                m.get("estoque_depois", ""),
+            ]
+
+    return exportar_xlsx(
+        caminho_xlsx,
+        ["Data/Hora", "ID", "Item", "Tipo", "Quantidade", "Antes", "Depois"],
+        _linhas(),
+        titulo="Histórico",
+        formatos={0: "dd/mm/yyyy hh:mm"},
+        centralizar=(4, 5, 6),
+        largura_max=40,
+    )
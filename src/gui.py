@@ -1,32 +1,51 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import unicodedata
 import re
 from datetime import datetime, date, timedelta
 import csv
+from pathlib import Path
 
 from .estoque_core import restaurar_backup_externo
-from .estoque_core import importar_planilha_inicial
-from .estoque_core import estoque_ja_existe
+from .estoque_core import importar_planilha, importar_movimentos
 from .config import ICONE_ICO  # gui.py e config.py estão em src/
 from .estoque_core import (
-    listar_produtos,
     criar_produto,
     move_stock_by_id,
     listar_movimentos,
+    pagina_movimentos,
+    resumir_periodos,
     exportar_movimentos_csv,
     exportar_movimentos_xlsx,
+    exportar_xlsx,
     ProdutoNaoEncontrado,
     EstoqueInsuficiente,
     ProdutoDuplicado,
     set_pasta_backup_externo,
     get_pasta_backup_externo,
+    get_agenda_relatorios,
+    set_agenda_relatorios,
+    buscar_ids_produtos,
 )
+from .relatorios import FREQUENCIAS, executar_relatorios_agendados
+from .inventario import ajustes_da_sessao, carregar_sessao, descartar_sessao, encerrar_sessao, iniciar_sessao, registrar_contagens, sessao_aberta
+from .gui_componentes import (
+    Carregador,
+    ListaVirtual,
+    TabelaOrdenavel,
+    TabelaVirtual,
+    Tarefa,
+    executar_em_segundo_plano,
+)
+from .busca import normalizar_busca
+from .gui_catalogo import catalogo, comparar_produtos, houve_recarga, produtos_alterados
 
 
 def carregar_produtos() -> list[dict]:
-    """Carrega a lista de produtos pelo core (fonte única)."""
-    return listar_produtos()
+    """
+    Lista de produtos do catálogo compartilhado da interface (cópia).
+    O catálogo lê do core uma vez e é remendado a cada alteração gravada.
+    """
+    return catalogo.produtos()
 
 
 def salvar_produtos(produtos: list[dict]) -> None:
@@ -38,27 +57,126 @@ def gerar_proximo_id(produtos: list[dict]) -> int:
     """Compatibilidade: IDs são gerados no core."""
     raise NotImplementedError("IDs são gerados no core")
 
+def _resumo_importacao(rel: dict, limite: int = 12) -> str:
+    linhas = [
+        f"Itens novos: {len(rel['novos'])}",
+        f"Itens alterados: {len(rel['alterados'])}",
+        f"Sem alteração: {rel['sem_alteracao']}",
+        f"Linhas ignoradas: {len(rel['ignorados'])}",
+    ]
+
+    detalhes = []
+    for p in rel["novos"]:
+        detalhes.append(f"+ {p['nome']}: {p['estoque_atual']} {p['unidade']}")
+    for a in rel["alterados"]:
+        partes = [f"{k}: {a['antes'].get(k)} → {v}" for k, v in a["depois"].items()]
+        detalhes.append(f"~ {a['nome']} ({', '.join(partes)})")
+    for i in rel["ignorados"]:
+        detalhes.append(f"! linha {i['linha']}: {i['motivo']}")
+
+    if detalhes and limite > 0:
+        linhas.append("")
+        linhas.extend(detalhes[:limite])
+        if len(detalhes) > limite:
+            linhas.append(f"... e mais {len(detalhes) - limite}.")
+    return "\n".join(linhas)
+
+
 def importar_planilha_excel(root):
+    """
+    Importa a planilha mesclando com o estoque atual: primeiro simula e mostra
+    as diferenças; só grava depois da confirmação.
+    """
+    caminho = filedialog.askopenfilename(
+        title="Selecione a planilha da Vila",
+        filetypes=[("Planilhas Excel", "*.xlsx")]
+    )
 
-    if estoque_ja_existe():
-        messagebox.showwarning(
-            "Importação bloqueada",
-            "Já existem produtos cadastrados.\n\n"
-            "A importação inicial só pode ser feita com o sistema vazio.",
-            parent=root
-        )
+    if not caminho:
         return
 
+    def _aplicar():
+        executar_em_segundo_plano(
+            root,
+            "Importando planilha",
+            lambda tarefa: importar_planilha(caminho, progresso=tarefa.progresso),
+            ao_concluir=lambda rel: messagebox.showinfo(
+                "Concluído", "Estoque importado com sucesso!\n\n" + _resumo_importacao(rel, limite=0), parent=root
+            ),
+            ao_falhar=lambda e: messagebox.showerror("Erro", f"Não foi possível importar a planilha.\n\n{e}", parent=root),
+            cancelavel=False,
+        )
+
+    def _confirmar(rel: dict) -> None:
+        if not rel["novos"] and not rel["alterados"]:
+            messagebox.showinfo("Importação", "Nada para importar.\n\n" + _resumo_importacao(rel), parent=root)
+            return
+        if messagebox.askyesno("Confirmar importação", _resumo_importacao(rel) + "\n\nAplicar estas alterações?", parent=root):
+            _aplicar()
+
+    executar_em_segundo_plano(
+        root,
+        "Lendo planilha",
+        lambda tarefa: importar_planilha(caminho, simular=True, progresso=tarefa.progresso),
+        ao_concluir=_confirmar,
+        ao_falhar=lambda e: messagebox.showerror("Erro", f"Não foi possível ler a planilha.\n\n{e}", parent=root),
+    )
+
+def _resumo_importacao_movimentos(rel: dict, limite: int = 12) -> str:
+    linhas = [
+        f"Movimentos aceitos: {rel['aceitos']}",
+        f"Itens afetados: {rel['produtos_afetados']}",
+        f"Linhas rejeitadas: {len(rel['rejeitados'])}",
+    ]
+    if rel["rejeitados"] and limite > 0:
+        linhas.append("")
+        for r in rel["rejeitados"][:limite]:
+            linhas.append(f"! linha {r['linha']}: {r['motivo']}")
+        if len(rel["rejeitados"]) > limite:
+            linhas.append(f"... e mais {len(rel['rejeitados']) - limite}.")
+    return "\n".join(linhas)
+
+
+def importar_movimentos_planilha(root):
+    """Importa movimentos antigos (CSV/Excel) para o histórico, com prévia antes de gravar."""
     caminho = filedialog.askopenfilename(
-        title="Selecione a planilha da Vila",
-        filetypes=[("Planilhas Excel", "*.xlsx *.xls")]
+        title="Selecione o histórico de movimentos",
+        filetypes=[("Planilhas", "*.csv *.xlsx"), ("CSV", "*.csv"), ("Excel", "*.xlsx")]
     )
 
     if not caminho:
         return
 
-    importar_planilha_inicial(caminho)
-    messagebox.showinfo("Concluído", "Estoque importado com sucesso!", parent=root)
+    def _aplicar():
+        executar_em_segundo_plano(
+            root,
+            "Importando movimentos",
+            lambda tarefa: importar_movimentos(caminho, progresso=tarefa.progresso),
+            ao_concluir=lambda rel: messagebox.showinfo(
+                "Concluído", "Histórico importado.\n\n" + _resumo_importacao_movimentos(rel, limite=0), parent=root
+            ),
+            ao_falhar=lambda e: messagebox.showerror("Erro", f"Não foi possível importar os movimentos.\n\n{e}", parent=root),
+            cancelavel=False,
+        )
+
+    def _confirmar(rel: dict) -> None:
+        if not rel["aceitos"]:
+            messagebox.showwarning("Importação", "Nenhum movimento válido.\n\n" + _resumo_importacao_movimentos(rel), parent=root)
+            return
+        if messagebox.askyesno(
+            "Confirmar importação",
+            _resumo_importacao_movimentos(rel) + "\n\nAs linhas rejeitadas serão ignoradas. Aplicar?",
+            parent=root,
+        ):
+            _aplicar()
+
+    executar_em_segundo_plano(
+        root,
+        "Validando movimentos",
+        lambda tarefa: importar_movimentos(caminho, simular=True, progresso=tarefa.progresso),
+        ao_concluir=_confirmar,
+        ao_falhar=lambda e: messagebox.showerror("Erro", f"Não foi possível ler o arquivo.\n\n{e}", parent=root),
+    )
 
 def restaurar_backup_drive(root):
     pasta = get_pasta_backup_externo()
@@ -73,20 +191,25 @@ def restaurar_backup_drive(root):
     ):
         return
 
-    sucesso = restaurar_backup_externo()  # usa a pasta configurada
-    if sucesso:
-        messagebox.showinfo("Sucesso", "Backup restaurado com sucesso!\nReinicie o sistema.", parent=root)
-    else:
-        messagebox.showerror("Erro", "Não foi possível restaurar o backup.\nVerifique se há dados.json na pasta do Drive.", parent=root)
+    def _concluido(sucesso: bool) -> None:
+        if sucesso:
+            messagebox.showinfo("Sucesso", "Backup restaurado com sucesso!\nReinicie o sistema.", parent=root)
+        else:
+            messagebox.showerror("Erro", "Não foi possível restaurar o backup.\nVerifique se há dados.json na pasta do Drive.", parent=root)
+
+    # cópia dos arquivos fora da thread da UI; não cancelável (evita restauração pela metade)
+    executar_em_segundo_plano(
+        root,
+        "Restaurando backup",
+        lambda tarefa: restaurar_backup_externo(),  # usa a pasta configurada
+        ao_concluir=_concluido,
+        cancelavel=False,
+    )
 
 def normalizar_nome(nome: str) -> str:
     return " ".join(nome.strip().lower().split())
 
 
-def remover_acentos(s: str) -> str:
-    nfkd = unicodedata.normalize("NFKD", s)
-    return "".join(ch for ch in nfkd if not unicodedata.combining(ch))
-
 def configurar_backup_google_drive(root):
     pasta_atual = get_pasta_backup_externo()
 
@@ -114,44 +237,76 @@ def desativar_backup_google_drive(root):
     set_pasta_backup_externo("")
     messagebox.showinfo("Backup externo", "Backup externo desativado.", parent=root)
 
-def normalizar_busca(s: str) -> str:
+
+def configurar_relatorios_automaticos(root):
     """
-    Normalização 'premium':
-    - lower
-    - remove acentos
-    - troca pontuação por espaço (coca-cola == coca cola)
-    - normaliza múltiplos espaços
+    Agenda dos relatórios automáticos. A geração em si roda fora da interface
+    (Agendador de Tarefas: EstoqueONG.exe --relatorios); aqui só configura.
     """
-    s = remover_acentos(s).lower()
-    s = re.sub(r"[^a-z0-9]+", " ", s, flags=re.IGNORECASE)  # pontuação -> espaço
-    s = " ".join(s.split())
-    return s
+    agenda = get_agenda_relatorios()
 
+    win = tk.Toplevel(root)
+    win.title("Relatórios automáticos")
+    win.geometry("520x300")
+    win.minsize(520, 300)
+    _configurar_fechamento_toplevel(win, root)
+    centralizar_janela(win)
 
-def match_prefix_por_palavras(query_tokens: list[str], name_tokens: list[str]) -> bool:
-    """query tokens são prefixos dos tokens correspondentes do nome."""
-    if not query_tokens:
-        return True
-    if len(query_tokens) > len(name_tokens):
-        return False
-    for i, qt in enumerate(query_tokens):
-        if not name_tokens[i].startswith(qt):
-            return False
-    return True
-
-
-def match_tokens_em_ordem(query_tokens: list[str], name_tokens: list[str]) -> bool:
-    """Tokens do query aparecem em ordem (por prefixo), não necessariamente contíguos."""
-    if not query_tokens:
-        return True
-    j = 0
-    for nt in name_tokens:
-        if nt.startswith(query_tokens[j]):
-            j += 1
-            if j == len(query_tokens):
-                return True
-    return False
+    frame = ttk.Frame(win, padding=12)
+    frame.pack(fill="both", expand=True)
+
+    ttk.Label(frame, text="Pasta de destino").pack(anchor="w")
+    pasta_var = tk.StringVar(value=str(agenda.get("pasta", "")))
+    linha_pasta = ttk.Frame(frame)
+    linha_pasta.pack(fill="x", pady=(0, 10))
+    ttk.Entry(linha_pasta, textvariable=pasta_var).pack(side="left", fill="x", expand=True)
+
+    def _escolher_pasta():
+        pasta = filedialog.askdirectory(parent=win, title="Pasta dos relatórios automáticos")
+        if pasta:
+            pasta_var.set(pasta)
 
+    ttk.Button(linha_pasta, text="Escolher...", command=_escolher_pasta, takefocus=False).pack(side="left", padx=(8, 0))
+
+    ttk.Label(frame, text="Frequência").pack(anchor="w")
+    freq_var = tk.StringVar(value=str(agenda.get("frequencia", "mensal")))
+    ttk.Combobox(frame, values=list(FREQUENCIAS), textvariable=freq_var, state="readonly").pack(fill="x", pady=(0, 10))
+
+    formatos = agenda.get("formatos", ["csv", "xlsx"])
+    csv_var = tk.BooleanVar(value="csv" in formatos)
+    xlsx_var = tk.BooleanVar(value="xlsx" in formatos)
+    ttk.Checkbutton(frame, text="CSV", variable=csv_var).pack(anchor="w")
+    ttk.Checkbutton(frame, text="Excel", variable=xlsx_var).pack(anchor="w", pady=(0, 10))
+
+    status_var = tk.StringVar(value="")
+    ttk.Label(frame, textvariable=status_var).pack(anchor="w", pady=(0, 8))
+
+    def salvar(gerar_agora: bool = False):
+        nova = dict(get_agenda_relatorios())
+        nova["pasta"] = pasta_var.get().strip()
+        nova["frequencia"] = freq_var.get().strip() or "mensal"
+        nova["formatos"] = [f for f, v in (("csv", csv_var), ("xlsx", xlsx_var)) if v.get()]
+        set_agenda_relatorios(nova)
+
+        if not gerar_agora:
+            status_var.set("Agenda salva.")
+            return
+
+        executar_em_segundo_plano(
+            win,
+            "Gerando relatórios",
+            lambda tarefa: executar_relatorios_agendados(),
+            ao_concluir=lambda gerados: status_var.set(
+                f"{len(gerados)} arquivo(s) gerado(s)." if gerados else "Nenhum período pendente."
+            ),
+            ao_falhar=lambda e: messagebox.showerror("Erro", f"Falha ao gerar relatórios:\n\n{e}", parent=win),
+            cancelavel=False,
+        )
+
+    botoes = ttk.Frame(frame)
+    botoes.pack(fill="x")
+    ttk.Button(botoes, text="Salvar", command=salvar, takefocus=False).pack(side="right")
+    ttk.Button(botoes, text="Gerar pendentes agora", command=lambda: salvar(True), takefocus=False).pack(side="right", padx=(0, 8))
 
 # =========================
 # UX: foco consistente (evita botão "marcado")
@@ -305,6 +460,100 @@ def _safe_float(x, default=0.0) -> float:
         return float(default)
 
 
+def _remover_arquivo_parcial(caminho) -> None:
+    """Exportação cancelada/falhou: não deixa arquivo pela metade."""
+    try:
+        Path(caminho).unlink(missing_ok=True)
+    except Exception:
+        pass
+
+
+def _exportar_em_segundo_plano(
+    win: tk.Toplevel,
+    titulo: str,
+    caminho: str,
+    fn,
+    msg_ok: str,
+    msg_erro: str,
+    avisar=None,
+) -> None:
+    """
+    Exporta numa tarefa com progresso; falha/cancelamento apagam o arquivo parcial.
+    avisar(msg) mostra sucesso/cancelamento (padrão: caixa "OK" só no sucesso).
+    """
+    def _falhou(e):
+        _remover_arquivo_parcial(caminho)
+        messagebox.showerror("Erro", f"{msg_erro}\n\n{e}", parent=win)
+
+    def _cancelou():
+        _remover_arquivo_parcial(caminho)
+        if avisar is not None:
+            avisar("Exportação cancelada.")
+
+    executar_em_segundo_plano(
+        win, titulo, fn,
+        ao_concluir=lambda _r: avisar(msg_ok) if avisar is not None else messagebox.showinfo("OK", msg_ok, parent=win),
+        ao_falhar=_falhou,
+        ao_cancelar=_cancelou,
+    )
+
+
+def _texto_ord(x) -> str:
+    return str(x or "").lower()
+
+
+# Chaves tipadas para ordenar listas de produtos (registro = dict do produto)
+_CHAVES_PRODUTO = {
+    "id": lambda p: int(_safe_float(p.get("id", 0), 0.0)),
+    "nome": lambda p: _texto_ord(p.get("nome")),
+    "unidade": lambda p: _texto_ord(p.get("unidade")),
+    "atual": lambda p: _safe_float(p.get("estoque_atual", 0), 0.0),
+    "minimo": lambda p: _safe_float(p.get("estoque_minimo", 0), 0.0),
+}
+
+
+def _valores_produto(p: dict) -> tuple:
+    return (
+        p.get("id", ""),
+        p.get("nome", ""),
+        p.get("unidade", ""),
+        p.get("estoque_atual", 0),
+        p.get("estoque_minimo", 0),
+    )
+
+
+def _abaixo_do_minimo(p: dict) -> bool:
+    return _safe_float(p.get("estoque_atual", 0), 0.0) < _safe_float(p.get("estoque_minimo", 0), 0.0)
+
+
+def _sincronizar_tabela_produtos(tabela: TabelaOrdenavel, eventos: list[dict], valores, incluir=None) -> None:
+    """
+    Aplica os eventos do catálogo numa tabela de produtos (registro = produto):
+    só as linhas dos itens alterados mudam; "recarregar" refaz a tabela.
+    incluir(p) decide se o item pertence à tabela (ex.: só abaixo do mínimo).
+    """
+    if houve_recarga(eventos):
+        novos = [p for p in carregar_produtos() if incluir is None or incluir(p)]
+        novos.sort(key=lambda p: _texto_ord(p.get("nome")))
+        tabela.definir((p, valores(p)) for p in novos)
+        return
+
+    por_id = {int(r.get("id", 0)): iid for iid, r in tabela.registros.items()}
+    inseriu = False
+    for pid, p in produtos_alterados(eventos).items():
+        iid = por_id.get(pid)
+        if incluir is not None and not incluir(p):
+            if iid is not None:
+                tabela.remover(iid)
+        elif iid is None:
+            tabela.inserir(p, valores(p))
+            inseriu = True
+        else:
+            tabela.atualizar(iid, p, valores(p))
+    if inseriu:
+        tabela.reordenar()
+
+
 def abrir_tela_produtos(root: tk.Tk) -> None:
     produtos = carregar_produtos()
     produtos = sorted(produtos, key=lambda p: str(p.get("nome", "")).lower())
@@ -328,35 +577,14 @@ def abrir_tela_produtos(root: tk.Tk) -> None:
     tree = ttk.Treeview(frame, columns=cols, show="headings", height=14)
     tree.pack(fill="both", expand=True)
 
-    # Ordenação por clique no cabeçalho (profissional)
-    sort_state = {"col": None, "desc": False}
-
-    def _coerce(col: str, v: str):
-        if col in ("id", "atual", "minimo"):
-            try:
-                return float(str(v).replace(",", "."))
-            except Exception:
-                return 0.0
-        return str(v).lower()
-
-    def ordenar_por(col: str):
-        # alterna asc/desc ao clicar no mesmo cabeçalho
-        if sort_state["col"] == col:
-            sort_state["desc"] = not sort_state["desc"]
-        else:
-            sort_state["col"] = col
-            sort_state["desc"] = False
-
-        itens = list(tree.get_children(""))
-        itens.sort(key=lambda iid: _coerce(col, tree.set(iid, col)), reverse=sort_state["desc"])
-        for i, iid in enumerate(itens):
-            tree.move(iid, "", i)
+    tree.heading("id", text="ID")
+    tree.heading("nome", text="Item")
+    tree.heading("unidade", text="Unidade")
+    tree.heading("atual", text="Atual")
+    tree.heading("minimo", text="Mínimo")
 
-    tree.heading("id", text="ID", command=lambda: ordenar_por("id"))
-    tree.heading("nome", text="Item", command=lambda: ordenar_por("nome"))
-    tree.heading("unidade", text="Unidade", command=lambda: ordenar_por("unidade"))
-    tree.heading("atual", text="Atual", command=lambda: ordenar_por("atual"))
-    tree.heading("minimo", text="Mínimo", command=lambda: ordenar_por("minimo"))
+    # Ordenação por clique no cabeçalho (profissional): ordena o modelo, não a tela
+    tabela = TabelaOrdenavel(tree, _CHAVES_PRODUTO)
 
     tree.column("id", width=60, anchor="center")
     tree.column("nome", width=300)
@@ -365,16 +593,10 @@ def abrir_tela_produtos(root: tk.Tk) -> None:
     tree.column("minimo", width=90, anchor="center")
 
     for p in produtos:
-        tree.insert(
-            "", "end",
-            values=(
-                p.get("id", ""),
-                p.get("nome", ""),
-                p.get("unidade", ""),
-                p.get("estoque_atual", 0),
-                p.get("estoque_minimo", 0),
-            )
-        )
+        tabela.inserir(p, _valores_produto(p))
+
+    # movimentos feitos em outras janelas atualizam só a linha do item
+    catalogo.assinar(lambda eventos: _sincronizar_tabela_produtos(tabela, eventos, _valores_produto), win)
 
     if not produtos:
         messagebox.showinfo("Sem dados", "Nenhum item cadastrado ainda.\nCadastre primeiro pela API ou pelo CLI.")
@@ -482,6 +704,75 @@ def atualizar_estoque(produto_id: int, delta: float, motivo: str | None = None)
         raise ValueError(str(e))
 
 
+def _montar_textos_produtos(
+    produtos: list[dict],
+    itens_exibicao: list[str],
+    texto_para_id: dict[str, int],
+    id_para_texto: dict[int, str],
+) -> None:
+    """
+    (Re)preenche os textos da lista de seleção, no lugar.
+    Exibição SEM ID: só nome; se repetir, inclui unidade; se ainda repetir, (2), (3)...
+    """
+    itens_exibicao.clear()
+    texto_para_id.clear()
+    id_para_texto.clear()
+    usados: dict[str, int] = {}
+
+    for p in produtos:
+        nome = str(p.get("nome", "")).strip()
+        unidade = str(p.get("unidade", "")).strip()
+        pid = int(p.get("id", 0))
+
+        base = nome
+        if base in usados:
+            base = f"{nome} ({unidade})" if unidade else nome
+
+        n = usados.get(base, 0) + 1
+        usados[base] = n
+        texto_exibido = base if n == 1 else f"{base} ({n})"
+
+        itens_exibicao.append(texto_exibido)
+        texto_para_id[texto_exibido] = pid
+        id_para_texto[pid] = texto_exibido
+
+
+def _selecionar_texto(lb: ListaVirtual, texto: str | None) -> bool:
+    """Seleciona `texto` se ele estiver entre os itens carregados da lista (sem mexer no foco)."""
+    if texto is None:
+        return False
+    for i in range(lb.size()):
+        if lb.get(i) == texto:
+            lb.selection_clear(0, "end")
+            lb.selection_set(i)
+            lb.activate(i)
+            lb.see(i)
+            return True
+    return False
+
+
+def _mudancas_catalogo(
+    eventos: list[dict], id_para_produto: dict[int, dict]
+) -> tuple[list[dict] | None, bool, dict[int, dict]]:
+    """
+    (lista relida ou None, estrutura mudou, alterados) para as janelas de seleção.
+    Num "recarregar" (importação, restauração ou outro processo) a releitura é
+    comparada com o que a janela tem: a lista só é refeita se entrou/saiu item
+    ou mudou nome/unidade; o resto só atualiza a prévia.
+    """
+    lista = None
+    estrutura = any(e.get("tipo") == "produto_criado" for e in eventos)
+    if houve_recarga(eventos):
+        lista = carregar_produtos()
+        mudou, alterados = comparar_produtos(id_para_produto, lista)
+        estrutura = estrutura or mudou
+    else:
+        alterados = produtos_alterados(eventos)
+    if estrutura and lista is None:
+        lista = carregar_produtos()
+    return lista, estrutura, alterados
+
+
 def abrir_movimento(root: tk.Tk, tipo: str) -> None:
     # tipo: "entrada" ou "saida"
     produtos = carregar_produtos()
@@ -516,32 +807,10 @@ def abrir_movimento(root: tk.Tk, tipo: str) -> None:
     itens_exibicao: list[str] = []
     texto_para_id: dict[str, int] = {}
 
-    # Índices para busca premium (somente pelo NOME)
-    item_para_nome_norm: dict[str, str] = {}
-    item_para_tokens: dict[str, list[str]] = {}
-
-    usados: dict[str, int] = {}
-
-    for p in produtos:
-        nome = str(p.get("nome", "")).strip()
-        unidade = str(p.get("unidade", "")).strip()
-        pid = int(p.get("id", 0))
-
-        base = nome
-        if base in usados:
-            base = f"{nome} ({unidade})" if unidade else nome
-
-        n = usados.get(base, 0) + 1
-        usados[base] = n
-        texto_exibido = base if n == 1 else f"{base} ({n})"
-
-        itens_exibicao.append(texto_exibido)
-        texto_para_id[texto_exibido] = pid
-
-        nn = normalizar_busca(nome)
-        item_para_nome_norm[texto_exibido] = nn
-        item_para_tokens[texto_exibido] = nn.split() if nn else []
+    # id -> texto exibido (a busca premium usa o índice compartilhado do core, por id)
+    id_para_texto: dict[int, str] = {}
 
+    _montar_textos_produtos(produtos, itens_exibicao, texto_para_id, id_para_texto)
     itens_originais = itens_exibicao.copy()
 
     busca_var = tk.StringVar(value="")
@@ -587,20 +856,11 @@ def abrir_movimento(root: tk.Tk, tipo: str) -> None:
 
     ttk.Label(frame, text="Selecione um item").pack(anchor="w")
 
-    # ---------- LISTBOX + SCROLLBAR ----------
-    list_frame = ttk.Frame(frame)
-    list_frame.pack(fill="both", expand=True, pady=(0, 10))
-
-    yscroll = ttk.Scrollbar(list_frame, orient="vertical")
-    yscroll.pack(side="right", fill="y")
-
-    lb = tk.Listbox(
-        list_frame,
+    # ---------- LISTA (virtual: só as linhas visíveis existem no Listbox) ----------
+    lb = ListaVirtual(
+        frame,
+        itens_originais,
         height=10,
-        activestyle="none",
-        exportselection=False,
-        yscrollcommand=yscroll.set,
-
         bg="#ffffff",
         fg="#1f2933",
         selectbackground="#2563eb",
@@ -610,11 +870,7 @@ def abrir_movimento(root: tk.Tk, tipo: str) -> None:
         relief="flat",
         borderwidth=0,
     )
-    lb.pack(side="left", fill="both", expand=True)
-    yscroll.config(command=lb.yview)
-
-    for item in itens_originais:
-        lb.insert("end", item)
+    lb.pack(fill="both", expand=True, pady=(0, 10))
 
     # ---------- PRÉVIA DO ESTOQUE DO ITEM SELECIONADO ----------
     preview_var = tk.StringVar(value="Selecione um item para ver o estoque atual.")
@@ -622,40 +878,26 @@ def abrir_movimento(root: tk.Tk, tipo: str) -> None:
     lbl_preview.pack(anchor="w", pady=(0, 10))
 
     def _atualizar_status(qtd: int):
-        resultados_var.set(f"{qtd} item" if qtd == 1 else f"{qtd} itens")
+        if not lb.completa:
+            resultados_var.set(f"{qtd}+ itens")  # ainda há resultados além da página carregada
+        else:
+            resultados_var.set(f"{qtd} item" if qtd == 1 else f"{qtd} itens")
         vazio_var.set("Nenhum item encontrado" if qtd == 0 else "")
 
-    def _filtrar_rankeado_premium(texto_busca: str) -> list[str]:
-        q = normalizar_busca(texto_busca)
-        if not q:
+    def _filtrar_rankeado_premium(texto_busca: str, limite: int | None = None) -> list[str]:
+        if not normalizar_busca(texto_busca):
             return itens_originais
+        ids = buscar_ids_produtos(texto_busca, limite)
+        return [id_para_texto[pid] for pid in ids if pid in id_para_texto]
 
-        qtoks = q.split()
-
-        grupo_a: list[str] = []
-        grupo_b: list[str] = []
-        grupo_c: list[str] = []
-        grupo_d: list[str] = []
-
-        for item_txt in itens_originais:
-            nome_norm = item_para_nome_norm.get(item_txt, "")
-            ntoks = item_para_tokens.get(item_txt, [])
-
-            if nome_norm.startswith(q):
-                grupo_a.append(item_txt)
-            elif match_prefix_por_palavras(qtoks, ntoks):
-                grupo_b.append(item_txt)
-            elif q in nome_norm:
-                grupo_c.append(item_txt)
-            elif match_tokens_em_ordem(qtoks, ntoks):
-                grupo_d.append(item_txt)
-
-        return grupo_a + grupo_b + grupo_c + grupo_d
+    def _render_lista(itens: list[str], texto_busca: str = "") -> None:
+        if normalizar_busca(texto_busca) and len(itens) > ListaVirtual.PAGINA:
+            # só a primeira página; o resto é buscado quando a rolagem chegar perto do fim
+            lb.definir_itens(itens[:ListaVirtual.PAGINA], mais=lambda n: _filtrar_rankeado_premium(texto_busca, n))
+        else:
+            lb.definir_itens(itens)
 
-    def _render_lista(itens: list[str]) -> None:
-        lb.delete(0, "end")
-        for it in itens:
-            lb.insert("end", it)
+    lb.bind("<<ListaCarregada>>", lambda e: _atualizar_status(lb.size()))
 
     _after_id = None
 
@@ -689,9 +931,11 @@ def abrir_movimento(root: tk.Tk, tipo: str) -> None:
         preview_var.set(f"Estoque atual: {atual}{sufixo_un}  |  Mínimo: {minimo}{sufixo_un}")
 
     def aplicar_filtro():
-        filtradas = _filtrar_rankeado_premium(busca_var.get())
-        _render_lista(filtradas)
-        _atualizar_status(len(filtradas))
+        texto = busca_var.get()
+        # uma a mais que a página: diz se ainda há o que carregar ao rolar
+        filtradas = _filtrar_rankeado_premium(texto, ListaVirtual.PAGINA + 1)
+        _render_lista(filtradas, texto)
+        _atualizar_status(lb.size())
 
         if len(filtradas) == 1:
             lb.selection_clear(0, "end")
@@ -903,13 +1147,10 @@ def abrir_movimento(root: tk.Tk, tipo: str) -> None:
         qtd_var.set("")
         motivo_var.set("")
 
-        novos = carregar_produtos()
-        for pp in novos:
-            try:
-                pid2 = int(pp.get("id", 0))
-            except Exception:
-                continue
-            id_para_produto[pid2] = pp
+        # o catálogo já tem o item atualizado (remendado na gravação)
+        p = catalogo.produto(int(pid))
+        if p is not None:
+            id_para_produto[int(pid)] = p
 
         _atualizar_preview()
         _avaliar_warn_saida()
@@ -933,13 +1174,35 @@ def abrir_movimento(root: tk.Tk, tipo: str) -> None:
 
     ent_qtd.bind("<Escape>", _esc_qtd)
 
+    # Catálogo compartilhado: estoque do item muda em outra janela -> prévia/aviso
+    # acompanham; item novo/renomeado -> lista refeita, mantendo a busca digitada
+    # e o item escolhido (a quantidade sendo digitada não é tocada).
+    def _ao_alterar_catalogo(eventos: list[dict]) -> None:
+        lista, estrutura, alterados = _mudancas_catalogo(eventos, id_para_produto)
+        if estrutura:
+            pid_sel = texto_para_id.get(obter_item_selecionado() or "")
+            lista.sort(key=lambda p: str(p.get("nome", "")).lower())
+            id_para_produto.clear()
+            id_para_produto.update({int(p.get("id", 0)): p for p in lista})
+            _montar_textos_produtos(lista, itens_exibicao, texto_para_id, id_para_texto)
+            itens_originais[:] = itens_exibicao
+            texto = busca_var.get()
+            _render_lista(_filtrar_rankeado_premium(texto, ListaVirtual.PAGINA + 1), texto)
+            _atualizar_status(lb.size())
+            _selecionar_texto(lb, id_para_texto.get(pid_sel))
+        elif alterados:
+            id_para_produto.update(alterados)
+        else:
+            return
+        _atualizar_preview()
+        _avaliar_warn_saida()
+
+    catalogo.assinar(_ao_alterar_catalogo, win)
+
 
 def abrir_abaixo_minimo(root: tk.Tk) -> None:
     produtos = carregar_produtos()
-    abaixo = [
-        p for p in produtos
-        if float(p.get("estoque_atual", 0)) < float(p.get("estoque_minimo", 0))
-    ]
+    abaixo = [p for p in produtos if _abaixo_do_minimo(p)]
     abaixo = sorted(abaixo, key=lambda p: str(p.get("nome", "")).lower())
 
     win = tk.Toplevel(root)
@@ -982,25 +1245,25 @@ def abrir_abaixo_minimo(root: tk.Tk) -> None:
     tree.column("atual", width=90, anchor="center")
     tree.column("minimo", width=90, anchor="center")
 
+    tabela = TabelaOrdenavel(tree, {c: _CHAVES_PRODUTO[c] for c in cols})
+
+    def _valores(p: dict) -> tuple:
+        return _valores_produto(p)[1:]  # sem o ID
+
     for p in abaixo:
-        tree.insert(
-            "", "end",
-            values=(
-                p.get("nome", ""),
-                p.get("unidade", ""),
-                p.get("estoque_atual", 0),
-                p.get("estoque_minimo", 0),
-            )
-        )
+        tabela.inserir(p, _valores(p))
+
+    # itens entram/saem da lista conforme as movimentações (sem recarregar tudo)
+    catalogo.assinar(
+        lambda eventos: _sincronizar_tabela_produtos(tabela, eventos, _valores, incluir=_abaixo_do_minimo),
+        win,
+    )
 
     if not abaixo:
         _status_ok("Nenhum item está abaixo do mínimo.", ms=2500)
 
 
 def abrir_historico(root: tk.Tk) -> None:
-    LIMITE_PADRAO = 300
-    PAGE_SIZE = 800  # incremental render para evitar lag no Treeview
-
     # janela única
     if _singleton_get(root, "historico") is not None:
         return
@@ -1026,11 +1289,6 @@ def abrir_historico(root: tk.Tk) -> None:
     ent_filtro = ttk.Entry(filtros, textvariable=filtro_var, width=30)
     ent_filtro.pack(side="left", padx=(8, 16))
 
-    ttk.Label(filtros, text="Limite").pack(side="left")
-    limite_var = tk.StringVar(value=str(LIMITE_PADRAO))
-    ent_limite = ttk.Entry(filtros, textvariable=limite_var, width=8)
-    ent_limite.pack(side="left", padx=(8, 16))
-
     ok_var = tk.StringVar(value="")
     ttk.Label(filtros, textvariable=ok_var, foreground="green").pack(side="right")
 
@@ -1052,22 +1310,29 @@ def abrir_historico(root: tk.Tk) -> None:
 
     cols = ("ts", "nome", "tipo", "motivo", "qtd", "antes", "depois")
 
-    table_frame = ttk.Frame(frame)
-    table_frame.pack(fill="both", expand=True)
-
-    tree_frame = ttk.Frame(table_frame)
-    tree_frame.pack(fill="both", expand=True)
-
-    tree = ttk.Treeview(tree_frame, columns=cols, show="headings", height=16)
-    tree.pack(side="left", fill="both", expand=True)
+    def _format_tipo(delta: float) -> str:
+        return "Entrada" if float(delta) > 0 else "Saída"
 
-    yscroll = ttk.Scrollbar(tree_frame, orient="vertical", command=tree.yview)
-    yscroll.pack(side="right", fill="y")
+    def _format_qtd(delta: float) -> float:
+        return abs(float(delta))
 
-    xscroll = ttk.Scrollbar(table_frame, orient="horizontal", command=tree.xview)
-    xscroll.pack(side="bottom", fill="x")
+    def _valores_linha(m: dict) -> tuple:
+        delta = _safe_float(m.get("delta", 0), 0.0)
+        return (
+            _fmt_dt_br(_parse_iso_ts(m.get("ts", ""))),
+            str(m.get("nome", "")),
+            _format_tipo(delta),
+            str(m.get("motivo", "") or ""),
+            _format_qtd(delta),
+            m.get("estoque_antes", ""),
+            m.get("estoque_depois", ""),
+        )
 
-    tree.configure(yscrollcommand=yscroll.set, xscrollcommand=xscroll.set)
+    # Tabela virtual: todo o histórico filtrado fica em memória, mas só as
+    # linhas visíveis existem no Treeview (sem limite / "Carregar mais")
+    tabela = TabelaVirtual(frame, cols, _valores_linha, height=16)
+    tabela.pack(fill="both", expand=True)
+    tree = tabela.tree
 
     tree.heading("ts", text="Data/Hora")
     tree.heading("nome", text="Item")
@@ -1088,102 +1353,62 @@ def abrir_historico(root: tk.Tk) -> None:
     for col in cols:
         tree.heading(col, anchor="center")
 
-    movimentos_cache: list[dict] = []
+    # ordena o histórico filtrado inteiro (modelo em memória), não só o que está na tela
+    tabela.ordenar_por_colunas({
+        "ts": lambda m: str(m.get("ts", "")),  # ISO: ordem de texto = ordem cronológica
+        "nome": lambda m: _texto_ord(m.get("nome")),
+        "tipo": lambda m: _safe_float(m.get("delta", 0), 0.0) > 0,
+        "motivo": lambda m: _texto_ord(m.get("motivo")),
+        "qtd": lambda m: abs(_safe_float(m.get("delta", 0), 0.0)),
+        "antes": lambda m: _safe_float(m.get("estoque_antes", 0), 0.0),
+        "depois": lambda m: _safe_float(m.get("estoque_depois", 0), 0.0),
+    })
+
+    # (nome normalizado, movimento): o filtro vira só um teste de substring
+    movimentos_cache: list[tuple[str, dict]] = []
     filtrados_cache: list[dict] = []
-    render_limit = PAGE_SIZE
-
-    def _parse_limite() -> int:
-        try:
-            n = int(limite_var.get().strip())
-        except Exception:
-            n = LIMITE_PADRAO
-        if n < 1:
-            n = 1
-        if n > 5000:
-            n = 5000
-        return n
-
-    def _format_tipo(delta: float) -> str:
-        return "Entrada" if float(delta) > 0 else "Saída"
-
-    def _format_qtd(delta: float) -> float:
-        return abs(float(delta))
 
     def _recalcular_filtrados() -> None:
         nonlocal filtrados_cache
         termo = normalizar_busca(filtro_var.get().strip())
+        if termo:
+            filtrados_cache = [m for nome_norm, m in movimentos_cache if termo in nome_norm]
+        else:
+            filtrados_cache = [m for _, m in movimentos_cache]
 
-        filtrados: list[dict] = []
-        for m in movimentos_cache:
-            nome = str(m.get("nome", ""))
-            nome_norm = normalizar_busca(nome)
-            if termo and termo not in nome_norm:
-                continue
-            filtrados.append(m)
-
-        filtrados_cache = filtrados
-
-    def _render() -> None:
-        tree.delete(*tree.get_children())
-
-        total = len(filtrados_cache)
-        exibidos = filtrados_cache[:render_limit]
-
-        for m in exibidos:
-            nome = str(m.get("nome", ""))
-            delta = _safe_float(m.get("delta", 0), 0.0)
-            dt = _parse_iso_ts(m.get("ts", ""))
-            ts = _fmt_dt_br(dt)
-            motivo = str(m.get("motivo", "") or "")
-
-            tree.insert(
-                "", "end",
-                values=(
-                    ts,
-                    nome,
-                    _format_tipo(delta),
-                    motivo,
-                    _format_qtd(delta),
-                    m.get("estoque_antes", ""),
-                    m.get("estoque_depois", ""),
-                ),
-            )
+    def _render(manter_posicao: bool = False) -> None:
+        tabela.definir_linhas(filtrados_cache, manter_posicao=manter_posicao)
+        status_var.set(f"{len(filtrados_cache)} registro(s)")
 
-        if total > render_limit:
-            status_var.set(f"{total} registro(s) — exibindo {render_limit}.")
-        else:
-            status_var.set(f"{total} registro(s)")
+    def _estado_carregando(carregando: bool) -> None:
+        if carregando:
+            status_var.set("Carregando histórico...")
 
-        # botão mais: habilita só se ainda houver mais pra carregar
-        try:
-            if total > render_limit:
-                btn_mais.state(["!disabled"])
-            else:
-                btn_mais.state(["disabled"])
-        except Exception:
-            pass
+    # leitura do arquivo numa thread; clicar "Atualizar" de novo cancela a anterior
+    carregador = Carregador(win, _estado_carregando)
 
-    def carregar() -> None:
-        nonlocal movimentos_cache, render_limit
-        limite = _parse_limite()
-        movimentos = listar_movimentos(limite=limite)
-        movimentos_cache = list(reversed(movimentos))  # mais recentes no topo
-        render_limit = PAGE_SIZE
+    def _ler_historico(tarefa: Tarefa) -> list[tuple[str, dict]]:
+        movimentos = listar_movimentos(progresso=tarefa.progresso)
+        movimentos.reverse()  # mais recentes no topo
+        return [(normalizar_busca(str(m.get("nome", ""))), m) for m in movimentos]
+
+    def _historico_carregado(dados: list[tuple[str, dict]]) -> None:
+        nonlocal movimentos_cache
+        movimentos_cache = dados
         _recalcular_filtrados()
         _render()
 
+    def _falha_historico(e: BaseException) -> None:
+        status_var.set("Falha ao carregar o histórico.")
+        messagebox.showerror("Erro", f"Não foi possível ler o histórico.\n\n{e}", parent=win)
+
+    def carregar() -> None:
+        carregador.carregar(_ler_historico, _historico_carregado, _falha_historico)
+
     def aplicar_filtro() -> None:
-        nonlocal render_limit
-        render_limit = PAGE_SIZE
         _recalcular_filtrados()
         _render()
 
-    def carregar_mais() -> None:
-        nonlocal render_limit
-        if render_limit < len(filtrados_cache):
-            render_limit = min(render_limit + PAGE_SIZE, len(filtrados_cache))
-            _render()
-
     def limpar_filtro() -> None:
         filtro_var.set("")
         aplicar_filtro()
@@ -1200,35 +1425,26 @@ def abrir_historico(root: tk.Tk) -> None:
         if not caminho:
             return
 
-        try:
-            termo = normalizar_busca(filtro_var.get().strip())
-            linhas = []
-            for m in movimentos_cache:
-                nome = str(m.get("nome", ""))
-                nome_norm = normalizar_busca(nome)
-                if termo and termo not in nome_norm:
-                    continue
-                linhas.append(m)
+        # lidos aqui (thread da UI); a tarefa não pode tocar no Tk
+        termo = normalizar_busca(filtro_var.get().strip())
+        movimentos = movimentos_cache
+
+        _exportar_em_segundo_plano(
+            win,
+            "Exportando CSV",
+            caminho,
+            lambda tarefa: _escrever_csv(caminho, _linhas_exportacao(tarefa, movimentos, termo)),
+            "CSV exportado com sucesso.",
+            "Não foi possível exportar o CSV.",
+            avisar=_ok,
+        )
 
-            with open(caminho, "w", encoding="utf-8", newline="") as f:
-                w = csv.writer(f, delimiter=";")
-                w.writerow(["data_hora", "item", "tipo", "motivo", "qtd", "antes", "depois"])
-                for m in linhas:
-                    delta = _safe_float(m.get("delta", 0), 0.0)
-                    dt = _parse_iso_ts(m.get("ts", ""))
-                    w.writerow([
-                        _fmt_dt_br(dt),
-                        str(m.get("nome", "")),
-                        _format_tipo(delta),
-                        str(m.get("motivo", "") or ""),
-                        _format_qtd(delta),
-                        m.get("estoque_antes", ""),
-                        m.get("estoque_depois", ""),
-                    ])
-
-            _ok("CSV exportado com sucesso.", ms=2500)
-        except Exception as e:
-            messagebox.showerror("Erro", f"Não foi possível exportar o CSV.\n\n{e}")
+    def _escrever_csv(caminho: str, linhas) -> None:
+        with open(caminho, "w", encoding="utf-8", newline="") as f:
+            w = csv.writer(f, delimiter=";")
+            w.writerow(["data_hora", "item", "tipo", "motivo", "qtd", "antes", "depois"])
+            for row in linhas:
+                w.writerow(row)
 
     def exportar_excel() -> None:
         nome_sugerido = f"historico_estoque_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
@@ -1242,71 +1458,38 @@ def abrir_historico(root: tk.Tk) -> None:
         if not caminho:
             return
 
-        try:
-            from openpyxl import Workbook
-            from openpyxl.styles import Font, PatternFill, Alignment
-            from openpyxl.utils import get_column_letter
-
-            termo = normalizar_busca(filtro_var.get().strip())
-            linhas = []
-            for m in movimentos_cache:
-                nome = str(m.get("nome", ""))
-                nome_norm = normalizar_busca(nome)
-                if termo and termo not in nome_norm:
-                    continue
-                linhas.append(m)
-
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "Histórico"
-
-            header = ["Data/Hora", "Item", "Tipo", "Motivo", "Qtd", "Antes", "Depois"]
-            ws.append(header)
-
-            header_font = Font(bold=True)
-            header_fill = PatternFill("solid", fgColor="DDDDDD")
-            header_align = Alignment(horizontal="center")
-
-            for col in range(1, len(header) + 1):
-                c = ws.cell(row=1, column=col)
-                c.font = header_font
-                c.fill = header_fill
-                c.alignment = header_align
+        termo = normalizar_busca(filtro_var.get().strip())
+        movimentos = movimentos_cache
+
+        _exportar_em_segundo_plano(
+            win,
+            "Exportando Excel",
+            caminho,
+            lambda tarefa: exportar_xlsx(
+                caminho,
+                ["Data/Hora", "Item", "Tipo", "Motivo", "Qtd", "Antes", "Depois"],
+                _linhas_exportacao(tarefa, movimentos, termo),
+                titulo="Histórico",
+                largura_max=55,
+            ),
+            "Excel exportado com sucesso.",
+            "Não foi possível exportar o Excel.",
+            avisar=_ok,
+        )
 
-            for m in linhas:
-                delta = _safe_float(m.get("delta", 0), 0.0)
-                dt = _parse_iso_ts(m.get("ts", ""))
-                ws.append([
-                    _fmt_dt_br(dt),
-                    str(m.get("nome", "")),
-                    _format_tipo(delta),
-                    str(m.get("motivo", "") or ""),
-                    _format_qtd(delta),
-                    m.get("estoque_antes", ""),
-                    m.get("estoque_depois", ""),
-                ])
-
-            # largura
-            for col in ws.columns:
-                max_len = 0
-                col_letter = get_column_letter(col[0].column)
-                for cell in col:
-                    if cell.value is not None:
-                        max_len = max(max_len, len(str(cell.value)))
-                ws.column_dimensions[col_letter].width = min(max_len + 2, 55)
-
-            wb.save(caminho)
-            _ok("Excel exportado com sucesso.", ms=2500)
-        except Exception as e:
-            messagebox.showerror("Erro", f"Não foi possível exportar o Excel.\n\n{e}")
+    def _linhas_exportacao(tarefa: Tarefa, movimentos: list[tuple[str, dict]], termo: str):
+        """Linhas formatadas para exportação (roda na thread da tarefa)."""
+        total = len(movimentos)
+        for i, (nome_norm, m) in enumerate(movimentos, 1):
+            if i % 500 == 0:
+                tarefa.progresso(i, total)
+            if termo and termo not in nome_norm:
+                continue
+            yield list(_valores_linha(m))  # mesmas colunas e formatação da tabela
 
     botoes = ttk.Frame(frame)
     botoes.pack(fill="x", pady=(10, 0))
 
-    # 'Carregar mais' (incremental) para evitar lag com muitos registros
-    btn_mais = ttk.Button(botoes, text=f"Carregar mais {PAGE_SIZE}", command=carregar_mais, takefocus=False)
-    btn_mais.pack(side="left")
-
     ttk.Button(botoes, text="Atualizar", command=carregar, takefocus=False).pack(side="right")
     ttk.Button(botoes, text="Exportar Excel", command=exportar_excel, takefocus=False).pack(side="right", padx=(0, 8))
     ttk.Button(botoes, text="Exportar CSV", command=exportar_csv, takefocus=False).pack(side="right", padx=(0, 8))
@@ -1315,6 +1498,23 @@ def abrir_historico(root: tk.Tk) -> None:
     ent_filtro.bind("<Return>", lambda e: aplicar_filtro())
     ent_filtro.bind("<Escape>", lambda e: limpar_filtro())
 
+    # Movimentos gravados com a janela aberta entram no topo, sem reler o arquivo
+    def _ao_alterar_catalogo(eventos: list[dict]) -> None:
+        nonlocal movimentos_cache
+        if houve_recarga(eventos) or carregador.carregando:
+            # importação/restauração, ou leitura em andamento que talvez não os inclua
+            carregar()
+            return
+        novos = [e["movimento"] for e in eventos if e.get("tipo") == "movimento"]
+        if not novos:
+            return
+        novos.reverse()  # mais recentes no topo
+        movimentos_cache = [(normalizar_busca(str(m.get("nome", ""))), m) for m in novos] + movimentos_cache
+        _recalcular_filtrados()
+        _render(manter_posicao=True)
+
+    catalogo.assinar(_ao_alterar_catalogo, win)
+
     carregar()
     ent_filtro.focus_set()
 
@@ -1380,40 +1580,20 @@ def abrir_dashboard(root: tk.Tk) -> None:
     xscroll_cov.pack(side="bottom", fill="x")
     tree_cov.configure(xscrollcommand=xscroll_cov.set)
 
-    # Ordenação por clique no cabeçalho (profissional)
-    _sort_cov = {"col": None, "desc": False}
-
-    def _coerce_cov(col: str, v: str):
-        if col in ("atual", "min"):
-            try:
-                return float(str(v).replace(",", "."))
-            except Exception:
-                return 0.0
-        if col == "cob":
-            # ex: "0.85x"
-            try:
-                return float(str(v).lower().replace("x", "").replace(",", ".").strip())
-            except Exception:
-                return 0.0
-        return str(v).lower()
-
-    def ordenar_cov(col: str):
-        if _sort_cov["col"] == col:
-            _sort_cov["desc"] = not _sort_cov["desc"]
-        else:
-            _sort_cov["col"] = col
-            _sort_cov["desc"] = False
-
-        itens = list(tree_cov.get_children(""))
-        itens.sort(key=lambda iid: _coerce_cov(col, tree_cov.set(iid, col)), reverse=_sort_cov["desc"])
-        for i, iid in enumerate(itens):
-            tree_cov.move(iid, "", i)
-
-    tree_cov.heading("nome", text="Item", command=lambda: ordenar_cov("nome"))
-    tree_cov.heading("un", text="Unid.", command=lambda: ordenar_cov("un"))
-    tree_cov.heading("atual", text="Atual", command=lambda: ordenar_cov("atual"))
-    tree_cov.heading("min", text="Mínimo", command=lambda: ordenar_cov("min"))
-    tree_cov.heading("cob", text="Cobertura", command=lambda: ordenar_cov("cob"))
+    tree_cov.heading("nome", text="Item")
+    tree_cov.heading("un", text="Unid.")
+    tree_cov.heading("atual", text="Atual")
+    tree_cov.heading("min", text="Mínimo")
+    tree_cov.heading("cob", text="Cobertura")
+
+    # Ordenação por clique no cabeçalho: registro = (cobertura, produto)
+    tabela_cov = TabelaOrdenavel(tree_cov, {
+        "nome": lambda r: _texto_ord(r[1].get("nome")),
+        "un": lambda r: _texto_ord(r[1].get("unidade")),
+        "atual": lambda r: _safe_float(r[1].get("estoque_atual", 0), 0.0),
+        "min": lambda r: _safe_float(r[1].get("estoque_minimo", 0), 0.0),
+        "cob": lambda r: r[0],
+    })
 
     tree_cov.column("nome", width=320)
     tree_cov.column("un", width=70, anchor="center")
@@ -1435,39 +1615,18 @@ def abrir_dashboard(root: tk.Tk) -> None:
     xscroll_mov.pack(side="bottom", fill="x")
     tree_mov.configure(xscrollcommand=xscroll_mov.set)
 
-    # Ordenação por clique no cabeçalho (profissional)
-    _sort_mov = {"col": None, "desc": False}
-
-    def _coerce_mov(col: str, v: str):
-        if col == "qtd":
-            try:
-                return float(str(v).replace(",", "."))
-            except Exception:
-                return 0.0
-        if col == "ts":
-            # formato BR: dd/mm/YYYY HH:MM
-            try:
-                return datetime.strptime(str(v), "%d/%m/%Y %H:%M")
-            except Exception:
-                return datetime.min
-        return str(v).lower()
-
-    def ordenar_mov(col: str):
-        if _sort_mov["col"] == col:
-            _sort_mov["desc"] = not _sort_mov["desc"]
-        else:
-            _sort_mov["col"] = col
-            _sort_mov["desc"] = False
-
-        itens = list(tree_mov.get_children(""))
-        itens.sort(key=lambda iid: _coerce_mov(col, tree_mov.set(iid, col)), reverse=_sort_mov["desc"])
-        for i, iid in enumerate(itens):
-            tree_mov.move(iid, "", i)
+    tree_mov.heading("ts", text="Data/Hora")
+    tree_mov.heading("nome", text="Item")
+    tree_mov.heading("tipo", text="Tipo")
+    tree_mov.heading("qtd", text="Qtd")
 
-    tree_mov.heading("ts", text="Data/Hora", command=lambda: ordenar_mov("ts"))
-    tree_mov.heading("nome", text="Item", command=lambda: ordenar_mov("nome"))
-    tree_mov.heading("tipo", text="Tipo", command=lambda: ordenar_mov("tipo"))
-    tree_mov.heading("qtd", text="Qtd", command=lambda: ordenar_mov("qtd"))
+    # registro = movimento (ts ISO ordena cronologicamente sem reconverter o texto da tela)
+    tabela_mov = TabelaOrdenavel(tree_mov, {
+        "ts": lambda m: str(m.get("ts", "")),
+        "nome": lambda m: _texto_ord(m.get("nome")),
+        "tipo": lambda m: _safe_float(m.get("delta", 0), 0.0) > 0,
+        "qtd": lambda m: abs(_safe_float(m.get("delta", 0), 0.0)),
+    })
 
     tree_mov.column("ts", width=140, anchor="center")
     tree_mov.column("nome", width=320)
@@ -1477,7 +1636,8 @@ def abrir_dashboard(root: tk.Tk) -> None:
     status_var = tk.StringVar(value="")
     ttk.Label(frame, textvariable=status_var).pack(anchor="w", pady=(10, 0))
 
-    def atualizar():
+    def _calcular_painel(tarefa: Tarefa) -> dict:
+        """Leitura e contas do painel (roda na thread do carregador)."""
         produtos = carregar_produtos()
         total = len(produtos)
 
@@ -1505,41 +1665,73 @@ def abrir_dashboard(root: tk.Tk) -> None:
 
             cov_list.append((cobertura, p))
 
-        total_var.set(str(total))
-        abaixo_var.set(str(abaixo))
-        alertas_var.set(str(alertas))
-
         # Top 5 menor cobertura (ignorando inf)
-        tree_cov.delete(*tree_cov.get_children())
         cov_list = [x for x in cov_list if x[0] != float("inf")]
         cov_list.sort(key=lambda x: x[0])
-        for cobertura, p in cov_list[:5]:
-            un = str(p.get("unidade", "")).strip()
-            atual = _safe_float(p.get("estoque_atual", 0), 0.0)
-            minimo = _safe_float(p.get("estoque_minimo", 0), 0.0)
-            tree_cov.insert(
-                "", "end",
-                values=(p.get("nome", ""), un, atual, minimo, f"{cobertura:.2f}x"),
-            )
 
-        # Últimas 10 movimentações
-        tree_mov.delete(*tree_mov.get_children())
-        movs = listar_movimentos(limite=10)
-        movs = list(reversed(movs))  # mais recentes primeiro
-        for m in movs:
-            dt = _parse_iso_ts(m.get("ts", ""))
-            nome = str(m.get("nome", ""))
-            delta = _safe_float(m.get("delta", 0), 0.0)
-            tipo = "Entrada" if delta > 0 else "Saída"
-            qtd = abs(delta)
-            tree_mov.insert("", "end", values=(_fmt_dt_br(dt), nome, tipo, qtd))
+        tarefa.verificar()
+        # Últimas 10 movimentações (lidas do fim do arquivo, já mais recentes primeiro)
+        movs, _ = pagina_movimentos(limite=10)
+
+        return {"total": total, "abaixo": abaixo, "alertas": alertas, "cobertura": cov_list[:5], "movs": movs}
+
+    def _mostrar_painel(dados: dict) -> None:
+        total_var.set(str(dados["total"]))
+        abaixo_var.set(str(dados["abaixo"]))
+        alertas_var.set(str(dados["alertas"]))
+
+        def _linhas_cov():
+            for cobertura, p in dados["cobertura"]:
+                un = str(p.get("unidade", "")).strip()
+                atual = _safe_float(p.get("estoque_atual", 0), 0.0)
+                minimo = _safe_float(p.get("estoque_minimo", 0), 0.0)
+                yield (cobertura, p), (p.get("nome", ""), un, atual, minimo, f"{cobertura:.2f}x")
+
+        def _linhas_mov():
+            for m in dados["movs"]:
+                dt = _parse_iso_ts(m.get("ts", ""))
+                nome = str(m.get("nome", ""))
+                delta = _safe_float(m.get("delta", 0), 0.0)
+                tipo = "Entrada" if delta > 0 else "Saída"
+                qtd = abs(delta)
+                yield m, (_fmt_dt_br(dt), nome, tipo, qtd)
+
+        # mantém a coluna escolhida pelo usuário ao atualizar
+        tabela_cov.definir(_linhas_cov())
+        tabela_mov.definir(_linhas_mov())
 
         status_var.set(f"Atualizado em {_fmt_dt_br(datetime.now())}")
 
+    def _estado_painel(carregando: bool) -> None:
+        if carregando:
+            status_var.set("Atualizando...")
+
+    carregador = Carregador(win, _estado_painel)
+
+    def atualizar():
+        carregador.carregar(_calcular_painel, _mostrar_painel)
+
     botoes = ttk.Frame(frame)
     botoes.pack(fill="x", pady=(10, 0))
     ttk.Button(botoes, text="Atualizar", command=atualizar, takefocus=False).pack(side="right")
 
+    # Alterações gravadas (nesta ou em outra janela) refazem o painel sozinhas;
+    # várias seguidas (ex.: aplicar inventário) viram uma atualização só.
+    _painel_after = None
+
+    def _ao_alterar_catalogo(eventos: list[dict]) -> None:
+        nonlocal _painel_after
+        if not any(e.get("tipo") in ("movimento", "produto_criado", "recarregar") for e in eventos):
+            return
+        if _painel_after is not None:
+            try:
+                win.after_cancel(_painel_after)
+            except Exception:
+                pass
+        _painel_after = win.after(300, atualizar)
+
+    catalogo.assinar(_ao_alterar_catalogo, win)
+
     atualizar()
 
 
@@ -1582,6 +1774,7 @@ def abrir_relatorios_periodo(root: tk.Tk) -> None:
         ini = hoje - timedelta(days=dias)
         de_var.set(ini.isoformat())
         ate_var.set(hoje.isoformat())
+        gerar()
 
     ttk.Button(filtros, text="7 dias", command=lambda: _set_periodo(7), takefocus=False).pack(side="left", padx=(0, 6))
     ttk.Button(filtros, text="30 dias", command=lambda: _set_periodo(30), takefocus=False).pack(side="left", padx=(0, 6))
@@ -1626,6 +1819,18 @@ def abrir_relatorios_periodo(root: tk.Tk) -> None:
     tree2.column("nome", width=320)
     tree2.column("volume", width=100, anchor="center")
 
+    # registro = linha do resumo do core (valores numéricos, não o texto da tela)
+    tabela_totais = TabelaOrdenavel(tree, {
+        "nome": lambda r: _texto_ord(r.get("nome")),
+        "entradas": lambda r: r["entradas"],
+        "saidas": lambda r: r["saidas"],
+        "saldo": lambda r: r["saldo"],
+    })
+    tabela_top = TabelaOrdenavel(tree2, {
+        "nome": lambda r: _texto_ord(r.get("nome")),
+        "volume": lambda r: r["volume"],
+    })
+
     cache_relatorio = {
         "periodo": ("", ""),
         "linhas": [],  # list of dict
@@ -1651,46 +1856,28 @@ def abrir_relatorios_periodo(root: tk.Tk) -> None:
             status_var.set("Período inválido: 'Até' menor que 'De'.")
             return
 
-        movs = listar_movimentos(limite=None)
-
-        # filtra por período (inclui dia inteiro)
-        ini_dt = datetime(d1.year, d1.month, d1.day, 0, 0, 0)
-        fim_dt = datetime(d2.year, d2.month, d2.day, 23, 59, 59)
-
-        por_item = {}  # nome -> {entradas, saidas, saldo, volume}
-        for m in movs:
-            dt = _parse_iso_ts(m.get("ts", ""))
-            if not dt:
-                continue
-            if dt < ini_dt or dt > fim_dt:
-                continue
-
-            nome = str(m.get("nome", ""))
-            delta = _safe_float(m.get("delta", 0), 0.0)
+        # agregação no core (uma passada pelo histórico), numa thread;
+        # trocar o período antes de terminar cancela o pedido anterior
+        carregador.carregar(
+            lambda tarefa: resumir_periodos([(d1, d2)], top_n=20, progresso=tarefa.progresso)[0],
+            lambda resumo: _mostrar_relatorio(d1, d2, resumo),
+        )
 
-            if nome not in por_item:
-                por_item[nome] = {"nome": nome, "entradas": 0.0, "saidas": 0.0, "saldo": 0.0, "volume": 0.0}
+    def _estado_relatorio(carregando: bool) -> None:
+        if carregando:
+            status_var.set("Gerando relatório...")
 
-            if delta > 0:
-                por_item[nome]["entradas"] += delta
-            else:
-                por_item[nome]["saidas"] += abs(delta)
+    carregador = Carregador(win, _estado_relatorio)
 
-            por_item[nome]["saldo"] += delta
-            por_item[nome]["volume"] += abs(delta)
+    def _mostrar_relatorio(d1: date, d2: date, resumo: dict) -> None:
+        linhas = resumo["linhas"]
 
-        linhas = list(por_item.values())
-        linhas.sort(key=lambda x: x["nome"].lower())
-
-        tree.delete(*tree.get_children())
-        for r in linhas:
-            tree.insert("", "end", values=(r["nome"], round(r["entradas"], 3), round(r["saidas"], 3), round(r["saldo"], 3)))
+        tabela_totais.definir(
+            (r, (r["nome"], round(r["entradas"], 3), round(r["saidas"], 3), round(r["saldo"], 3))) for r in linhas
+        )
 
         # top movimentados
-        top = sorted(linhas, key=lambda x: x["volume"], reverse=True)
-        tree2.delete(*tree2.get_children())
-        for r in top[:20]:
-            tree2.insert("", "end", values=(r["nome"], round(r["volume"], 3)))
+        tabela_top.definir((r, (r["nome"], round(r["volume"], 3))) for r in resumo["top"])
 
         cache_relatorio["periodo"] = (d1.isoformat(), d2.isoformat())
         cache_relatorio["linhas"] = linhas
@@ -1714,15 +1901,14 @@ def abrir_relatorios_periodo(root: tk.Tk) -> None:
         if not caminho:
             return
 
-        try:
+        def _escrever(tarefa: Tarefa) -> None:
             with open(caminho, "w", encoding="utf-8", newline="") as f:
                 w = csv.writer(f, delimiter=";")
                 w.writerow(["item", "entradas", "saidas", "saldo", "volume"])
-                for r in linhas:
+                for r in _com_progresso(tarefa, linhas):
                     w.writerow([r["nome"], r["entradas"], r["saidas"], r["saldo"], r["volume"]])
-            messagebox.showinfo("OK", "Relatório CSV exportado.")
-        except Exception as e:
-            messagebox.showerror("Erro", f"Falha ao exportar CSV:\n\n{e}")
+
+        _exportar_em_segundo_plano(win, "Exportando CSV", caminho, _escrever, "Relatório CSV exportado.", "Falha ao exportar CSV:")
 
     def exportar_relatorio_excel():
         linhas = cache_relatorio.get("linhas", [])
@@ -1742,44 +1928,27 @@ def abrir_relatorios_periodo(root: tk.Tk) -> None:
         if not caminho:
             return
 
-        try:
-            from openpyxl import Workbook
-            from openpyxl.styles import Font, PatternFill, Alignment
-            from openpyxl.utils import get_column_letter
-
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "Relatório"
-
-            header = ["Item", "Entradas", "Saídas", "Saldo", "Volume"]
-            ws.append(header)
-
-            header_font = Font(bold=True)
-            header_fill = PatternFill("solid", fgColor="DDDDDD")
-            header_align = Alignment(horizontal="center")
-
-            for col in range(1, len(header) + 1):
-                c = ws.cell(row=1, column=col)
-                c.font = header_font
-                c.fill = header_fill
-                c.alignment = header_align
-
-            for r in linhas:
-                ws.append([r["nome"], r["entradas"], r["saidas"], r["saldo"], r["volume"]])
-
-            # largura
-            for col in ws.columns:
-                max_len = 0
-                col_letter = get_column_letter(col[0].column)
-                for cell in col:
-                    if cell.value is not None:
-                        max_len = max(max_len, len(str(cell.value)))
-                ws.column_dimensions[col_letter].width = min(max_len + 2, 45)
-
-            wb.save(caminho)
-            messagebox.showinfo("OK", "Relatório Excel exportado.")
-        except Exception as e:
-            messagebox.showerror("Erro", f"Falha ao exportar Excel:\n\n{e}")
+        _exportar_em_segundo_plano(
+            win,
+            "Exportando Excel",
+            caminho,
+            lambda tarefa: exportar_xlsx(
+                caminho,
+                ["Item", "Entradas", "Saídas", "Saldo", "Volume"],
+                ([r["nome"], r["entradas"], r["saidas"], r["saldo"], r["volume"]] for r in _com_progresso(tarefa, linhas)),
+                titulo="Relatório",
+                largura_max=45,
+            ),
+            "Relatório Excel exportado.",
+            "Falha ao exportar Excel:",
+        )
+
+    def _com_progresso(tarefa: Tarefa, linhas: list[dict]):
+        total = len(linhas)
+        for i, r in enumerate(linhas, 1):
+            if i % 500 == 0:
+                tarefa.progresso(i, total)
+            yield r
 
     botoes = ttk.Frame(frame)
     botoes.pack(fill="x", pady=(10, 0))
@@ -1834,43 +2003,15 @@ def abrir_ajuste_estoque(root: tk.Tk) -> None:
 
     itens_exibicao = []
     texto_para_id = {}
-    item_para_nome_norm = {}
-    item_para_tokens = {}
-    usados = {}
-
-    for p in produtos:
-        nome = str(p.get("nome", "")).strip()
-        unidade = str(p.get("unidade", "")).strip()
-        pid = int(p.get("id", 0))
-
-        base = nome
-        if base in usados:
-            base = f"{nome} ({unidade})" if unidade else nome
-        n = usados.get(base, 0) + 1
-        usados[base] = n
-        texto_exibido = base if n == 1 else f"{base} ({n})"
-
-        itens_exibicao.append(texto_exibido)
-        texto_para_id[texto_exibido] = pid
-
-        nn = normalizar_busca(nome)
-        item_para_nome_norm[texto_exibido] = nn
-        item_para_tokens[texto_exibido] = nn.split() if nn else []
+    id_para_texto = {}
+    _montar_textos_produtos(produtos, itens_exibicao, texto_para_id, id_para_texto)
 
     itens_originais = itens_exibicao.copy()
 
-    list_frame = ttk.Frame(frame)
-    list_frame.pack(fill="both", expand=True, pady=(0, 10))
-
-    yscroll = ttk.Scrollbar(list_frame, orient="vertical")
-    yscroll.pack(side="right", fill="y")
-
-    lb = tk.Listbox(
-        list_frame,
+    lb = ListaVirtual(
+        frame,
+        itens_originais,
         height=10,
-        activestyle="none",
-        exportselection=False,
-        yscrollcommand=yscroll.set,
         bg="#ffffff",
         fg="#1f2933",
         selectbackground="#2563eb",
@@ -1880,11 +2021,7 @@ def abrir_ajuste_estoque(root: tk.Tk) -> None:
         relief="flat",
         borderwidth=0,
     )
-    lb.pack(side="left", fill="both", expand=True)
-    yscroll.config(command=lb.yview)
-
-    for it in itens_originais:
-        lb.insert("end", it)
+    lb.pack(fill="both", expand=True, pady=(0, 10))
 
     preview_var = tk.StringVar(value="Selecione um item para ver o estoque atual.")
     ttk.Label(frame, textvariable=preview_var).pack(anchor="w", pady=(0, 10))
@@ -1911,31 +2048,24 @@ def abrir_ajuste_estoque(root: tk.Tk) -> None:
         sufixo = f" {un}" if un else ""
         preview_var.set(f"Estoque atual: {atual}{sufixo}  |  Mínimo: {minimo}{sufixo}")
 
-    def filtrar():
-        q = normalizar_busca(busca_var.get())
-        if not q:
+    def _buscar(texto: str, limite: int) -> list[str]:
+        ids = buscar_ids_produtos(texto, limite)
+        return [id_para_texto[pid] for pid in ids if pid in id_para_texto]
+
+    def filtrar(auto_selecionar: bool = True):
+        texto = busca_var.get()
+        if normalizar_busca(texto):
+            # uma a mais que a página: diz se ainda há o que carregar ao rolar
+            itens = _buscar(texto, ListaVirtual.PAGINA + 1)
+        else:
             itens = itens_originais
+
+        if normalizar_busca(texto) and len(itens) > ListaVirtual.PAGINA:
+            lb.definir_itens(itens[:ListaVirtual.PAGINA], mais=lambda n: _buscar(texto, n))
         else:
-            qtoks = q.split()
-            a, b, c, d = [], [], [], []
-            for item_txt in itens_originais:
-                nome_norm = item_para_nome_norm.get(item_txt, "")
-                ntoks = item_para_tokens.get(item_txt, [])
-                if nome_norm.startswith(q):
-                    a.append(item_txt)
-                elif match_prefix_por_palavras(qtoks, ntoks):
-                    b.append(item_txt)
-                elif q in nome_norm:
-                    c.append(item_txt)
-                elif match_tokens_em_ordem(qtoks, ntoks):
-                    d.append(item_txt)
-            itens = a + b + c + d
-
-        lb.delete(0, "end")
-        for it in itens:
-            lb.insert("end", it)
-
-        if len(itens) == 1:
+            lb.definir_itens(itens)
+
+        if auto_selecionar and len(itens) == 1:
             lb.selection_set(0)
             lb.activate(0)
             lb.see(0)
@@ -2035,13 +2165,10 @@ def abrir_ajuste_estoque(root: tk.Tk) -> None:
             ent_qtd.focus_set()
             return
 
-        # recarrega produtos pra preview bater
-        novos = carregar_produtos()
-        for pp in novos:
-            try:
-                id_para_produto[int(pp.get("id", 0))] = pp
-            except Exception:
-                pass
+        # o catálogo já tem o item atualizado (remendado na gravação)
+        p = catalogo.produto(int(pid))
+        if p is not None:
+            id_para_produto[int(pid)] = p
 
         atualizar_preview()
         status_var.set(f"Ajuste aplicado ({mot}).")
@@ -2050,6 +2177,26 @@ def abrir_ajuste_estoque(root: tk.Tk) -> None:
 
     ttk.Button(frame, text="Aplicar ajuste", command=aplicar, takefocus=False).pack(anchor="e")
 
+    # mesma regra da janela de movimento: busca, item escolhido e quantidade ficam
+    def _ao_alterar_catalogo(eventos: list[dict]) -> None:
+        lista, estrutura, alterados = _mudancas_catalogo(eventos, id_para_produto)
+        if estrutura:
+            pid_sel = texto_para_id.get(obter_item() or "")
+            lista.sort(key=lambda p: str(p.get("nome", "")).lower())
+            id_para_produto.clear()
+            id_para_produto.update({int(p.get("id", 0)): p for p in lista})
+            _montar_textos_produtos(lista, itens_exibicao, texto_para_id, id_para_texto)
+            itens_originais[:] = itens_exibicao
+            filtrar(auto_selecionar=False)
+            _selecionar_texto(lb, id_para_texto.get(pid_sel))
+        elif alterados:
+            id_para_produto.update(alterados)
+        else:
+            return
+        atualizar_preview()
+
+    catalogo.assinar(_ao_alterar_catalogo, win)
+
 
 # ============================================================
 # 4) INVENTÁRIO / CONTAGEM GUIADA
@@ -2072,11 +2219,27 @@ def abrir_inventario_contagem(root: tk.Tk) -> None:
     _configurar_fechamento_toplevel(win, root)
     _singleton_register(root, "inventario", win)
 
+    # Sessão persistida: entra na contagem em andamento (pode ter sido aberta
+    # pela API, ainda sem nada contado); só abre uma nova se não houver nenhuma.
+    sessao = sessao_aberta()
+    retomada = sessao is not None and bool(sessao["contagens"])
+    if sessao is None:
+        sessao = iniciar_sessao()
+
     frame = ttk.Frame(win, padding=12)
     frame.pack(fill="both", expand=True)
 
     ttk.Label(frame, text="Inventário / Contagem guiada", font=("Segoe UI", 12, "bold")).pack(anchor="w", pady=(0, 8))
-    ttk.Label(frame, text="Digite o 'Contado' e aplique para ajustar o estoque ao valor real.").pack(anchor="w", pady=(0, 10))
+    ttk.Label(frame, text="Digite o 'Contado' e aplique para ajustar o estoque ao valor real.").pack(anchor="w", pady=(0, 4))
+    sessao_var = tk.StringVar(value="")
+    ttk.Label(frame, textvariable=sessao_var, foreground="#555").pack(anchor="w", pady=(0, 10))
+
+    def _mostrar_sessao():
+        inicio = str(sessao.get("inicio", "")).replace("T", " ")
+        txt = f"Contagem iniciada em {inicio} (salva automaticamente)."
+        if retomada:
+            txt += f" Retomada com {len(sessao['contagens'])} item(ns) já contado(s)."
+        sessao_var.set(txt)
 
     topo = ttk.Frame(frame)
     topo.pack(fill="x", pady=(0, 10))
@@ -2096,35 +2259,12 @@ def abrir_inventario_contagem(root: tk.Tk) -> None:
     # mostra tudo internamente, mas oculta visualmente o ID (mantém funcionamento normal)
     tree["displaycolumns"] = ("nome", "un", "atual", "contado", "diff")
 
-    # Ordenação por clique no cabeçalho (profissional)
-    _sort_inv = {"col": None, "desc": False}
-
-    def _coerce_inv(col: str, v: str):
-        if col in ("id", "atual", "contado", "diff"):
-            try:
-                return float(str(v).replace(",", "."))
-            except Exception:
-                return 0.0
-        return str(v).lower()
-
-    def ordenar_inv(col: str):
-        if _sort_inv["col"] == col:
-            _sort_inv["desc"] = not _sort_inv["desc"]
-        else:
-            _sort_inv["col"] = col
-            _sort_inv["desc"] = False
-
-        itens = list(tree.get_children(""))
-        itens.sort(key=lambda iid: _coerce_inv(col, tree.set(iid, col)), reverse=_sort_inv["desc"])
-        for i, iid in enumerate(itens):
-            tree.move(iid, "", i)
-
-    tree.heading("id", text="ID", command=lambda: ordenar_inv("id"))
-    tree.heading("nome", text="Item", command=lambda: ordenar_inv("nome"))
-    tree.heading("un", text="Unid.", command=lambda: ordenar_inv("un"))
-    tree.heading("atual", text="Atual", command=lambda: ordenar_inv("atual"))
-    tree.heading("contado", text="Contado", command=lambda: ordenar_inv("contado"))
-    tree.heading("diff", text="Diferença", command=lambda: ordenar_inv("diff"))
+    tree.heading("id", text="ID")
+    tree.heading("nome", text="Item")
+    tree.heading("un", text="Unid.")
+    tree.heading("atual", text="Atual")
+    tree.heading("contado", text="Contado")
+    tree.heading("diff", text="Diferença")
 
     tree.column("id", width=60, anchor="center")
     tree.column("nome", width=380)
@@ -2171,6 +2311,7 @@ def abrir_inventario_contagem(root: tk.Tk) -> None:
         diff = float(v) - atual
         tree.set(iid, "contado", float(v))
         tree.set(iid, "diff", diff)
+        _agendar_gravacao(iid)
 
         status_var.set("Contado atualizado na tabela. Clique em 'Aplicar ajustes' para gravar no estoque.")
         try:
@@ -2198,32 +2339,119 @@ def abrir_inventario_contagem(root: tk.Tk) -> None:
     tree.bind("<<TreeviewSelect>>", _on_select_row)
 
 
-    # cache: iid -> dict com valores
-    linhas: dict[str, dict] = {}
+    # Modelo persistente: iid -> dict com valores (inclui o "contado" digitado).
+    # Cada produto vira uma linha UMA vez; o filtro só desanexa/reanexa linhas,
+    # então os valores contados sobrevivem a qualquer filtro.
+    # Ordenação por clique no cabeçalho: ordena o modelo, não a tela.
+    tabela = TabelaOrdenavel(tree, {
+        "id": lambda r: r["id"],
+        "nome": lambda r: _texto_ord(r["nome"]),
+        "un": lambda r: _texto_ord(r["un"]),
+        "atual": lambda r: r["atual"],
+        "contado": lambda r: r["contado"] if r["contado"] is not None else 0.0,
+        "diff": lambda r: (r["contado"] - r["atual"]) if r["contado"] is not None else 0.0,
+    }, exibir=lambda: filtrar())
+    linhas: dict[str, dict] = tabela.registros
+    ordem: list[str] = tabela.ordem  # todas as linhas, na ordem atual (ordenação)
+
+    # nome normalizado calculado uma vez por produto (não a cada tecla)
+    def _com_nome_norm(lista: list[dict]) -> list[tuple[str, dict]]:
+        return [(normalizar_busca(str(p.get("nome", ""))), p) for p in lista]
+
+    produtos_norm = _com_nome_norm(produtos)
+
+    def _inserir_linha(nome_norm: str, p: dict) -> str:
+        base = sessao.get("base", {})
+        contagens = sessao.get("contagens", {})
+        nome = str(p.get("nome", ""))
+        pid = int(p.get("id", 0))
+        un = str(p.get("unidade", "")).strip()
+        atual = _safe_float(base.get(str(pid), p.get("estoque_atual", 0)), 0.0)
+        contado = contagens[pid]["contado"] if pid in contagens else None
 
-    def render():
-        tree.delete(*tree.get_children())
-        linhas.clear()
+        if contado is None:
+            valores = (pid, nome, un, atual, "", "")
+        else:
+            valores = (pid, nome, un, atual, contado, round(contado - atual, 3))
+        return tabela.inserir(
+            {"id": pid, "nome": nome, "un": un, "atual": atual, "contado": contado, "nome_norm": nome_norm},
+            valores,
+        )
 
-        termo = normalizar_busca(filtro_var.get().strip())
-        count = 0
+    def reconstruir():
+        """(Re)cria todas as linhas a partir de `produtos` e da sessão (abertura e após aplicar ajustes)."""
+        tabela.limpar()  # inclusive as linhas escondidas pelo filtro
 
-        for p in produtos:
-            nome = str(p.get("nome", ""))
-            if termo and termo not in normalizar_busca(nome):
-                continue
+        # "Atual" = retrato do início da sessão (é contra ele que a diferença é calculada)
+        for nome_norm, p in produtos_norm:
+            _inserir_linha(nome_norm, p)
 
-            pid = int(p.get("id", 0))
-            un = str(p.get("unidade", "")).strip()
-            atual = _safe_float(p.get("estoque_atual", 0), 0.0)
-            contado = ""  # vazio inicialmente
-            diff = ""
+        tabela.desfazer()
+        _mostrar_sessao()
+        filtrar()
+
+    # Gravação da sessão: junta as edições e grava uma linha pequena por lote,
+    # alguns instantes depois da última digitação (e ao fechar a janela).
+    pendentes: dict[int, float | None] = {}
+    _gravar_after = None
+
+    def gravar_pendentes():
+        nonlocal _gravar_after
+        _gravar_after = None
+        if not pendentes:
+            return
+        lote = dict(pendentes)
+        pendentes.clear()
+        try:
+            registrar_contagens(sessao["id"], lote)
+        except Exception as e:
+            status_var.set(f"Falha ao salvar a contagem: {e}")
+
+    def _agendar_gravacao(iid: str):
+        nonlocal _gravar_after
+        r = linhas.get(iid)
+        if not r:
+            return
+        pendentes[int(r["id"])] = r.get("contado")
+        if _gravar_after is not None:
+            try:
+                win.after_cancel(_gravar_after)
+            except Exception:
+                pass
+        _gravar_after = win.after(800, gravar_pendentes)
 
-            iid = tree.insert("", "end", values=(pid, nome, un, atual, contado, diff))
-            linhas[iid] = {"id": pid, "nome": nome, "un": un, "atual": atual, "contado": None}
-            count += 1
+    def _on_destroy(event=None):
+        if event is not None and event.widget is not win:
+            return
+        if _acompanhar_after is not None:
+            try:
+                win.after_cancel(_acompanhar_after)
+            except Exception:
+                pass
+        gravar_pendentes()
 
-        status_var.set(f"{count} item(ns)")
+    win.bind("<Destroy>", _on_destroy, add="+")
+
+    def filtrar():
+        termo = normalizar_busca(filtro_var.get().strip())
+        if termo:
+            visiveis = [iid for iid in ordem if termo in linhas[iid]["nome_norm"]]
+        else:
+            visiveis = ordem
+        # uma chamada só: as linhas fora da lista são desanexadas (não apagadas)
+        tree.set_children("", *visiveis)
+        status_var.set(f"{len(visiveis)} item(ns)")
+
+    _filtro_after = None
+
+    def on_filtro_key(event=None):
+        nonlocal _filtro_after
+        if _filtro_after is not None:
+            try:
+                win.after_cancel(_filtro_after)
+            except Exception:
+                pass
+        _filtro_after = win.after(150, filtrar)
 
     def _recalc(iid: str):
         r = linhas.get(iid)
@@ -2290,6 +2518,7 @@ def abrir_inventario_contagem(root: tk.Tk) -> None:
                 tree.set(iid, "contado", "")
                 linhas[iid]["contado"] = None
                 _recalc(iid)
+                _agendar_gravacao(iid)
                 _close_editor()
                 return "break"
 
@@ -2308,6 +2537,7 @@ def abrir_inventario_contagem(root: tk.Tk) -> None:
             tree.set(iid, "contado", str(val))
             linhas[iid]["contado"] = float(val)
             _recalc(iid)
+            _agendar_gravacao(iid)
             _close_editor()
             return "break"
 
@@ -2317,42 +2547,63 @@ def abrir_inventario_contagem(root: tk.Tk) -> None:
 
     tree.bind("<Double-Button-1>", _start_edit)
 
-    def aplicar_ajustes():
-        # motivo fixo (UI): "Contagem"
-        mot = "Contagem"
-        ajustes = []
-        for iid, r in linhas.items():
-            contado = r.get("contado")
-            if contado is None:
-                continue
-            atual = float(r.get("atual", 0.0))
-            delta = float(contado) - atual
-            if abs(delta) < 1e-9:
-                continue
-            ajustes.append((r["id"], delta))
+    def _recarregar_produtos():
+        nonlocal_prod = carregar_produtos()
+        nonlocal_prod = sorted(nonlocal_prod, key=lambda p: str(p.get("nome", "")).lower())
+        produtos[:] = nonlocal_prod  # mantém referência
+        produtos_norm[:] = _com_nome_norm(produtos)
 
-        if not ajustes:
+    def _nova_sessao():
+        nonlocal sessao, retomada
+        sessao = iniciar_sessao()
+        retomada = False
+        _recarregar_produtos()
+        reconstruir()
+
+    def aplicar_ajustes():
+        gravar_pendentes()
+        try:
+            sessao.update(carregar_sessao(sessao["id"]))
+            itens = ajustes_da_sessao(sessao)
+        except Exception as e:
+            messagebox.showerror("Erro", f"Falha ao ler a contagem:\n\n{e}")
+            return
+        if not itens:
             messagebox.showinfo("OK", "Nada para ajustar.")
             return
 
-        # aplica em lote
-        erros = 0
-        for pid, delta in ajustes:
-            try:
-                atualizar_estoque(int(pid), float(delta), motivo=mot)
-            except Exception:
-                erros += 1
+        # um lote só (tudo ou nada) com motivo "Contagem"
+        try:
+            res = encerrar_sessao(sessao["id"])
+        except Exception as e:
+            messagebox.showerror("Erro", f"Falha ao aplicar ajustes:\n\n{e}")
+            return
 
-        # recarrega produtos e re-renderiza
-        nonlocal_prod = carregar_produtos()
-        nonlocal_prod = sorted(nonlocal_prod, key=lambda p: str(p.get("nome", "")).lower())
-        produtos[:] = nonlocal_prod  # mantém referência
-        render()
+        if not res["aplicado"]:
+            erros = [r for r in res["resultados"] if not r.get("ok")]
+            nomes = {r["id"]: r["nome"] for r in linhas.values()}
+            detalhes = "\n".join(
+                f"- {nomes.get(itens[r['indice']]['produto_id'], '?')}: {r.get('erro', '')}" for r in erros[:10]
+            )
+            messagebox.showwarning(
+                "Ajustes não aplicados",
+                f"Nenhum ajuste foi gravado ({len(erros)} erro(s)). A contagem continua salva.\n\n{detalhes}",
+            )
+            return
 
-        if erros:
-            messagebox.showwarning("Concluído", f"Ajustes aplicados com {erros} erro(s).")
-        else:
-            messagebox.showinfo("Concluído", f"Ajustes aplicados: {len(ajustes)}")
+        _nova_sessao()
+        messagebox.showinfo("Concluído", f"Ajustes aplicados: {res['ajustes']}")
+
+    def descartar_contagem():
+        if not messagebox.askyesno("Descartar contagem", "Apagar todos os valores contados desta sessão?"):
+            return
+        pendentes.clear()
+        try:
+            descartar_sessao(sessao["id"])
+        except Exception as e:
+            messagebox.showerror("Erro", f"Falha ao descartar:\n\n{e}")
+            return
+        _nova_sessao()
 
     def exportar_lista_contagem():
         # exporta lista com Atual e campo Contado vazio (para imprimir/usar fora)
@@ -2371,9 +2622,9 @@ def abrir_inventario_contagem(root: tk.Tk) -> None:
             with open(caminho, "w", encoding="utf-8", newline="") as f:
                 w = csv.writer(f, delimiter=";")
                 w.writerow(["id", "item", "unidade", "estoque_atual", "contado"])
-                for p in produtos:
+                for nome_norm, p in produtos_norm:
                     nome = str(p.get("nome", ""))
-                    if termo and termo not in normalizar_busca(nome):
+                    if termo and termo not in nome_norm:
                         continue
                     w.writerow([p.get("id", ""), nome, p.get("unidade", ""), p.get("estoque_atual", 0), ""])
             messagebox.showinfo("OK", "Lista de contagem exportada.")
@@ -2385,9 +2636,122 @@ def abrir_inventario_contagem(root: tk.Tk) -> None:
 
     ttk.Button(botoes, text="Exportar lista (CSV)", command=exportar_lista_contagem, takefocus=False).pack(side="left")
     ttk.Button(botoes, text="Aplicar ajustes", command=aplicar_ajustes, takefocus=False).pack(side="right")
+    ttk.Button(botoes, text="Descartar contagem", command=descartar_contagem, takefocus=False).pack(side="right", padx=(0, 8))
+
+    ent_filtro.bind("<KeyRelease>", on_filtro_key)
+
+    # Catálogo compartilhado: "Atual" é o retrato da sessão, então movimentos
+    # não mexem nas linhas (exceto itens cadastrados depois do início); item
+    # novo ganha linha, item renomeado tem a linha remendada. Num "recarregar"
+    # (importação, restauração, outro processo) a releitura é comparada com o
+    # que a tela tem: filtro, ordenação, seleção e o editor aberto ficam.
+    def _remendar_linha(iid: str, p: dict) -> None:
+        r = linhas[iid]
+        nome = str(p.get("nome", ""))
+        un = str(p.get("unidade", "")).strip()
+        if (nome, un) != (r["nome"], r["un"]):
+            r.update(nome=nome, un=un, nome_norm=normalizar_busca(nome))
+            tree.set(iid, "nome", nome)
+            tree.set(iid, "un", un)
+        if str(r["id"]) not in sessao.get("base", {}):
+            r["atual"] = _safe_float(p.get("estoque_atual", 0), 0.0)
+            tree.set(iid, "atual", r["atual"])
+            _recalc(iid)
+
+    def _ao_alterar_catalogo(eventos: list[dict]) -> None:
+        relido = houve_recarga(eventos)
+        if relido:
+            try:
+                aberta = carregar_sessao(sessao["id"]).get("status") == "aberta"
+            except Exception:
+                aberta = True
+            if not aberta:
+                # encerrada em outro lugar (ex.: pela API)
+                _close_editor()
+                gravar_pendentes()
+                _nova_sessao()
+                return
+            lista = carregar_produtos()
+            estrutura, alterados = comparar_produtos({int(p.get("id", 0)): p for p in produtos}, lista)
+            if not estrutura and not alterados:
+                return
+            novos_ids = {int(p.get("id", 0)) for p in lista}
+            produtos[:] = sorted(lista, key=lambda p: str(p.get("nome", "")).lower())
+            produtos_norm[:] = _com_nome_norm(produtos)
+            for iid, r in list(linhas.items()):
+                if r["id"] not in novos_ids:  # sumiu (ex.: restauração de backup)
+                    if editor["iid"] == iid:
+                        _close_editor()
+                    tabela.remover(iid)
+        else:
+            estrutura = False
+            alterados = produtos_alterados(eventos)
+            if not alterados:
+                return
+
+        por_id = {r["id"]: iid for iid, r in linhas.items()}
+        for pid, p in alterados.items():
+            iid = por_id.get(pid)
+            if iid is None:
+                nome_norm = normalizar_busca(str(p.get("nome", "")))
+                if not relido:  # na releitura, `produtos` já é a lista nova
+                    produtos.append(p)
+                    produtos_norm.append((nome_norm, p))
+                _inserir_linha(nome_norm, p)
+                estrutura = True
+            else:
+                _remendar_linha(iid, p)
+        if estrutura:
+            tabela.reordenar()  # reaplica a ordenação e o filtro atuais
 
-    ent_filtro.bind("<KeyRelease>", lambda e: render())
-    render()
+    catalogo.assinar(_ao_alterar_catalogo, win)
+
+    # Contagens enviadas por outros aparelhos (API, inclusive de outro processo)
+    # só aparecem no arquivo da sessão: a leitura é incremental, então
+    # consultar a cada segundo custa apenas as linhas novas.
+    _acompanhar_after = None
+
+    def _acompanhar_sessao():
+        nonlocal _acompanhar_after
+        _acompanhar_after = win.after(1000, _acompanhar_sessao)
+        try:
+            atual = carregar_sessao(sessao["id"])
+        except Exception:
+            return
+        if atual.get("status") != "aberta":
+            # encerrada/descartada em outro lugar (ex.: pela API)
+            _close_editor()
+            gravar_pendentes()
+            _nova_sessao()
+            return
+
+        antigas = sessao.get("contagens", {})
+        novas = atual["contagens"]
+        sessao["contagens"] = novas
+        mudaram = [
+            pid for pid in set(antigas) | set(novas)
+            if (novas.get(pid) or {}).get("contado") != (antigas.get(pid) or {}).get("contado")
+        ]
+        if not mudaram:
+            return
+        por_id = {r["id"]: iid for iid, r in linhas.items()}
+        sel = tree.selection()
+        for pid in mudaram:
+            iid = por_id.get(pid)
+            # edição local ainda não gravada (ou sendo digitada) vale mais
+            if iid is None or pid in pendentes or iid == editor["iid"]:
+                continue
+            contado = novas[pid]["contado"] if pid in novas else None
+            if linhas[iid]["contado"] == contado:
+                continue
+            linhas[iid]["contado"] = contado
+            tree.set(iid, "contado", "" if contado is None else contado)
+            _recalc(iid)
+            if sel and sel[0] == iid and win.focus_get() is not ent_contado:
+                _on_select_row()
+
+    reconstruir()
+    _acompanhar_after = win.after(1000, _acompanhar_sessao)
 
 
 def ajustar_janela_ao_conteudo_e_centralizar(root: tk.Tk, margem: int = 24) -> None:
@@ -2562,6 +2926,9 @@ def main():
     root = tk.Tk()
     root.withdraw()  # evita o "flash" e aparecer em outro lugar por milissegundos
 
+    # catálogo compartilhado: as janelas abertas recebem as alterações gravadas
+    catalogo.iniciar(root)
+
     # ===== TEMA MODERNO (padrão LIGHT) =====
     # (Opcional) sv-ttk deixa a interface com cara mais moderna.
     # Se não estiver instalado, o app roda normalmente com ttk padrão.
@@ -2606,13 +2973,20 @@ def main():
     config_menu.add_command(label="Mostrar pasta atual", command=lambda: mostrar_backup_google_drive(root))
     config_menu.add_separator()
     config_menu.add_command(label="Desativar backup externo", command=lambda: desativar_backup_google_drive(root))
+    config_menu.add_separator()
+    config_menu.add_command(label="Relatórios automáticos...", command=lambda: configurar_relatorios_automaticos(root))
     menubar.add_cascade(label="Configurações", menu=config_menu)
 
     config_menu.add_command(
-    label="Importar planilha inicial (Excel)...",
+    label="Importar planilha (Excel)...",
     command=lambda: importar_planilha_excel(root)
 )
     
+    config_menu.add_command(
+    label="Importar histórico de movimentos (CSV/Excel)...",
+    command=lambda: importar_movimentos_planilha(root)
+)
+
     config_menu.add_command(
     label="Restaurar do Google Drive",
     command=lambda: restaurar_backup_drive(root)
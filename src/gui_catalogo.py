@@ -0,0 +1,211 @@
+"""
+Catálogo de produtos compartilhado pelas janelas da interface.
+
+Uma única cópia em memória (id -> produto) para o processo da interface.
+O core avisa cada alteração já gravada (assinar_alteracoes): o catálogo
+aplica o remendo na hora, na thread que gravou, e repassa os eventos às
+janelas inscritas, que atualizam só as linhas afetadas em vez de recarregar.
+
+As janelas recebem os eventos SEMPRE na thread do Tk: eles passam por uma
+fila consumida com after(), agrupados (uma lista por rodada).
+Gravações de outro processo (ex.: a API aberta junto) não geram aviso; são
+percebidas pela versão dos dados e viram um evento "recarregar".
+"""
+from __future__ import annotations
+
+import queue
+import threading
+import tkinter as tk
+from typing import Any, Callable, Dict, List, Tuple
+
+from .estoque_core import assinar_alteracoes, listar_produtos, versao_dados, versao_gravada
+
+INTERVALO_MS = 100
+VERIFICAR_VERSAO_MS = 1000
+
+Ouvinte = Callable[[List[Dict[str, Any]]], None]
+
+
+class Catalogo:
+    """
+    Produtos em memória + eventos por linha para as janelas.
+
+    Eventos repassados (os mesmos do core):
+        {"tipo": "movimento", "produto", "movimento"}
+        {"tipo": "produto_criado", "produto"}
+        {"tipo": "recarregar"}  (importação, restauração ou outro processo)
+        {"tipo": "inventario", ...}
+    """
+
+    def __init__(self) -> None:
+        self._produtos: Dict[int, Dict[str, Any]] | None = None
+        self._versao: str | None = None
+        # muda a cada alteração avisada: leitura feita antes dela está velha
+        self._geracao = 0
+        self._trava = threading.Lock()
+        self._fila: "queue.SimpleQueue[Dict[str, Any]]" = queue.SimpleQueue()
+        self._ouvintes: List[Ouvinte] = []
+        self._root: tk.Misc | None = None
+        self._desde_verificacao = 0
+
+    # ---------- ciclo de vida ----------
+    def iniciar(self, root: tk.Misc) -> None:
+        """Liga o catálogo ao core e à thread do Tk (uma vez, no main)."""
+        if self._root is not None:
+            return
+        self._root = root
+        assinar_alteracoes(self._ao_alterar)
+        root.after(INTERVALO_MS, self._poll)
+
+    # ---------- leitura (qualquer thread) ----------
+    def _garantir(self) -> Dict[int, Dict[str, Any]]:
+        while True:
+            with self._trava:
+                if self._produtos is not None:
+                    return self._produtos
+                geracao = self._geracao
+
+            # lê fora da trava: o core pode estar gravando (e nos avisando) agora
+            versao = versao_dados()
+            produtos = {int(p.get("id", 0)): p for p in listar_produtos()}
+            with self._trava:
+                if self._produtos is not None:
+                    return self._produtos
+                if self._geracao == geracao:
+                    self._produtos = produtos
+                    # versão de ANTES da leitura: se outro processo gravou no meio, o _poll recarrega
+                    self._versao = versao
+                    return self._produtos
+            # houve alteração durante a leitura (o remendo não chegou a ela): lê de novo
+
+    def produtos(self) -> List[Dict[str, Any]]:
+        """Cópia da lista de produtos (quem recebe pode alterar à vontade)."""
+        dados = self._garantir()
+        with self._trava:
+            return [dict(p) for p in dados.values()]
+
+    def produto(self, produto_id: int) -> Dict[str, Any] | None:
+        dados = self._garantir()
+        with self._trava:
+            p = dados.get(int(produto_id))
+            return dict(p) if p is not None else None
+
+    # ---------- inscrição (thread do Tk) ----------
+    def assinar(self, ouvinte: Ouvinte, widget: tk.Misc | None = None) -> Callable[[], None]:
+        """
+        ouvinte(eventos) é chamado na thread do Tk com os eventos da rodada.
+        Com `widget`, a inscrição é cancelada sozinha quando ele é destruído.
+        """
+        self._ouvintes.append(ouvinte)
+
+        def cancelar() -> None:
+            try:
+                self._ouvintes.remove(ouvinte)
+            except ValueError:
+                pass
+
+        if widget is not None:
+            def _on_destroy(event: Any) -> None:
+                if event.widget is widget:
+                    cancelar()
+
+            widget.bind("<Destroy>", _on_destroy, add="+")
+        return cancelar
+
+    # ---------- alterações ----------
+    def _ao_alterar(self, evento: Dict[str, Any]) -> None:
+        """Chamado pelo core na thread que gravou: remenda já, entrega depois."""
+        tipo = evento.get("tipo")
+        with self._trava:
+            if tipo != "inventario":
+                self._geracao += 1
+                # versão de logo depois da NOSSA gravação: gravação de outro processo depois dela ainda é percebida
+                self._versao = versao_gravada()
+            if self._produtos is not None:
+                if tipo in ("movimento", "produto_criado"):
+                    p = evento["produto"]
+                    self._produtos[int(p.get("id", 0))] = dict(p)
+                elif tipo == "recarregar":
+                    self._produtos = None
+        self._fila.put(evento)
+
+    def _verificar_versao(self) -> Dict[str, Any] | None:
+        with self._trava:
+            if self._produtos is None:
+                return None
+            conhecida = self._versao
+        if versao_dados() == conhecida:
+            return None
+        with self._trava:
+            self._produtos = None
+        return {"tipo": "recarregar"}
+
+    def _poll(self) -> None:
+        eventos: List[Dict[str, Any]] = []
+        try:
+            while True:
+                eventos.append(self._fila.get_nowait())
+        except queue.Empty:
+            pass
+
+        self._desde_verificacao += INTERVALO_MS
+        if self._desde_verificacao >= VERIFICAR_VERSAO_MS:
+            self._desde_verificacao = 0
+            try:
+                externo = self._verificar_versao()
+            except Exception:
+                externo = None
+            if externo is not None:
+                eventos.append(externo)
+
+        if eventos:
+            for ouvinte in list(self._ouvintes):
+                try:
+                    ouvinte(eventos)
+                except Exception:
+                    # uma janela com problema não pode travar as outras
+                    pass
+
+        try:
+            self._root.after(INTERVALO_MS, self._poll)
+        except Exception:
+            pass  # root destruído: aplicação encerrando
+
+
+catalogo = Catalogo()
+
+
+def houve_recarga(eventos: List[Dict[str, Any]]) -> bool:
+    return any(e.get("tipo") == "recarregar" for e in eventos)
+
+
+def produtos_alterados(eventos: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+    """Último estado de cada produto alterado/criado na rodada (id -> produto)."""
+    alterados: Dict[int, Dict[str, Any]] = {}
+    for e in eventos:
+        if e.get("tipo") in ("movimento", "produto_criado"):
+            p = e["produto"]
+            alterados[int(p.get("id", 0))] = dict(p)
+    return alterados
+
+
+def comparar_produtos(
+    atuais: Dict[int, Dict[str, Any]], novos: List[Dict[str, Any]]
+) -> Tuple[bool, Dict[int, Dict[str, Any]]]:
+    """
+    Compara a releitura de um "recarregar" com o que a janela já tem (id -> produto).
+    Retorna (estrutura, alterados): estrutura=True quando entrou/saiu produto ou
+    mudou nome/unidade (os textos da lista mudam e ela precisa ser refeita);
+    alterados = id -> produto novo de cada um que mudou em algum campo.
+    """
+    por_id = {int(p.get("id", 0)): p for p in novos}
+    estrutura = por_id.keys() != atuais.keys()
+    alterados: Dict[int, Dict[str, Any]] = {}
+    for pid, p in por_id.items():
+        antigo = atuais.get(pid)
+        if antigo == p:
+            continue
+        alterados[pid] = p
+        if antigo is None or any(str(antigo.get(k, "")) != str(p.get(k, "")) for k in ("nome", "unidade")):
+            estrutura = True
+    return estrutura, alterados
@@ -0,0 +1,799 @@
+"""
+Componentes reutilizáveis da interface (Tkinter).
+
+Tarefas em segundo plano:
+    O trabalho pesado (exportar, importar, restaurar backup) roda numa thread.
+    A thread NUNCA toca no Tk: ela só coloca mensagens numa fila, e a janela
+    consome essa fila com after(), na thread da interface.
+"""
+from __future__ import annotations
+
+import queue
+import threading
+import tkinter as tk
+import tkinter.font as tkfont
+from tkinter import ttk, messagebox
+from typing import Any, Callable
+
+
+class TarefaCancelada(Exception):
+    """A tarefa foi cancelada pelo usuário."""
+
+
+class Tarefa:
+    """
+    Handle passado para a função executada em segundo plano.
+
+    A função chama tarefa.progresso(feito, total, msg) de tempos em tempos;
+    se o usuário cancelou, progresso() levanta TarefaCancelada.
+    A assinatura progresso(feito, total) também serve como callback de
+    progresso do core (ex.: iter_movimentos / exportar_movimentos_csv).
+    """
+
+    def __init__(self) -> None:
+        self._cancelar = threading.Event()
+        self._fila: queue.Queue = queue.Queue()
+
+    @property
+    def cancelada(self) -> bool:
+        return self._cancelar.is_set()
+
+    def cancelar(self) -> None:
+        self._cancelar.set()
+
+    def verificar(self) -> None:
+        if self._cancelar.is_set():
+            raise TarefaCancelada()
+
+    def progresso(self, feito: float, total: float = 0, msg: str | None = None) -> None:
+        self._fila.put(("progresso", feito, total, msg))
+        self.verificar()
+
+
+INTERVALO_POLL_MS = 50
+
+
+def executar_em_segundo_plano(
+    parent: tk.Misc,
+    titulo: str,
+    fn: Callable[[Tarefa], Any],
+    ao_concluir: Callable[[Any], None] | None = None,
+    ao_falhar: Callable[[BaseException], None] | None = None,
+    ao_cancelar: Callable[[], None] | None = None,
+    cancelavel: bool = True,
+) -> Tarefa:
+    """
+    Roda fn(tarefa) numa thread, com janela de progresso e botão Cancelar.
+    Os callbacks (ao_concluir / ao_falhar / ao_cancelar) rodam na thread da UI.
+    """
+    tarefa = Tarefa()
+
+    win = tk.Toplevel(parent)
+    win.title(titulo)
+    win.geometry("420x150")
+    win.resizable(False, False)
+    try:
+        win.transient(parent.winfo_toplevel())
+    except Exception:
+        pass
+
+    frame = ttk.Frame(win, padding=12)
+    frame.pack(fill="both", expand=True)
+
+    msg_var = tk.StringVar(value=f"{titulo}...")
+    ttk.Label(frame, textvariable=msg_var).pack(anchor="w", pady=(0, 8))
+
+    barra = ttk.Progressbar(frame, mode="indeterminate", maximum=100)
+    barra.pack(fill="x")
+    barra.start(12)
+    modo = {"determinado": False}
+
+    def _cancelar():
+        tarefa.cancelar()
+        msg_var.set("Cancelando...")
+        try:
+            btn_cancelar.state(["disabled"])
+        except Exception:
+            pass
+
+    btn_cancelar = ttk.Button(frame, text="Cancelar", command=_cancelar, takefocus=False)
+    btn_cancelar.pack(anchor="e", pady=(12, 0))
+    if not cancelavel:
+        btn_cancelar.state(["disabled"])
+
+    # fechar no X = cancelar (a janela some quando a thread terminar)
+    win.protocol("WM_DELETE_WINDOW", _cancelar if cancelavel else (lambda: None))
+
+    def _worker():
+        try:
+            resultado = fn(tarefa)
+        except TarefaCancelada:
+            tarefa._fila.put(("cancelada",))
+        except BaseException as e:  # noqa: BLE001 - repassado para a UI
+            tarefa._fila.put(("erro", e))
+        else:
+            if tarefa.cancelada:
+                tarefa._fila.put(("cancelada",))
+            else:
+                tarefa._fila.put(("ok", resultado))
+
+    def _fechar():
+        try:
+            barra.stop()
+        except Exception:
+            pass
+        try:
+            win.destroy()
+        except Exception:
+            pass
+
+    def _poll():
+        try:
+            while True:
+                item = tarefa._fila.get_nowait()
+                tipo = item[0]
+
+                if tipo == "progresso":
+                    _, feito, total, msg = item
+                    if msg:
+                        msg_var.set(msg)
+                    if total and total > 0:
+                        if not modo["determinado"]:
+                            barra.stop()
+                            barra.configure(mode="determinate")
+                            modo["determinado"] = True
+                        barra["value"] = max(0.0, min(100.0, 100.0 * float(feito) / float(total)))
+                    continue
+
+                _fechar()
+                if tipo == "ok":
+                    if ao_concluir is not None:
+                        ao_concluir(item[1])
+                elif tipo == "cancelada":
+                    if ao_cancelar is not None:
+                        ao_cancelar()
+                else:
+                    if ao_falhar is not None:
+                        ao_falhar(item[1])
+                    else:
+                        messagebox.showerror("Erro", f"{titulo}: falhou.\n\n{item[1]}", parent=parent)
+                return
+        except queue.Empty:
+            pass
+
+        try:
+            win.after(INTERVALO_POLL_MS, _poll)
+        except Exception:
+            pass
+
+    threading.Thread(target=_worker, name=f"tarefa:{titulo}", daemon=True).start()
+    win.after(INTERVALO_POLL_MS, _poll)
+    return tarefa
+
+
+class ListaVirtual(ttk.Frame):
+    """
+    Lista com rolagem virtual: o modelo (lista de textos) fica em memória e só as
+    linhas visíveis existem no Listbox. Trocar o conteúdo custa o mesmo para
+    100 ou 50 mil itens (definir_itens).
+
+    Imita a parte do tk.Listbox usada nas telas: size, get, curselection,
+    selection_set/clear, activate, see, delete, insert e bind (repassado ao
+    Listbox interno). Os índices são sempre do MODELO, não da linha na tela.
+
+    Lista preguiçosa: definir_itens(primeira_pagina, mais=fn) mostra a primeira
+    página e, quando a rolagem chega perto do fim, pede fn(n) = os n primeiros
+    itens; para quando fn devolver menos que o pedido.
+    """
+
+    ROLAGEM_RODA = 3  # linhas por "clique" da roda do mouse
+    PAGINA = 200  # itens pedidos a mais de cada vez (lista preguiçosa)
+
+    def __init__(self, parent: tk.Misc, itens: list[str] | None = None, height: int = 10, **opcoes: Any) -> None:
+        super().__init__(parent)
+        self._itens: list[str] = list(itens or [])
+        self._mais: Callable[[int], list[str]] | None = None
+        self._topo = 0
+        self._sel: int | None = None
+        self._linhas = max(1, int(height))
+
+        self.scroll = ttk.Scrollbar(self, orient="vertical", command=self._on_scroll)
+        self.scroll.pack(side="right", fill="y")
+
+        opcoes.setdefault("activestyle", "none")
+        opcoes.setdefault("exportselection", False)
+        self.lb = tk.Listbox(self, height=height, **opcoes)
+        self.lb.pack(side="left", fill="both", expand=True)
+
+        # Tag própria antes da do widget: estes handlers rodam antes dos de quem usa a lista
+        tag = f"ListaVirtual{id(self)}"
+        self.lb.bindtags((tag,) + self.lb.bindtags())
+        self.lb.bind_class(tag, "<<ListboxSelect>>", self._on_select_tela)
+        self.lb.bind_class(tag, "<Configure>", self._on_configure)
+        for seq, passo in (("<Up>", -1), ("<Down>", 1), ("<Prior>", "-pagina"), ("<Next>", "pagina"),
+                           ("<Home>", "inicio"), ("<End>", "fim")):
+            self.lb.bind_class(tag, seq, lambda e, p=passo: self._mover_selecao(p))
+        self.lb.bind_class(tag, "<MouseWheel>", self._on_roda)
+        self.lb.bind_class(tag, "<Button-4>", lambda e: self._rolar(-self.ROLAGEM_RODA))
+        self.lb.bind_class(tag, "<Button-5>", lambda e: self._rolar(self.ROLAGEM_RODA))
+
+        self._render()
+
+    # ---------- modelo ----------
+    def definir_itens(self, itens: list[str], mais: Callable[[int], list[str]] | None = None) -> None:
+        """Troca todo o conteúdo de uma vez (limpa seleção e volta ao topo)."""
+        self._itens = list(itens)
+        self._mais = mais if itens else None
+        self._topo = 0
+        self._sel = None
+        self._render()
+
+    @property
+    def completa(self) -> bool:
+        """False enquanto ainda pode haver itens a carregar (lista preguiçosa)."""
+        return self._mais is None
+
+    def _carregar_mais(self) -> None:
+        if self._mais is None or self._topo + 2 * self._linhas < len(self._itens):
+            return
+        pedido = len(self._itens) + max(self.PAGINA, 2 * self._linhas)
+        itens = self._mais(pedido)
+        if len(itens) < pedido:
+            self._mais = None  # veio tudo
+        if len(itens) > len(self._itens):
+            self._itens = list(itens)
+        self.lb.event_generate("<<ListaCarregada>>")  # quem mostra a contagem atualiza
+
+    def size(self) -> int:
+        return len(self._itens)
+
+    def get(self, indice: int) -> str:
+        return self._itens[int(indice)]
+
+    def delete(self, first: Any = 0, last: Any = "end") -> None:
+        self.definir_itens([])
+
+    def insert(self, index: Any, *itens: str) -> None:
+        self._itens.extend(itens)
+        self._render()
+
+    # ---------- seleção ----------
+    def curselection(self) -> tuple[int, ...]:
+        return () if self._sel is None else (self._sel,)
+
+    def selection_set(self, first: Any, last: Any = None) -> None:
+        i = int(first)
+        if 0 <= i < len(self._itens):
+            self._sel = i
+            self._render()
+
+    def selection_clear(self, first: Any = 0, last: Any = None) -> None:
+        self._sel = None
+        self._render()
+
+    def activate(self, indice: Any) -> None:
+        pass  # sem cursor próprio: a linha ativa é a selecionada
+
+    def see(self, indice: Any) -> None:
+        i = int(indice)
+        if i < self._topo:
+            self._topo = i
+        elif i >= self._topo + self._linhas:
+            self._topo = i - self._linhas + 1
+        self._render()
+
+    def bind(self, sequence: str | None = None, func: Any = None, add: Any = None) -> Any:
+        return self.lb.bind(sequence, func, add)
+
+    def focus_set(self) -> None:
+        self.lb.focus_set()
+
+    # ---------- desenho ----------
+    def _render(self) -> None:
+        self._carregar_mais()
+        total = len(self._itens)
+        self._topo = max(0, min(self._topo, total - self._linhas))
+
+        self.lb.delete(0, "end")
+        fatia = self._itens[self._topo:self._topo + self._linhas]
+        if fatia:
+            self.lb.insert(0, *fatia)
+        if self._sel is not None and self._topo <= self._sel < self._topo + len(fatia):
+            self.lb.selection_set(self._sel - self._topo)
+            self.lb.activate(self._sel - self._topo)
+
+        if total:
+            self.scroll.set(self._topo / total, min(1.0, (self._topo + self._linhas) / total))
+        else:
+            self.scroll.set(0.0, 1.0)
+
+    def _altura_linha(self) -> int:
+        # altura de linha do Listbox = linespace da fonte + 1 + bordas da seleção
+        try:
+            fonte = tkfont.Font(root=self.lb, font=self.lb.cget("font"))
+            espaco = int(fonte.metrics("linespace"))
+        except Exception:
+            espaco = 16
+        return max(1, espaco + 1 + 2 * int(self.lb.cget("selectborderwidth") or 0))
+
+    def _on_configure(self, event: Any = None) -> None:
+        borda = 2 * (int(self.lb.cget("borderwidth") or 0) + int(self.lb.cget("highlightthickness") or 0))
+        linhas = max(1, (self.lb.winfo_height() - borda) // self._altura_linha())
+        if linhas != self._linhas:
+            self._linhas = linhas
+            self._render()
+
+    def _rolar(self, delta: int) -> str:
+        self._topo += int(delta)
+        self._render()
+        return "break"
+
+    def _on_roda(self, event: Any) -> str:
+        passos = -1 if event.delta > 0 else 1
+        return self._rolar(passos * self.ROLAGEM_RODA)
+
+    def _on_scroll(self, acao: str, valor: str, unidade: str | None = None) -> None:
+        if acao == "moveto":
+            self._topo = int(float(valor) * len(self._itens))
+        elif acao == "scroll":
+            self._topo += int(valor) * (self._linhas if unidade == "pages" else 1)
+        self._render()
+
+    def _on_select_tela(self, event: Any = None) -> None:
+        sel = self.lb.curselection()
+        if sel:
+            self._sel = self._topo + int(sel[0])
+
+    def _mover_selecao(self, passo: Any) -> str:
+        if not self._itens:
+            return "break"
+        atual = self._topo if self._sel is None else self._sel
+        if passo == "inicio":
+            novo = 0
+        elif passo == "fim":
+            novo = len(self._itens) - 1
+        elif passo == "pagina":
+            novo = atual + self._linhas
+        elif passo == "-pagina":
+            novo = atual - self._linhas
+        else:
+            novo = atual + int(passo) if self._sel is not None else atual
+        novo = max(0, min(novo, len(self._itens) - 1))
+
+        self._sel = novo
+        self.see(novo)
+        self.lb.event_generate("<<ListboxSelect>>")
+        return "break"
+
+
+class OrdenacaoColunas:
+    """
+    Ordenação por clique no cabeçalho feita no modelo Python, não na tela.
+
+    chaves: {coluna: chave(registro)} devolvendo valores já tipados
+    (float, datetime, str em minúsculas...). Nada é lido de volta do Treeview.
+    Ao clicar, ajusta coluna/sentido (seta no título) e chama ao_ordenar(),
+    que ordena o modelo com ordenar() e redesenha as linhas numa passada.
+    """
+
+    SETAS = (" \u25b2", " \u25bc")  # ▲ crescente, ▼ decrescente
+
+    def __init__(self, tree: ttk.Treeview, chaves: dict[str, Callable[[Any], Any]], ao_ordenar: Callable[[], None]) -> None:
+        self.tree = tree
+        self.coluna: str | None = None
+        self.desc = False
+        self._chaves = chaves
+        self._ao_ordenar = ao_ordenar
+        self._titulos: dict[str, str] = {}
+        for col in chaves:
+            self._titulos[col] = str(tree.heading(col, "text"))
+            tree.heading(col, command=lambda c=col: self.clicar(c))
+
+    def clicar(self, col: str) -> None:
+        # alterna asc/desc ao clicar no mesmo cabeçalho
+        if self.coluna == col:
+            self.desc = not self.desc
+        else:
+            self.coluna = col
+            self.desc = False
+        self._atualizar_titulos()
+        self._ao_ordenar()
+
+    def desfazer(self) -> None:
+        """Volta à ordem original do modelo (sem seta nos títulos)."""
+        self.coluna = None
+        self.desc = False
+        self._atualizar_titulos()
+
+    def ordenar(self, itens: list[Any], registro: Callable[[Any], Any] | None = None) -> None:
+        """Ordena `itens` no lugar; registro(item) -> registro, se os itens forem iids."""
+        if self.coluna is None:
+            return
+        chave = self._chaves[self.coluna]
+        if registro is not None:
+            itens.sort(key=lambda item: chave(registro(item)), reverse=self.desc)
+        else:
+            itens.sort(key=chave, reverse=self.desc)
+
+    def _atualizar_titulos(self) -> None:
+        for col, titulo in self._titulos.items():
+            if col == self.coluna:
+                titulo += self.SETAS[1 if self.desc else 0]
+            self.tree.heading(col, text=titulo)
+
+
+class TabelaOrdenavel(OrdenacaoColunas):
+    """
+    Treeview comum com modelo: registros (iid -> registro) e ordem (lista de iids).
+
+    Ordenar = ordenar a lista de iids pelas chaves tipadas e reposicionar todas as
+    linhas com um único set_children. exibir(), se informado, substitui esse
+    último passo (ex.: quando a janela também filtra as linhas).
+    """
+
+    def __init__(
+        self,
+        tree: ttk.Treeview,
+        chaves: dict[str, Callable[[Any], Any]],
+        exibir: Callable[[], None] | None = None,
+    ) -> None:
+        super().__init__(tree, chaves, self.reordenar)
+        self.registros: dict[str, Any] = {}
+        self.ordem: list[str] = []
+        self._exibir = exibir
+
+    def inserir(self, registro: Any, valores: tuple) -> str:
+        iid = self.tree.insert("", "end", values=valores)
+        self.registros[iid] = registro
+        self.ordem.append(iid)
+        return iid
+
+    def atualizar(self, iid: str, registro: Any, valores: tuple) -> None:
+        """Troca o registro/valores de uma linha sem mexer na posição."""
+        self.registros[iid] = registro
+        self.tree.item(iid, values=valores)
+
+    def remover(self, iid: str) -> None:
+        self.tree.delete(iid)
+        del self.registros[iid]
+        self.ordem.remove(iid)
+
+    def limpar(self) -> None:
+        if self.registros:
+            self.tree.delete(*self.registros)
+        self.registros.clear()
+        self.ordem.clear()
+
+    def definir(self, pares: Any) -> None:
+        """Troca todas as linhas por (registro, valores) e reaplica a ordenação atual."""
+        self.limpar()
+        for registro, valores in pares:
+            self.inserir(registro, valores)
+        if self.coluna is not None:
+            self.reordenar()
+
+    def reordenar(self) -> None:
+        self.ordenar(self.ordem, self.registros.__getitem__)
+        if self._exibir is not None:
+            self._exibir()
+        else:
+            self.tree.set_children("", *self.ordem)
+
+
+class TabelaVirtual(ttk.Frame):
+    """
+    Treeview com rolagem virtual: o modelo (lista de registros) fica em memória
+    e só existem no Treeview as linhas que cabem na tela. Ao rolar, essas
+    mesmas linhas recebem novos valores (nada é apagado/reinserido).
+
+    formatar(registro) -> tupla de valores, chamada só para as linhas visíveis.
+    A seleção também fica no modelo (o registro, não a linha da tela): ao
+    rolar ou trocar o modelo, ela acompanha o registro e só aparece na linha
+    que o está exibindo; Cima/Baixo movem a seleção.
+    Cabeçalhos/colunas são configurados direto em .tree (heading/column);
+    depois, ordenar_por_colunas(chaves) liga a ordenação pelo cabeçalho.
+    """
+
+    ROLAGEM_RODA = 3
+
+    def __init__(
+        self,
+        parent: tk.Misc,
+        colunas: tuple[str, ...],
+        formatar: Callable[[Any], tuple],
+        height: int = 16,
+        **opcoes: Any,
+    ) -> None:
+        super().__init__(parent)
+        self._formatar = formatar
+        self._linhas_modelo: list[Any] = []
+        self._topo = 0
+        self._visiveis = max(1, int(height))
+        self._iids: list[str] = []
+        # registro selecionado e a última posição conhecida dele no modelo
+        self._selecionado: Any = None
+        self._indice_sel = -1
+        self.ordenacao: OrdenacaoColunas | None = None
+
+        quadro = ttk.Frame(self)
+        quadro.pack(fill="both", expand=True)
+
+        self.tree = ttk.Treeview(quadro, columns=colunas, show="headings", height=height, **opcoes)
+        self.tree.pack(side="left", fill="both", expand=True)
+
+        self.yscroll = ttk.Scrollbar(quadro, orient="vertical", command=self._on_scroll)
+        self.yscroll.pack(side="right", fill="y")
+
+        self.xscroll = ttk.Scrollbar(self, orient="horizontal", command=self.tree.xview)
+        self.xscroll.pack(side="bottom", fill="x")
+        self.tree.configure(xscrollcommand=self.xscroll.set)
+
+        tag = f"TabelaVirtual{id(self)}"
+        self.tree.bindtags((tag,) + self.tree.bindtags())
+        self.tree.bind_class(tag, "<Configure>", self._on_configure)
+        self.tree.bind_class(tag, "<MouseWheel>", self._on_roda)
+        self.tree.bind_class(tag, "<Button-4>", lambda e: self._rolar(-self.ROLAGEM_RODA))
+        self.tree.bind_class(tag, "<Button-5>", lambda e: self._rolar(self.ROLAGEM_RODA))
+        self.tree.bind_class(tag, "<Button-1>", self._on_clique)
+        self.tree.bind_class(tag, "<Up>", lambda e: self._mover_selecao(-1))
+        self.tree.bind_class(tag, "<Down>", lambda e: self._mover_selecao(1))
+        for seq, passo in (("<Prior>", "-pagina"), ("<Next>", "pagina"), ("<Home>", "inicio"), ("<End>", "fim")):
+            self.tree.bind_class(tag, seq, lambda e, p=passo: self._rolar_teclado(p))
+
+        self._render()
+
+    # ---------- modelo ----------
+    def definir_linhas(self, linhas: list[Any], manter_posicao: bool = False) -> None:
+        """Troca o modelo inteiro (reordenado no lugar, se houver coluna ativa); por padrão volta ao topo."""
+        self._linhas_modelo = linhas
+        if self.ordenacao is not None:
+            self.ordenacao.ordenar(linhas)
+        if not manter_posicao:
+            self._topo = 0
+        self._render()
+
+    def ordenar_por_colunas(self, chaves: dict[str, Callable[[Any], Any]]) -> OrdenacaoColunas:
+        """Clique no cabeçalho ordena o modelo inteiro (só as linhas visíveis são redesenhadas)."""
+        self.ordenacao = OrdenacaoColunas(self.tree, chaves, self._reordenar)
+        return self.ordenacao
+
+    def _reordenar(self) -> None:
+        self.ordenacao.ordenar(self._linhas_modelo)
+        self._topo = 0
+        self._render()
+
+    def linhas(self) -> list[Any]:
+        return self._linhas_modelo
+
+    def __len__(self) -> int:
+        return len(self._linhas_modelo)
+
+    def registro_da_linha(self, iid: str) -> Any:
+        """Registro do modelo exibido na linha `iid` do Treeview (ou None)."""
+        try:
+            i = self._topo + self._iids.index(iid)
+        except ValueError:
+            return None
+        return self._linhas_modelo[i] if i < len(self._linhas_modelo) else None
+
+    def registro_selecionado(self) -> Any:
+        """Registro selecionado (mesmo fora da tela), ou None."""
+        return self._selecionado if self._indice_selecionado() >= 0 else None
+
+    def _indice_selecionado(self) -> int:
+        """Posição do registro selecionado no modelo; -1 se ele saiu do modelo."""
+        if self._selecionado is None:
+            return -1
+        i = self._indice_sel
+        if not (0 <= i < len(self._linhas_modelo) and self._linhas_modelo[i] is self._selecionado):
+            # modelo trocado/reordenado: procura pelo próprio registro
+            i = next((j for j, r in enumerate(self._linhas_modelo) if r is self._selecionado), -1)
+            if i < 0:
+                self._selecionado = None
+        self._indice_sel = i
+        return i
+
+    def _selecionar_indice(self, i: int) -> None:
+        self._indice_sel = i
+        self._selecionado = self._linhas_modelo[i]
+
+    # ---------- desenho ----------
+    def _render(self) -> None:
+        total = len(self._linhas_modelo)
+        self._topo = max(0, min(self._topo, total - self._visiveis))
+        fatia = self._linhas_modelo[self._topo:self._topo + self._visiveis]
+
+        # reaproveita as linhas do Treeview; só cria/apaga a diferença
+        while len(self._iids) < len(fatia):
+            self._iids.append(self.tree.insert("", "end"))
+        if len(self._iids) > len(fatia):
+            self.tree.delete(*self._iids[len(fatia):])
+            del self._iids[len(fatia):]
+
+        for iid, registro in zip(self._iids, fatia):
+            self.tree.item(iid, values=self._formatar(registro))
+
+        # a seleção segue o registro: marca só a linha que o exibe agora
+        i = self._indice_selecionado() - self._topo
+        atual = self.tree.selection()
+        if 0 <= i < len(fatia):
+            if atual != (self._iids[i],):
+                self.tree.selection_set(self._iids[i])
+            self.tree.focus(self._iids[i])
+        elif atual:
+            self.tree.selection_remove(*atual)
+
+        if total:
+            self.yscroll.set(self._topo / total, min(1.0, (self._topo + self._visiveis) / total))
+        else:
+            self.yscroll.set(0.0, 1.0)
+
+    def _on_configure(self, event: Any = None) -> None:
+        try:
+            altura_linha = int(ttk.Style(self).lookup("Treeview", "rowheight") or 20)
+        except Exception:
+            altura_linha = 20
+        cabecalho = altura_linha + 6
+        if self._iids:
+            caixa = self.tree.bbox(self._iids[0])
+            if caixa:
+                cabecalho, altura_linha = int(caixa[1]), max(1, int(caixa[3]))
+
+        visiveis = max(1, (self.tree.winfo_height() - cabecalho) // altura_linha)
+        if visiveis != self._visiveis:
+            self._visiveis = visiveis
+            self._render()
+
+    def _rolar(self, delta: int) -> str:
+        self._topo += int(delta)
+        self._render()
+        return "break"
+
+    def _on_clique(self, event: Any) -> None:
+        if self.tree.identify_region(event.x, event.y) not in ("cell", "tree"):
+            return  # cabeçalho/separador: segue para a ordenação
+        iid = self.tree.identify_row(event.y)
+        if iid in self._iids:
+            i = self._topo + self._iids.index(iid)
+            if i < len(self._linhas_modelo):
+                self._selecionar_indice(i)
+
+    def _mover_selecao(self, passo: int) -> str:
+        total = len(self._linhas_modelo)
+        if not total:
+            return "break"
+        i = self._indice_selecionado()
+        i = self._topo if i < 0 else max(0, min(i + passo, total - 1))
+        self._selecionar_indice(i)
+        # rola só o necessário para a seleção ficar na tela
+        if i < self._topo:
+            self._topo = i
+        elif i >= self._topo + self._visiveis:
+            self._topo = i - self._visiveis + 1
+        self._render()
+        return "break"
+
+    def _on_roda(self, event: Any) -> str:
+        return self._rolar((-1 if event.delta > 0 else 1) * self.ROLAGEM_RODA)
+
+    def _rolar_teclado(self, passo: Any) -> str:
+        if passo == "inicio":
+            self._topo = 0
+        elif passo == "fim":
+            self._topo = len(self._linhas_modelo)
+        elif passo == "pagina":
+            self._topo += self._visiveis
+        elif passo == "-pagina":
+            self._topo -= self._visiveis
+        else:
+            self._topo += int(passo)
+        self._render()
+        return "break"
+
+    def _on_scroll(self, acao: str, valor: str, unidade: str | None = None) -> None:
+        if acao == "moveto":
+            self._topo = int(float(valor) * len(self._linhas_modelo))
+        elif acao == "scroll":
+            self._topo += int(valor) * (self._visiveis if unidade == "pages" else 1)
+        self._render()
+
+
+class Carregador:
+    """
+    Carrega dados de uma janela numa thread, sem travar a interface e sem
+    janela de progresso (para leituras do histórico, painéis e relatórios).
+
+    Só o pedido mais recente vale: carregar() cancela o anterior (a função
+    recebe a Tarefa e, ao chamar tarefa.progresso, é interrompida) e um
+    resultado atrasado de um pedido antigo é descartado.
+    ao_mudar_estado(True/False) permite mostrar "Carregando..." na janela.
+    """
+
+    def __init__(self, widget: tk.Misc, ao_mudar_estado: Callable[[bool], None] | None = None) -> None:
+        self._widget = widget
+        self._ao_mudar_estado = ao_mudar_estado
+        self._fila: queue.Queue = queue.Queue()
+        self._geracao = 0
+        self._tarefa: Tarefa | None = None
+        self._callbacks: tuple[Callable[[Any], None], Callable[[BaseException], None] | None] | None = None
+        self._poll_ativo = False
+        widget.bind("<Destroy>", self._on_destroy, add="+")
+
+    @property
+    def carregando(self) -> bool:
+        return self._tarefa is not None
+
+    def carregar(
+        self,
+        fn: Callable[[Tarefa], Any],
+        ao_concluir: Callable[[Any], None],
+        ao_falhar: Callable[[BaseException], None] | None = None,
+    ) -> Tarefa:
+        self.cancelar(notificar=False)
+
+        self._geracao += 1
+        geracao = self._geracao
+        tarefa = Tarefa()
+        self._tarefa = tarefa
+        self._callbacks = (ao_concluir, ao_falhar)
+
+        def _worker():
+            try:
+                resultado = fn(tarefa)
+            except TarefaCancelada:
+                return
+            except BaseException as e:  # noqa: BLE001 - repassado para a UI
+                self._fila.put((geracao, "erro", e))
+            else:
+                if not tarefa.cancelada:
+                    self._fila.put((geracao, "ok", resultado))
+
+        self._estado(True)
+        threading.Thread(target=_worker, name="carregador", daemon=True).start()
+        if not self._poll_ativo:
+            self._poll_ativo = True
+            self._widget.after(INTERVALO_POLL_MS, self._poll)
+        return tarefa
+
+    def cancelar(self, notificar: bool = True) -> None:
+        if self._tarefa is not None:
+            self._tarefa.cancelar()
+            self._tarefa = None
+            self._callbacks = None
+            if notificar:
+                self._estado(False)
+
+    def _estado(self, carregando: bool) -> None:
+        if self._ao_mudar_estado is not None:
+            self._ao_mudar_estado(carregando)
+
+    def _on_destroy(self, event: Any) -> None:
+        if event.widget is self._widget:
+            self.cancelar(notificar=False)
+
+    def _poll(self) -> None:
+        try:
+            while True:
+                geracao, tipo, valor = self._fila.get_nowait()
+                if geracao != self._geracao or self._callbacks is None:
+                    continue  # pedido antigo: descarta
+                ao_concluir, ao_falhar = self._callbacks
+                self._tarefa = None
+                self._callbacks = None
+                self._estado(False)
+                if tipo == "ok":
+                    ao_concluir(valor)
+                elif ao_falhar is not None:
+                    ao_falhar(valor)
+                else:
+                    messagebox.showerror("Erro", f"Falha ao carregar.\n\n{valor}", parent=self._widget)
+        except queue.Empty:
+            pass
+
+        if self._tarefa is None:
+            self._poll_ativo = False
+            return
+        try:
+            self._widget.after(INTERVALO_POLL_MS, self._poll)
+        except Exception:
+            self._poll_ativo = False
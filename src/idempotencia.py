@@ -0,0 +1,183 @@
+"""
+Chaves de idempotência para os POSTs de movimentação da API.
+
+Tablet com Wi-Fi ruim reenvia o mesmo POST; com o header Idempotency-Key,
+o reenvio devolve a resposta original em vez de lançar o movimento de novo.
+
+As chaves recentes ficam num LRU em memória (limitado a MAX_CHAVES) e num
+log idempotencia.jsonl (uma linha por chave, compactado de vez em quando),
+para sobreviver a um reinício da API. A chave é anotada no log dentro da
+própria gravação (assinante do core, ainda sob a trava de gravação): se a
+API cair entre o movimento e a resposta, o reenvio não lança de novo.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Tuple
+
+from .config import ARQUIVO_IDEMPOTENCIA
+from .estoque_core import assinar_alteracoes
+
+MAX_CHAVES = 1000
+VALIDADE = timedelta(hours=24)
+
+# chave -> {"ts", "rota", "hash", "status", "corpo"} (mais recentes no fim);
+# status None = movimento gravado, mas a resposta não chegou a ser anotada
+_chaves: "OrderedDict[str, Dict[str, Any]] | None" = None
+# linhas no log; passando de 2 * MAX_CHAVES o log é reescrito só com _chaves
+_linhas = 0
+
+# Trava curta: só protege a tabela, o log e _em_andamento (fn() roda fora
+# dela, então requisições com chaves diferentes não esperam umas pelas outras).
+_trava = threading.Lock()
+
+# chave -> trava segura pela requisição que está executando com essa chave.
+# Um reenvio que chega enquanto a original ainda está gravando espera nela
+# e recebe a mesma resposta.
+_em_andamento: Dict[str, threading.Lock] = {}
+
+# requisição com chave em execução nesta thread: {"chave", "item", "anotada"}
+_local = threading.local()
+
+RESPOSTA_PERDIDA = {"ok": True, "detail": "Movimento já gravado; a resposta original se perdeu."}
+
+
+class ChaveReutilizada(Exception):
+    """A mesma chave foi enviada com outra rota ou outro corpo."""
+
+
+def hash_corpo(corpo: Any) -> str:
+    bruto = json.dumps(corpo, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(bruto.encode("utf-8")).hexdigest()
+
+
+def _expirada(item: Dict[str, Any], agora: datetime) -> bool:
+    try:
+        return agora - datetime.fromisoformat(str(item.get("ts", ""))) > VALIDADE
+    except Exception:
+        return True
+
+
+def _carregar() -> "OrderedDict[str, Dict[str, Any]]":
+    global _chaves, _linhas
+    if _chaves is None:
+        _chaves = OrderedDict()
+        _linhas = 0
+        agora = datetime.now()
+        try:
+            with ARQUIVO_IDEMPOTENCIA.open("r", encoding="utf-8") as f:
+                for linha in f:
+                    _linhas += 1
+                    try:
+                        item = json.loads(linha)
+                        chave = str(item.pop("chave"))
+                    except Exception:
+                        continue  # linha cortada por uma queda no meio da escrita
+                    _chaves.pop(chave, None)
+                    if not _expirada(item, agora):
+                        _chaves[chave] = item
+        except Exception:
+            pass
+        while len(_chaves) > MAX_CHAVES:
+            _chaves.popitem(last=False)
+    return _chaves
+
+
+def _anotar(chave: str, item: Dict[str, Any]) -> None:
+    """Guarda a chave na tabela e acrescenta uma linha no log (com _trava)."""
+    global _linhas
+    chaves = _carregar()
+    chaves[chave] = item
+    chaves.move_to_end(chave)
+    while len(chaves) > MAX_CHAVES:
+        chaves.popitem(last=False)
+    try:
+        if _linhas >= 2 * MAX_CHAVES:
+            tmp = ARQUIVO_IDEMPOTENCIA.with_suffix(".tmp")
+            with tmp.open("w", encoding="utf-8") as f:
+                for c, i in chaves.items():
+                    f.write(json.dumps({"chave": c, **i}, ensure_ascii=False) + "\n")
+            os.replace(tmp, ARQUIVO_IDEMPOTENCIA)
+            _linhas = len(chaves)
+        else:
+            with ARQUIVO_IDEMPOTENCIA.open("a", encoding="utf-8") as f:
+                f.write(json.dumps({"chave": chave, **item}, ensure_ascii=False) + "\n")
+            _linhas += 1
+    except Exception:
+        # Tabela de chaves nunca pode quebrar a movimentação
+        pass
+
+
+def _ao_gravar(evento: Dict[str, Any]) -> None:
+    """Assinante do core: anota a chave da requisição desta thread junto com a gravação."""
+    pendente = getattr(_local, "pendente", None)
+    if pendente is None or pendente["anotada"]:
+        return
+    with _trava:
+        _anotar(pendente["chave"], dict(pendente["item"], status=None, corpo=None))
+    pendente["anotada"] = True
+
+
+assinar_alteracoes(_ao_gravar)
+
+
+def executar_idempotente(
+    chave: str,
+    rota: str,
+    corpo: Any,
+    fn: Callable[[], Tuple[int, Any]],
+) -> Tuple[int, Any, bool]:
+    """
+    Executa fn() -> (status, corpo_resposta) uma vez por chave.
+    Retorna (status, corpo_resposta, repetida); repetida=True quando a resposta
+    veio da tabela. Mesma chave com rota/corpo diferentes -> ChaveReutilizada.
+    """
+    h = hash_corpo(corpo)
+    while True:
+        with _trava:
+            chaves = _carregar()
+            agora = datetime.now()
+
+            item = chaves.get(chave)
+            if item is not None and _expirada(item, agora):
+                del chaves[chave]
+                item = None
+
+            if item is not None:
+                if item.get("rota") != rota or item.get("hash") != h:
+                    raise ChaveReutilizada("Idempotency-Key já usada em outra requisição.")
+                chaves.move_to_end(chave)
+                if item.get("status") is None:
+                    return 200, RESPOSTA_PERDIDA, True
+                return int(item["status"]), item["corpo"], True
+
+            trava_chave = _em_andamento.get(chave)
+            if trava_chave is None:
+                trava_chave = threading.Lock()
+                trava_chave.acquire()
+                _em_andamento[chave] = trava_chave
+                break
+
+        # a original ainda está executando: espera e consulta a tabela de novo
+        # (se ela falhou antes de gravar, esta requisição executa no lugar dela)
+        with trava_chave:
+            pass
+
+    item = {"ts": agora.isoformat(timespec="seconds"), "rota": rota, "hash": h}
+    _local.pendente = {"chave": chave, "item": item, "anotada": False}
+    try:
+        status, resposta = fn()
+
+        with _trava:
+            _anotar(chave, dict(item, status=int(status), corpo=resposta))
+        return status, resposta, False
+    finally:
+        _local.pendente = None
+        with _trava:
+            del _em_andamento[chave]
+        trava_chave.release()
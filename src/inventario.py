@@ -0,0 +1,285 @@
+"""
+Sessões de contagem de inventário (persistidas em disco).
+
+Uma contagem na Vila leva horas e passa por vários voluntários, então os
+valores contados não podem ficar só na memória da janela.
+
+Arquivos em %APPDATA%\\EstoqueONG\\inventario:
+    sessao_<id>.json   -> cabeçalho + retrato do estoque no início ("base")
+    sessao_<id>.jsonl  -> uma linha por contagem registrada (escritas pequenas,
+                          só acrescentam); ao retomar, a última linha de cada
+                          produto vale.
+
+Ao encerrar, os ajustes são calculados contra a BASE (contado - base) e
+gravados com um único movimentar_lote; movimentos feitos durante a contagem
+continuam valendo.
+
+Vários aparelhos podem contar a mesma sessão pela API: cada envio é gravado
+sob a trava, com modo "substituir" (o último envio do item vale) ou "somar"
+(prateleiras diferentes do mesmo item, o valor enviado soma ao já contado).
+"""
+from __future__ import annotations
+
+import json
+import re
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict
+
+from .config import INVENTARIO_DIR
+from .estoque_core import listar_produtos, movimentar_lote, notificar_alteracao
+
+MOTIVO_CONTAGEM = "Contagem"
+MODOS = ("substituir", "somar")
+
+# ids gerados por iniciar_sessao (%Y%m%d-%H%M%S-%f); o id vira nome de arquivo
+_FORMATO_ID = re.compile(r"\d{8}-\d{6}-\d{6}")
+
+# Uma sessão aberta por vez; a trava protege as gravações (API em várias threads)
+_trava = threading.RLock()
+
+# sessao_id -> (bytes já lidos do arquivo de contagens, contagens)
+# O arquivo só cresce: cada leitura processa apenas o que foi acrescentado
+# (inclusive por outro processo, ex.: a interface e a API ao mesmo tempo).
+_lidas: Dict[str, tuple[int, Dict[int, dict]]] = {}
+
+
+class SessaoNaoEncontrada(Exception):
+    pass
+
+
+class SessaoEncerrada(Exception):
+    pass
+
+
+def _validar_id(sessao_id: str) -> str:
+    """Recusa ids fora do formato (ex.: "../x" vindo da URL da API)."""
+    if not isinstance(sessao_id, str) or not _FORMATO_ID.fullmatch(sessao_id):
+        raise SessaoNaoEncontrada(f"Sessão {sessao_id!r} não encontrada.")
+    return sessao_id
+
+
+def _caminho_cabecalho(sessao_id: str) -> Path:
+    return INVENTARIO_DIR / f"sessao_{_validar_id(sessao_id)}.json"
+
+
+def _caminho_contagens(sessao_id: str) -> Path:
+    return INVENTARIO_DIR / f"sessao_{_validar_id(sessao_id)}.jsonl"
+
+
+def _ler_cabecalho(sessao_id: str) -> dict:
+    try:
+        with _caminho_cabecalho(sessao_id).open("r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise SessaoNaoEncontrada(f"Sessão {sessao_id} não encontrada.")
+
+
+def _gravar_cabecalho(sessao: dict) -> None:
+    cab = {k: v for k, v in sessao.items() if k != "contagens"}
+    INVENTARIO_DIR.mkdir(parents=True, exist_ok=True)
+    with _caminho_cabecalho(sessao["id"]).open("w", encoding="utf-8") as f:
+        json.dump(cab, f, ensure_ascii=False, indent=2)
+
+
+def _ler_contagens(sessao_id: str) -> Dict[int, dict]:
+    caminho = _caminho_contagens(sessao_id)
+    lidos, contagens = _lidas.get(sessao_id, (0, {}))
+    try:
+        tamanho = caminho.stat().st_size
+    except FileNotFoundError:
+        tamanho = 0
+    if tamanho < lidos:
+        lidos, contagens = 0, {}
+
+    if tamanho > lidos:
+        with caminho.open("rb") as f:
+            f.seek(lidos)
+            bloco = f.read()
+        fim = bloco.rfind(b"\n") + 1  # só linhas completas
+        for linha in bloco[:fim].splitlines():
+            try:
+                c = json.loads(linha)
+                pid = int(c["produto_id"])
+            except Exception:
+                continue  # linha cortada (queda de energia no meio da escrita)
+            if c.get("contado") is None:
+                contagens.pop(pid, None)
+            else:
+                contagens[pid] = c
+        lidos += fim
+
+    _lidas[sessao_id] = (lidos, contagens)
+    return contagens
+
+
+def carregar_sessao(sessao_id: str) -> dict:
+    """Cabeçalho + base + contagens atuais ({produto_id: {"contado", "ts", ...}})."""
+    with _trava:
+        sessao = _ler_cabecalho(sessao_id)
+        sessao["contagens"] = dict(_ler_contagens(sessao_id))
+        return sessao
+
+
+def sessao_aberta() -> dict | None:
+    """A sessão em andamento (a mais recente ainda aberta), se houver."""
+    with _trava:
+        for caminho in sorted(INVENTARIO_DIR.glob("sessao_*.json"), reverse=True):
+            try:
+                with caminho.open("r", encoding="utf-8") as f:
+                    cab = json.load(f)
+            except Exception:
+                continue
+            if cab.get("status") == "aberta":
+                return carregar_sessao(cab["id"])
+        return None
+
+
+def iniciar_sessao() -> dict:
+    """Abre uma sessão nova com o retrato atual do estoque (ou devolve a que já está aberta)."""
+    with _trava:
+        atual = sessao_aberta()
+        if atual is not None:
+            return atual
+
+        agora = datetime.now()
+        sessao = {
+            "id": agora.strftime("%Y%m%d-%H%M%S-%f"),
+            "inicio": agora.isoformat(timespec="seconds"),
+            "status": "aberta",
+            # chaves str: JSON não tem chave int
+            "base": {str(int(p.get("id", 0))): float(p.get("estoque_atual", 0.0)) for p in listar_produtos()},
+        }
+        _gravar_cabecalho(sessao)
+        sessao["contagens"] = {}
+        return sessao
+
+
+def registrar_contagens(
+    sessao_id: str,
+    contagens: Dict[int, float | None],
+    origem: str | None = None,
+    modo: str = "substituir",
+) -> Dict[int, float | None]:
+    """
+    Registra vários valores contados de uma vez (None = apaga a contagem do item).
+    modo "somar": o valor enviado soma ao já contado (pode ser negativo para corrigir).
+    Uma única escrita pequena no fim do arquivo da sessão; tudo ou nada.
+    Retorna o contado resultante de cada item.
+    """
+    if modo not in MODOS:
+        raise ValueError(f"Modo inválido: {modo!r}.")
+    if not contagens:
+        return {}
+    with _trava:
+        cab = _ler_cabecalho(sessao_id)
+        if cab.get("status") != "aberta":
+            raise SessaoEncerrada("Esta contagem já foi encerrada.")
+
+        base = cab.get("base", {})
+        ids_atuais = None
+        atuais = _ler_contagens(sessao_id)
+        ts = datetime.now().isoformat(timespec="seconds")
+        resultado: Dict[int, float | None] = {}
+        linhas = []
+        for pid, contado in contagens.items():
+            pid = int(pid)
+            if str(pid) not in base:
+                # produto cadastrado depois do início da sessão
+                if ids_atuais is None:
+                    ids_atuais = {int(p.get("id", 0)) for p in listar_produtos()}
+                if pid not in ids_atuais:
+                    raise ValueError(f"Produto com id {pid} não encontrado.")
+
+            if contado is not None:
+                contado = float(contado)
+                if modo == "somar":
+                    if pid in resultado:
+                        anterior = resultado[pid]
+                    else:
+                        anterior = atuais[pid]["contado"] if pid in atuais else None
+                    contado += float(anterior or 0.0)
+                if contado < 0:
+                    raise ValueError(f"Contado inválido (negativo) para o produto {pid}.")
+            resultado[pid] = contado
+
+            c = {"ts": ts, "produto_id": pid, "contado": contado}
+            if origem:
+                c["origem"] = str(origem)
+            linhas.append(json.dumps(c, ensure_ascii=False) + "\n")
+
+        with _caminho_contagens(sessao_id).open("a", encoding="utf-8") as f:
+            f.write("".join(linhas))
+        contados = len(_ler_contagens(sessao_id))
+
+    notificar_alteracao({"tipo": "inventario", "sessao_id": sessao_id, "contagens": resultado, "contados": contados})
+    return resultado
+
+
+def ajustes_da_sessao(sessao: dict) -> list[dict]:
+    """Itens do lote de ajuste: delta = contado - base (retrato do início da sessão)."""
+    base = sessao.get("base", {})
+    atuais = None
+    itens = []
+    for pid, c in sorted(sessao.get("contagens", {}).items()):
+        b = base.get(str(pid))
+        if b is None:
+            # produto cadastrado depois do início: a base é o estoque de agora
+            if atuais is None:
+                atuais = {int(p.get("id", 0)): float(p.get("estoque_atual", 0.0)) for p in listar_produtos()}
+            b = atuais.get(int(pid), 0.0)
+        delta = float(c["contado"]) - float(b)
+        if abs(delta) < 1e-9:
+            continue
+        itens.append({"produto_id": int(pid), "delta": delta, "motivo": MOTIVO_CONTAGEM})
+    return itens
+
+
+def progresso_sessao(sessao: dict) -> dict:
+    """Resumo para acompanhar a contagem: itens contados e ajustes que seriam gravados."""
+    return {
+        "id": sessao["id"],
+        "inicio": sessao.get("inicio"),
+        "status": sessao.get("status"),
+        "total_itens": len(sessao.get("base", {})),
+        "contados": len(sessao.get("contagens", {})),
+        "ajustes_pendentes": len(ajustes_da_sessao(sessao)),
+    }
+
+
+def _fechar(sessao: dict, status: str) -> None:
+    sessao["status"] = status
+    sessao["fim"] = datetime.now().isoformat(timespec="seconds")
+    _gravar_cabecalho(sessao)
+    notificar_alteracao({"tipo": "inventario", "sessao_id": sessao["id"], "status": status})
+
+
+def encerrar_sessao(sessao_id: str) -> dict:
+    """
+    Aplica os ajustes da sessão num único lote (tudo ou nada) e a encerra.
+    Retorna {"aplicado", "ajustes", "resultados"}; se o lote for recusado
+    (ex.: estoque ficaria negativo), a sessão continua aberta.
+    """
+    with _trava:
+        sessao = carregar_sessao(sessao_id)
+        if sessao.get("status") != "aberta":
+            raise SessaoEncerrada("Esta contagem já foi encerrada.")
+
+        itens = ajustes_da_sessao(sessao)
+        if not itens:
+            _fechar(sessao, "encerrada")
+            return {"aplicado": True, "ajustes": 0, "resultados": []}
+
+        resultado = movimentar_lote(itens)
+        if resultado["aplicado"]:
+            _fechar(sessao, "encerrada")
+        return {"aplicado": resultado["aplicado"], "ajustes": len(itens), "resultados": resultado["resultados"]}
+
+
+def descartar_sessao(sessao_id: str) -> None:
+    """Encerra a sessão sem aplicar nada (os arquivos ficam como registro)."""
+    with _trava:
+        sessao = _ler_cabecalho(sessao_id)
+        if sessao.get("status") == "aberta":
+            _fechar(sessao, "descartada")
@@ -1,5 +1,12 @@
 # src/main.py
-from src.gui import main
+import sys
 
 if __name__ == "__main__":
+    # Modo headless (Agendador de Tarefas): EstoqueONG.exe --relatorios
+    # Não importa a interface: o Tk pode nem ter tela disponível nessa sessão.
+    if "--relatorios" in sys.argv[1:]:
+        from src.relatorios import main as gerar_relatorios
+        sys.exit(gerar_relatorios())
+
+    from src.gui import main
     main()
@@ -0,0 +1,185 @@
+"""
+Relatórios automáticos por período (sem abrir a interface).
+
+Pensado para o Agendador de Tarefas do Windows:
+    EstoqueONG.exe --relatorios
+    python -m src.relatorios
+
+A agenda fica em config_usuario.json (chave "relatorios_agendados"):
+    pasta       -> onde salvar os arquivos
+    frequencia  -> "diaria", "semanal" ou "mensal"
+    formatos    -> ["csv", "xlsx"]
+    ultimo_ate  -> último dia já coberto (preenchido automaticamente)
+"""
+from __future__ import annotations
+
+import csv
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+from .estoque_core import exportar_xlsx_abas, get_agenda_relatorios, resumir_periodos, set_agenda_relatorios
+
+FREQUENCIAS = ("diaria", "semanal", "mensal")
+FORMATOS = ("csv", "xlsx")
+
+# Se o computador ficou muito tempo desligado, gera só os períodos mais recentes
+MAX_PERIODOS_PENDENTES = 31
+
+
+def _periodo_que_contem(freq: str, dia: date) -> tuple[date, date]:
+    if freq == "diaria":
+        return dia, dia
+    if freq == "semanal":
+        ini = dia - timedelta(days=dia.weekday())  # segunda-feira
+        return ini, ini + timedelta(days=6)
+    # mensal
+    ini = dia.replace(day=1)
+    prox = (ini + timedelta(days=32)).replace(day=1)
+    return ini, prox - timedelta(days=1)
+
+
+def periodos_pendentes(freq: str, ultimo_ate: date | None, hoje: date) -> list[tuple[date, date]]:
+    """
+    Períodos completos (já encerrados antes de hoje) ainda não gerados.
+    Sem execução anterior, gera apenas o último período completo.
+    """
+    if freq not in FREQUENCIAS:
+        raise ValueError(f"Frequência inválida: {freq!r}.")
+
+    ini_atual, _ = _periodo_que_contem(freq, hoje)
+    ultimo_completo = _periodo_que_contem(freq, ini_atual - timedelta(days=1))
+
+    if ultimo_ate is None:
+        return [ultimo_completo]
+
+    periodos: list[tuple[date, date]] = []
+    d1, d2 = ultimo_completo
+    while d2 > ultimo_ate and len(periodos) < MAX_PERIODOS_PENDENTES:
+        periodos.append((d1, d2))
+        d1, d2 = _periodo_que_contem(freq, d1 - timedelta(days=1))
+
+    periodos.reverse()
+    return periodos
+
+
+def _nome_base(resumo: dict) -> str:
+    return f"relatorio_{resumo['de']}_a_{resumo['ate']}".replace("-", "")
+
+
+def escrever_relatorio_csv(pasta: Path, resumo: dict) -> list[Path]:
+    """Um CSV por tipo de relatório (totais, top movimentados, abaixo do mínimo)."""
+    base = _nome_base(resumo)
+    gerados: list[Path] = []
+
+    caminho = pasta / f"{base}_totais.csv"
+    with caminho.open("w", encoding="utf-8", newline="") as f:
+        w = csv.writer(f, delimiter=";")
+        w.writerow(["item", "entradas", "saidas", "saldo", "volume"])
+        for r in resumo["linhas"]:
+            w.writerow([r["nome"], r["entradas"], r["saidas"], r["saldo"], r["volume"]])
+    gerados.append(caminho)
+
+    caminho = pasta / f"{base}_top.csv"
+    with caminho.open("w", encoding="utf-8", newline="") as f:
+        w = csv.writer(f, delimiter=";")
+        w.writerow(["item", "volume"])
+        for r in resumo["top"]:
+            w.writerow([r["nome"], r["volume"]])
+    gerados.append(caminho)
+
+    caminho = pasta / f"{base}_abaixo_minimo.csv"
+    with caminho.open("w", encoding="utf-8", newline="") as f:
+        w = csv.writer(f, delimiter=";")
+        w.writerow(["id", "item", "unidade", "estoque_atual", "estoque_minimo"])
+        for p in resumo["abaixo_minimo"]:
+            w.writerow([p.get("id", ""), p.get("nome", ""), p.get("unidade", ""),
+                        p.get("estoque_atual", 0), p.get("estoque_minimo", 0)])
+    gerados.append(caminho)
+
+    return gerados
+
+
+def escrever_relatorio_xlsx(pasta: Path, resumo: dict) -> Path:
+    """Uma planilha com uma aba por tipo de relatório."""
+    abas = [
+        {
+            "titulo": "Totais",
+            "cabecalho": ["Item", "Entradas", "Saídas", "Saldo", "Volume"],
+            "linhas": ([r["nome"], r["entradas"], r["saidas"], r["saldo"], r["volume"]] for r in resumo["linhas"]),
+            "largura_max": 45,
+        },
+        {
+            "titulo": "Mais movimentados",
+            "cabecalho": ["Item", "Volume"],
+            "linhas": ([r["nome"], r["volume"]] for r in resumo["top"]),
+            "largura_max": 45,
+        },
+        {
+            "titulo": "Abaixo do mínimo",
+            "cabecalho": ["ID", "Item", "Unidade", "Atual", "Mínimo"],
+            "linhas": (
+                [p.get("id", ""), p.get("nome", ""), p.get("unidade", ""),
+                 p.get("estoque_atual", 0), p.get("estoque_minimo", 0)]
+                for p in resumo["abaixo_minimo"]
+            ),
+            "centralizar": (0, 2),
+            "largura_max": 45,
+        },
+    ]
+    return exportar_xlsx_abas(pasta / f"{_nome_base(resumo)}.xlsx", abas)
+
+
+def executar_relatorios_agendados(hoje: date | None = None) -> list[Path]:
+    """
+    Gera os relatórios pendentes da agenda configurada e retorna os arquivos criados.
+    Todos os períodos pendentes são calculados numa única leitura do histórico.
+    """
+    agenda = get_agenda_relatorios()
+    pasta_txt = str(agenda.get("pasta", "")).strip()
+    if not pasta_txt:
+        return []
+
+    freq = str(agenda.get("frequencia", "mensal")).strip() or "mensal"
+    formatos = [f for f in agenda.get("formatos", list(FORMATOS)) if f in FORMATOS]
+
+    ultimo_ate = None
+    try:
+        if agenda.get("ultimo_ate"):
+            ultimo_ate = date.fromisoformat(str(agenda["ultimo_ate"]))
+    except Exception:
+        ultimo_ate = None
+
+    periodos = periodos_pendentes(freq, ultimo_ate, hoje or date.today())
+    if not periodos:
+        return []
+
+    pasta = Path(pasta_txt)
+    pasta.mkdir(parents=True, exist_ok=True)
+
+    gerados: list[Path] = []
+    for resumo in resumir_periodos(periodos):
+        if "csv" in formatos:
+            gerados.extend(escrever_relatorio_csv(pasta, resumo))
+        if "xlsx" in formatos:
+            gerados.append(escrever_relatorio_xlsx(pasta, resumo))
+
+    agenda["ultimo_ate"] = periodos[-1][1].isoformat()
+    set_agenda_relatorios(agenda)
+    return gerados
+
+
+def main() -> int:
+    try:
+        gerados = executar_relatorios_agendados()
+    except Exception as e:
+        print(f"Falha ao gerar relatórios: {e}", file=sys.stderr)
+        return 1
+
+    for caminho in gerados:
+        print(caminho)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
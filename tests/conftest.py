@@ -0,0 +1,8 @@
+"""
+Os dados dos testes vão para uma pasta temporária: APPDATA precisa ser
+definido antes de importar src (config.py resolve as pastas na importação).
+"""
+import os
+import tempfile
+
+os.environ["APPDATA"] = tempfile.mkdtemp(prefix="estoqueong_testes_")
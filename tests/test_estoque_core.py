@@ -0,0 +1,65 @@
+"""
+Avisos do core aos assinantes (Catalogo, SSE): saem ainda sob a trava de
+gravação, então chegam na ordem das gravações mesmo com várias threads.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from src import estoque_core
+from src.estoque_core import assinar_alteracoes, criar_produto, move_stock_by_id, movimentar_lote
+
+GRAVACOES = 100
+
+
+def test_avisos_sob_a_trava_e_em_ordem():
+    p = criar_produto("Arroz avisos", "kg", 0)
+    vistos: list[float] = []
+    fora_da_trava: list[str] = []
+
+    def ouvir(evento):
+        if not estoque_core._trava_gravacao._is_owned():
+            fora_da_trava.append(evento.get("tipo"))
+        if evento.get("tipo") == "movimento" and evento["produto"]["id"] == p["id"]:
+            vistos.append(float(evento["produto"]["estoque_atual"]))
+
+    cancelar = assinar_alteracoes(ouvir)
+    try:
+        criar_produto("Feijão avisos", "kg", 0)
+
+        def gravar(i: int) -> None:
+            if i % 2:
+                move_stock_by_id(p["id"], 1)
+            else:
+                movimentar_lote([{"produto_id": p["id"], "delta": 1}])
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(gravar, range(GRAVACOES)))
+    finally:
+        cancelar()
+
+    assert fora_da_trava == []
+    # só entradas: cada retrato tem de ser maior que o anterior
+    assert vistos == [float(i) for i in range(1, GRAVACOES + 1)]
+
+
+def test_restaurar_backup_externo_sob_a_trava(tmp_path):
+    estoque_core.set_pasta_backup_externo(str(tmp_path))
+    try:
+        p = criar_produto("Arroz restauração", "kg", 0)
+        move_stock_by_id(p["id"], 5)  # cada gravação atualiza a cópia externa
+        estoque_core.set_pasta_backup_externo("")
+        move_stock_by_id(p["id"], 3)  # só no local
+        estoque_core.set_pasta_backup_externo(str(tmp_path))
+
+        avisos: list[bool] = []
+        cancelar = assinar_alteracoes(lambda e: avisos.append(estoque_core._trava_gravacao._is_owned()))
+        try:
+            assert estoque_core.restaurar_backup_externo() is True
+        finally:
+            cancelar()
+    finally:
+        estoque_core.set_pasta_backup_externo("")
+
+    assert avisos == [True]
+    atual = {int(x["id"]): x for x in estoque_core.listar_produtos()}
+    assert atual[p["id"]]["estoque_atual"] == 5.0
+    assert not list(estoque_core.ARQUIVO_DADOS.parent.glob("*.tmp"))
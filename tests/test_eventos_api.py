@@ -0,0 +1,55 @@
+"""
+/api/eventos: gravações de outro processo (a interface desktop) também
+chegam aos clientes web, como "recarregar".
+"""
+import json
+
+import pytest
+
+from src import api
+from src.config import ARQUIVO_DADOS
+from src.estoque_core import criar_produto, listar_produtos, move_stock_by_id
+
+
+@pytest.fixture
+def publicados(monkeypatch):
+    eventos = []
+    monkeypatch.setattr(api, "_publicar_sse", eventos.append)
+    produto = criar_produto(f"Arroz eventos {len(listar_produtos()) + 1}", "kg", 0)
+    api._verificar_gravacao_externa()  # parte de uma versão conhecida
+    eventos.clear()
+    return eventos, produto
+
+
+def _gravar_como_outro_processo(produto_id: int, estoque: float) -> None:
+    produtos = listar_produtos()
+    for p in produtos:
+        if p["id"] == produto_id:
+            p["estoque_atual"] = estoque
+    ARQUIVO_DADOS.write_text(json.dumps(produtos, ensure_ascii=False, indent=1), encoding="utf-8")
+
+
+def test_gravacao_externa_vira_recarregar(publicados):
+    eventos, produto = publicados
+    _gravar_como_outro_processo(produto["id"], 42)
+
+    assert api._verificar_gravacao_externa() is True
+    assert eventos == [{"tipo": "recarregar"}]
+    assert api._verificar_gravacao_externa() is False  # uma vez só
+
+
+def test_gravacao_local_nao_vira_recarregar(publicados):
+    eventos, produto = publicados
+    move_stock_by_id(produto["id"], 1)
+
+    assert api._verificar_gravacao_externa() is False
+    assert [e["tipo"] for e in eventos] == ["movimento"]
+
+
+def test_gravacao_externa_logo_depois_da_local(publicados):
+    eventos, produto = publicados
+    move_stock_by_id(produto["id"], 1)
+    _gravar_como_outro_processo(produto["id"], 7)
+
+    assert api._verificar_gravacao_externa() is True
+    assert [e["tipo"] for e in eventos] == ["movimento", "recarregar"]
@@ -0,0 +1,59 @@
+"""
+Paginação do histórico por cursor (/api/historico): o cursor continua valendo
+com acréscimos no fim e expira quando o arquivo é reescrito.
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+from src import estoque_core
+from src.api import app
+from src.estoque_core import criar_produto, move_stock_by_id
+
+
+@pytest.fixture
+def cliente():
+    return TestClient(app)
+
+
+@pytest.fixture
+def cursor(cliente):
+    p = criar_produto(f"Arroz cursor {len(estoque_core.listar_produtos()) + 1}", "kg", 0)
+    for _ in range(5):
+        move_stock_by_id(p["id"], 1)
+    r = cliente.get("/api/historico", params={"limite": 2})
+    return r.headers["x-proximo-cursor"]
+
+
+def test_cursor_vale_com_acrescimos(cliente, cursor):
+    move_stock_by_id(estoque_core.listar_produtos()[0]["id"], 1)
+    assert cliente.get("/api/historico", params={"limite": 2, "cursor": cursor}).status_code == 200
+
+
+def test_cursor_expira_ao_importar_movimentos(cliente, cursor, tmp_path):
+    nome = estoque_core.listar_produtos()[-1]["nome"]
+    csv = tmp_path / "antigos.csv"
+    csv.write_text(f"data;item;quantidade\n01/01/2020;{nome};1\n", encoding="utf-8")
+    assert estoque_core.importar_movimentos(csv)["aplicado"]
+
+    r = cliente.get("/api/historico", params={"limite": 2, "cursor": cursor})
+    assert r.status_code == 400
+
+
+def test_cursor_expira_ao_restaurar_backup(cliente, tmp_path):
+    estoque_core.set_pasta_backup_externo(str(tmp_path))
+    try:
+        p = criar_produto(f"Arroz restauração cursor {len(estoque_core.listar_produtos()) + 1}", "kg", 0)
+        for _ in range(5):
+            move_stock_by_id(p["id"], 1)
+        cursor = cliente.get("/api/historico", params={"limite": 2}).headers["x-proximo-cursor"]
+        # a cópia por cima mantém o inode: só o contador de reescritas denuncia a troca
+        assert estoque_core.restaurar_backup_externo()
+    finally:
+        estoque_core.set_pasta_backup_externo("")
+
+    r = cliente.get("/api/historico", params={"limite": 2, "cursor": cursor})
+    assert r.status_code == 400
+
+
+def test_cursor_adulterado(cliente):
+    assert cliente.get("/api/historico", params={"cursor": "nao-e-cursor"}).status_code == 400
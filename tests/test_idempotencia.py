@@ -0,0 +1,108 @@
+"""
+Chaves de idempotência: reenvio concorrente com a mesma chave executa uma vez,
+chaves diferentes não esperam umas pelas outras e a chave sobrevive a uma
+queda entre a gravação e a resposta.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src import idempotencia
+from src.config import ARQUIVO_IDEMPOTENCIA
+from src.estoque_core import criar_produto, listar_produtos, move_stock_by_id
+from src.idempotencia import ChaveReutilizada, executar_idempotente
+
+ESPERA_S = 5
+
+
+def test_reenvio_concorrente_executa_uma_vez():
+    liberar = threading.Event()
+    execucoes = []
+
+    def fn():
+        execucoes.append(1)
+        assert liberar.wait(ESPERA_S)
+        return 200, {"ok": True}
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futuros = [pool.submit(executar_idempotente, "reenvio", "entrada", {"q": 1}, fn) for _ in range(4)]
+        liberar.set()
+        resultados = [f.result(ESPERA_S) for f in futuros]
+
+    assert len(execucoes) == 1
+    assert sorted(r[2] for r in resultados) == [False, True, True, True]
+    assert all(r[:2] == (200, {"ok": True}) for r in resultados)
+
+
+def test_chaves_diferentes_nao_esperam():
+    dentro = threading.Event()
+    liberar = threading.Event()
+
+    def lenta():
+        dentro.set()
+        assert liberar.wait(ESPERA_S)
+        return 200, {"lenta": True}
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        futuro = pool.submit(executar_idempotente, "lenta", "entrada", {}, lenta)
+        assert dentro.wait(ESPERA_S)
+        # a outra chave termina enquanto a primeira ainda está executando
+        assert executar_idempotente("rapida", "entrada", {}, lambda: (200, {"rapida": True})) == (200, {"rapida": True}, False)
+        liberar.set()
+        assert futuro.result(ESPERA_S) == (200, {"lenta": True}, False)
+
+
+def test_falha_sem_resposta_libera_a_chave():
+    def falha():
+        raise RuntimeError("queda no meio")
+
+    with pytest.raises(RuntimeError):
+        executar_idempotente("falhou", "entrada", {}, falha)
+    assert executar_idempotente("falhou", "entrada", {}, lambda: (200, {"ok": True})) == (200, {"ok": True}, False)
+
+
+def test_mesma_chave_com_outro_corpo():
+    executar_idempotente("corpo", "entrada", {"q": 1}, lambda: (200, {}))
+    with pytest.raises(ChaveReutilizada):
+        executar_idempotente("corpo", "entrada", {"q": 2}, lambda: (200, {}))
+
+
+def _reiniciar_api():
+    """Esquece a tabela em memória, como num reinício: o próximo acesso relê o log."""
+    idempotencia._chaves = None
+
+
+def _estoque(produto_id):
+    return next(float(p["estoque_atual"]) for p in listar_produtos() if int(p["id"]) == produto_id)
+
+
+def test_queda_entre_gravacao_e_resposta_nao_lanca_de_novo():
+    p = criar_produto("Açúcar idempotência", "kg", 0)
+
+    def grava_e_cai():
+        move_stock_by_id(p["id"], 5)
+        raise RuntimeError("queda antes de anotar a resposta")
+
+    with pytest.raises(RuntimeError):
+        executar_idempotente("queda", "entrada", {"q": 5}, grava_e_cai)
+    _reiniciar_api()
+
+    def reenvio():
+        move_stock_by_id(p["id"], 5)
+        return 200, {"ok": True}
+
+    status, _, repetida = executar_idempotente("queda", "entrada", {"q": 5}, reenvio)
+    assert (status, repetida) == (200, True)
+    assert _estoque(p["id"]) == 5
+
+
+def test_log_compactado_mantem_as_chaves_recentes(monkeypatch):
+    monkeypatch.setattr(idempotencia, "MAX_CHAVES", 5)
+    for i in range(30):
+        executar_idempotente(f"log-{i}", "entrada", {"i": i}, lambda i=i: (200, {"i": i}))
+
+    with ARQUIVO_IDEMPOTENCIA.open(encoding="utf-8") as f:
+        assert len(f.readlines()) <= 2 * 5 + 1
+    _reiniciar_api()
+    assert executar_idempotente("log-29", "entrada", {"i": 29}, lambda: (500, {})) == (200, {"i": 29}, True)
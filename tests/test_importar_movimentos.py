@@ -0,0 +1,106 @@
+"""
+Importação de movimentos antigos (importar_movimentos): reescreve o histórico.
+"""
+import itertools
+import json
+
+import pytest
+
+from src import estoque_core
+from src.config import ARQUIVO_DADOS, ARQUIVO_HISTORICO
+from src.estoque_core import criar_produto, importar_movimentos, listar_produtos, move_stock_by_id
+
+_seq = itertools.count(1)
+
+
+@pytest.fixture
+def nome():
+    """Nome único por teste (a pasta de dados é a mesma para todos)."""
+    return f"Arroz histórico {next(_seq)}"
+
+
+def _csv(caminho, texto):
+    caminho.write_text(texto, encoding="utf-8")
+    return caminho
+
+
+def _por_nome(nome):
+    return next((p for p in listar_produtos() if p["nome"] == nome), None)
+
+
+def _historico():
+    with ARQUIVO_HISTORICO.open("r", encoding="utf-8") as f:
+        return [json.loads(linha) for linha in f if linha.strip()]
+
+
+def test_movimentos_retroativos_intercalados_em_ordem(tmp_path, nome):
+    p = criar_produto(nome, "kg", 0)
+    move_stock_by_id(p["id"], 10)  # hoje
+    caminho = _csv(tmp_path / "antigos.csv", (
+        "data;item;tipo;quantidade;motivo\n"
+        f"03/02/2020;{nome};saída;4;Cesta\n"
+        f"01/02/2020 08:30;{nome};entrada;6;Doação\n"
+        f"02/02/2020;{nome};entrada;1;\n"
+    ))
+
+    res = importar_movimentos(caminho)
+
+    assert (res["aceitos"], res["rejeitados"], res["aplicado"]) == (3, [], True)
+    assert _por_nome(nome)["estoque_atual"] == 13.0
+
+    historico = _historico()
+    assert [m["ts"] for m in historico] == sorted(m["ts"] for m in historico)
+    meus = [m for m in historico if m["produto_id"] == p["id"]]
+    assert [(m["ts"], m["delta"]) for m in meus] == [
+        ("2020-02-01T08:30:00", 6.0),
+        ("2020-02-02T00:00:00", 1.0),
+        ("2020-02-03T00:00:00", -4.0),
+        (meus[-1]["ts"], 10.0),
+    ]
+    # retroativos: só o delta, sem saldo antes/depois
+    assert all("estoque_antes" not in m and "estoque_depois" not in m for m in meus[:3])
+    assert meus[0]["motivo"] == "Doação" and meus[1]["motivo"] == "Importação de histórico"
+
+
+def test_movimentos_relata_linhas_rejeitadas(tmp_path, nome):
+    p = criar_produto(nome, "kg", 0)
+    caminho = _csv(tmp_path / "antigos.csv", (
+        "data;id;item;quantidade\n"
+        f"01/01/2020;;Item que não existe;1\n"
+        f"01/01/2020;{p['id']};;0\n"
+        f"31/02/2020;{p['id']};;1\n"
+        f"05/01/2020;;{nome};-3\n"
+        f"02/01/2020;{p['id']};;2\n"
+    ))
+
+    res = importar_movimentos(caminho)
+
+    assert [(r["linha"], r["motivo"]) for r in res["rejeitados"]] == [
+        (2, "Item não encontrado no cadastro."),
+        (3, "Quantidade vazia ou zero."),
+        (4, "Data inválida: '31/02/2020'."),
+        (5, f"Estoque insuficiente para '{nome}'."),
+    ]
+    assert res["aceitos"] == 1 and _por_nome(nome)["estoque_atual"] == 2.0
+
+
+def test_movimentos_simulados_nao_gravam(tmp_path, nome):
+    p = criar_produto(nome, "kg", 0)
+    move_stock_by_id(p["id"], 1)
+    caminho = _csv(tmp_path / "antigos.csv", f"data,id,quantidade\n2020-01-01,{p['id']},5\n")
+    dados_antes = ARQUIVO_DADOS.read_bytes()
+    historico_antes = ARQUIVO_HISTORICO.read_bytes()
+    geracao_antes = estoque_core.geracao_historico()
+
+    res = importar_movimentos(caminho, simular=True)
+
+    assert (res["aceitos"], res["aplicado"]) == (1, False)
+    assert ARQUIVO_DADOS.read_bytes() == dados_antes
+    assert ARQUIVO_HISTORICO.read_bytes() == historico_antes
+    assert estoque_core.geracao_historico() == geracao_antes
+
+
+def test_movimentos_cabecalho_invalido(tmp_path):
+    caminho = _csv(tmp_path / "antigos.csv", "quando;quantidade\n01/01/2020;1\n")
+    with pytest.raises(ValueError):
+        importar_movimentos(caminho)
@@ -0,0 +1,116 @@
+"""
+Importação da planilha de estoque (importar_planilha): mescla no catálogo.
+"""
+import itertools
+import json
+
+import pytest
+from openpyxl import Workbook
+
+from src.config import ARQUIVO_DADOS, ARQUIVO_HISTORICO
+from src.estoque_core import criar_produto, importar_planilha, listar_produtos, move_stock_by_id
+
+_seq = itertools.count(1)
+
+
+@pytest.fixture
+def nome():
+    """Nome único por teste (a pasta de dados é a mesma para todos)."""
+    return f"Arroz planilha {next(_seq)}"
+
+
+def _xlsx(caminho, linhas):
+    wb = Workbook()
+    ws = wb.active
+    for linha in linhas:
+        ws.append(linha)
+    wb.save(caminho)
+    return caminho
+
+
+def _por_nome(nome):
+    return next((p for p in listar_produtos() if p["nome"] == nome), None)
+
+
+def _historico():
+    with ARQUIVO_HISTORICO.open("r", encoding="utf-8") as f:
+        return [json.loads(linha) for linha in f if linha.strip()]
+
+
+def test_planilha_mapeia_colunas_pelo_cabecalho(tmp_path, nome):
+    # ordem trocada, acentos e pontuação nos títulos
+    caminho = _xlsx(tmp_path / "estoque.xlsx", [
+        ["Estoque Mínimo", "Descrição", "Saldo", "Un."],
+        [2, nome, "7,5", "kg"],
+    ])
+
+    res = importar_planilha(caminho)
+
+    assert res["aplicado"] and len(res["novos"]) == 1
+    p = _por_nome(nome)
+    assert (p["unidade"], p["estoque_atual"], p["estoque_minimo"]) == ("kg", 7.5, 2.0)
+    entrada = [m for m in _historico() if m["produto_id"] == p["id"]]
+    assert [m["delta"] for m in entrada] == [7.5]
+
+
+def test_planilha_layout_legado_sem_cabecalho(tmp_path, nome):
+    # planilha antiga: título na primeira linha; nome, entrada, saídas, estoque final
+    caminho = _xlsx(tmp_path / "antiga.xlsx", [
+        ["Controle de estoque - março"],
+        [nome, 10, 2, 8],
+    ])
+
+    res = importar_planilha(caminho)
+
+    assert res["aplicado"]
+    p = _por_nome(nome)
+    assert (p["unidade"], p["estoque_atual"]) == ("un", 8.0)
+
+
+def test_planilha_altera_existente_pela_diferenca(tmp_path, nome):
+    p = criar_produto(nome, "kg", 0)
+    move_stock_by_id(p["id"], 5)
+    caminho = _xlsx(tmp_path / "estoque.xlsx", [["Item", "Estoque"], [nome.upper(), 3]])
+
+    res = importar_planilha(caminho)
+
+    assert [a["id"] for a in res["alterados"]] == [p["id"]]
+    assert _por_nome(nome)["estoque_atual"] == 3.0
+    ultimo = [m for m in _historico() if m["produto_id"] == p["id"]][-1]
+    assert (ultimo["delta"], ultimo["estoque_antes"], ultimo["estoque_depois"]) == (-2.0, 5.0, 3.0)
+
+    assert importar_planilha(caminho)["sem_alteracao"] == 1
+
+
+def test_planilha_simulada_nao_grava(tmp_path, nome):
+    existente = criar_produto(nome + " existente", "kg", 0)
+    move_stock_by_id(existente["id"], 1)
+    caminho = _xlsx(tmp_path / "estoque.xlsx", [["Nome", "Estoque"], [nome, 4], [nome + " existente", 2]])
+    dados_antes = ARQUIVO_DADOS.read_bytes()
+    historico_antes = ARQUIVO_HISTORICO.read_bytes()
+
+    res = importar_planilha(caminho, simular=True)
+
+    assert not res["aplicado"] and [n["nome"] for n in res["novos"]] == [nome]
+    assert [a["depois"] for a in res["alterados"]] == [{"estoque_atual": 2.0}]
+    assert ARQUIVO_DADOS.read_bytes() == dados_antes
+    assert ARQUIVO_HISTORICO.read_bytes() == historico_antes
+
+
+def test_planilha_relata_linhas_ignoradas(tmp_path, nome):
+    caminho = _xlsx(tmp_path / "estoque.xlsx", [
+        ["Nome", "Estoque", "Mínimo"],
+        ["", 1, 0],
+        [nome, "muito", 0],
+        [nome + " b", -1, 0],
+        [nome + " c", 1, 0],
+    ])
+
+    res = importar_planilha(caminho)
+
+    assert [(i["linha"], i["motivo"]) for i in res["ignorados"]] == [
+        (2, "Nome vazio."),
+        (3, "Linha com valor numérico inválido: 'muito'."),
+        (4, "Valor negativo."),
+    ]
+    assert [n["nome"] for n in res["novos"]] == [nome + " c"]
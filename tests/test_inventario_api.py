@@ -0,0 +1,111 @@
+"""
+Contagem de inventário pela API com vários aparelhos ao mesmo tempo.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.api import app
+from src.estoque_core import criar_produto, listar_produtos, move_stock_by_id
+
+APARELHOS = 8
+ENVIOS_POR_APARELHO = 25
+
+
+@pytest.fixture
+def cliente():
+    return TestClient(app)
+
+
+@pytest.fixture
+def produto():
+    p = criar_produto(f"Feijão {len(listar_produtos()) + 1}", "kg", 0)
+    move_stock_by_id(p["id"], 10)
+    return p
+
+
+@pytest.fixture
+def sessao(cliente, produto):
+    r = cliente.post("/api/inventario")
+    assert r.status_code == 200
+    sessao_id = r.json()["id"]
+    yield sessao_id
+    cliente.delete(f"/api/inventario/{sessao_id}")  # não deixa sessão aberta para o próximo teste
+
+
+def _estoque(produto_id: int) -> float:
+    return next(float(p["estoque_atual"]) for p in listar_produtos() if int(p["id"]) == produto_id)
+
+
+def test_somar_concorrente_nao_perde_envios(cliente, produto, sessao):
+    def enviar(aparelho: int) -> list[int]:
+        c = TestClient(app)
+        codigos = []
+        for _ in range(ENVIOS_POR_APARELHO):
+            r = c.post(
+                f"/api/inventario/{sessao}/contagens",
+                json={"itens": [{"produto_id": produto["id"], "contado": 1}], "modo": "somar", "origem": f"aparelho {aparelho}"},
+            )
+            codigos.append(r.status_code)
+        return codigos
+
+    with ThreadPoolExecutor(max_workers=APARELHOS) as pool:
+        codigos = [c for lista in pool.map(enviar, range(APARELHOS)) for c in lista]
+
+    assert codigos == [200] * (APARELHOS * ENVIOS_POR_APARELHO)
+    r = cliente.get(f"/api/inventario/{sessao}")
+    contagens = {c["produto_id"]: c["contado"] for c in r.json()["contagens"]}
+    assert contagens[produto["id"]] == APARELHOS * ENVIOS_POR_APARELHO
+
+
+def test_somar_repetido_com_mesma_chave_conta_uma_vez(cliente, produto, sessao):
+    corpo = {"itens": [{"produto_id": produto["id"], "contado": 3}], "modo": "somar"}
+    cabecalho = {"Idempotency-Key": f"reenvio-{sessao}"}
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        respostas = list(pool.map(
+            lambda _: TestClient(app).post(f"/api/inventario/{sessao}/contagens", json=corpo, headers=cabecalho),
+            range(4),
+        ))
+
+    assert [r.status_code for r in respostas] == [200] * 4
+    r = cliente.get(f"/api/inventario/{sessao}")
+    assert r.json()["contagens"][0]["contado"] == 3
+
+
+def test_encerrar_duas_vezes(cliente, produto, sessao):
+    r = cliente.post(f"/api/inventario/{sessao}/contagens", json={"itens": [{"produto_id": produto["id"], "contado": 7}]})
+    assert r.status_code == 200
+
+    assert cliente.post(f"/api/inventario/{sessao}/encerrar").status_code == 200
+    assert cliente.post(f"/api/inventario/{sessao}/encerrar").status_code == 409
+    assert _estoque(produto["id"]) == 7
+
+
+def test_encerrar_concorrente_aplica_uma_vez(cliente, produto, sessao):
+    r = cliente.post(f"/api/inventario/{sessao}/contagens", json={"itens": [{"produto_id": produto["id"], "contado": 4}]})
+    assert r.status_code == 200
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        codigos = sorted(pool.map(
+            lambda _: TestClient(app).post(f"/api/inventario/{sessao}/encerrar").status_code,
+            range(4),
+        ))
+
+    assert codigos == [200, 409, 409, 409]
+    assert _estoque(produto["id"]) == 4
+
+
+def test_contagem_em_sessao_encerrada(cliente, produto, sessao):
+    assert cliente.post(f"/api/inventario/{sessao}/encerrar").status_code == 200
+    r = cliente.post(f"/api/inventario/{sessao}/contagens", json={"itens": [{"produto_id": produto["id"], "contado": 1}]})
+    assert r.status_code == 409
+
+
+@pytest.mark.parametrize("sessao_id", ["..%2Fdados", "x", "20240101-120000", "20240101-120000-123456.json"])
+def test_id_fora_do_formato_da_404(cliente, sessao_id):
+    assert cliente.get(f"/api/inventario/{sessao_id}").status_code == 404
+    assert cliente.delete(f"/api/inventario/{sessao_id}").status_code == 404
+    r = cliente.post(f"/api/inventario/{sessao_id}/contagens", json={"itens": [{"produto_id": 1, "contado": 1}]})
+    assert r.status_code == 404